@@ -0,0 +1,270 @@
+"""Measure throughput, latency and packet loss of serial to UDP bridges, using pseudo-terminals as serial ports
+
+Traffic is paced to the byte rate of each baud rate (10 bits per byte, for 8N1), since pseudo-terminals transfer data as
+fast as they can. Each packet carries a sequence number and its sending time, so packets can be found in the byte
+streams on both sides, however the bridge splits or merges them.
+
+Usage: python -m bridges.benchmark [--engines NAME ...] [--bauds BAUD ...] [--sizes BYTES ...] [--duration SECONDS]
+"""
+
+import argparse
+import asyncio
+import os
+import pty
+import socket
+import struct
+import time
+import tty
+from shutil import which
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Set, Tuple
+
+from serial.tools.list_ports_linux import SysFS
+
+from bridges.bridges import Bridge
+from bridges.engine import BridgeEngine
+from bridges.serialhelper import Baudrate
+
+# Magic, sequence number and sending time in nanoseconds, the rest of the packet is padding
+HEADER = struct.Struct("!HIQ")
+MAGIC = 0xB10E
+MAGIC_BYTES = MAGIC.to_bytes(2, "big")
+# Time to wait for packets still on the way after the traffic stops
+DRAIN_TIME = 0.5
+PACING_INTERVAL = 0.001
+
+# Starts a bridge between the serial port and the UDP port, returning the function that stops it
+StopBridge = Callable[[], Awaitable[None]]
+StartBridge = Callable[[str, Baudrate, int], Awaitable[StopBridge]]
+
+
+class BenchmarkResult(NamedTuple):
+    engine: str
+    direction: str
+    baud: int
+    packet_size: int
+    sent_packets: int
+    received_packets: int
+    # Received payload bytes per second
+    throughput: float
+    # Latency quantiles in seconds
+    p50_latency: float
+    p99_latency: float
+
+    @property
+    def loss(self) -> float:
+        return 1 - self.received_packets / self.sent_packets if self.sent_packets else 0.0
+
+
+async def start_external_bridge(serial_path: str, baud: Baudrate, udp_port: int) -> StopBridge:
+    # Bridge blocks while checking that the process started
+    bridge = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: Bridge(SysFS(serial_path), baud, "127.0.0.1", udp_port, automatic_disconnect=False)
+    )
+
+    async def stop() -> None:
+        await asyncio.get_running_loop().run_in_executor(None, bridge.stop)
+
+    return stop
+
+
+async def start_in_process_bridge(serial_path: str, baud: Baudrate, udp_port: int) -> StopBridge:
+    engine = BridgeEngine()
+    await engine.add_link(serial_path, baud, "127.0.0.1", udp_port, automatic_disconnect=False)
+    return engine.stop
+
+
+ENGINES: Dict[str, StartBridge] = {
+    "external": start_external_bridge,
+    "in-process": start_in_process_bridge,
+}
+
+
+def engine_available(engine: str) -> bool:
+    return engine != "external" or which("bridges") is not None
+
+
+class PacketParser:
+    """Find the benchmark packets in a byte stream, recording the latency of each one"""
+
+    def __init__(self, packet_size: int) -> None:
+        self.packet_size = packet_size
+        self.latencies: List[float] = []
+        self.received: Set[int] = set()
+        self.received_bytes = 0
+        self.last_receive_time = 0.0
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> None:
+        now_ns = time.perf_counter_ns()
+        self._buffer += data
+        while True:
+            start = self._buffer.find(MAGIC_BYTES)
+            if start < 0:
+                # Keeps the last byte, in case it's the beginning of the magic
+                del self._buffer[:-1]
+                return
+            if len(self._buffer) - start < self.packet_size:
+                del self._buffer[:start]
+                return
+            _magic, sequence, sent_ns = HEADER.unpack_from(self._buffer, start)
+            del self._buffer[: start + self.packet_size]
+            if sequence in self.received:
+                continue
+            self.received.add(sequence)
+            self.received_bytes += self.packet_size
+            self.latencies.append((now_ns - sent_ns) / 1e9)
+            self.last_receive_time = now_ns / 1e9
+
+
+class UDPEndpoint(asyncio.DatagramProtocol):
+    def __init__(self, on_data: Callable[[bytes], None]) -> None:
+        self.on_data = on_data
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self.on_data(data)
+
+
+def free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        port: int = probe.getsockname()[1]
+        return port
+
+
+async def write_all(fd: int, data: bytes) -> None:
+    loop = asyncio.get_running_loop()
+    view = memoryview(data)
+    while view:
+        try:
+            view = view[os.write(fd, view) :]
+        except BlockingIOError:
+            writable = loop.create_future()
+            loop.add_writer(fd, writable.set_result, None)
+            try:
+                await writable
+            finally:
+                loop.remove_writer(fd)
+
+
+def quantile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# pylint: disable=too-many-locals
+async def run_benchmark(
+    engine: str, direction: str, baud: Baudrate, packet_size: int, duration: float
+) -> BenchmarkResult:
+    """Send paced traffic through a new bridge, in the given direction ("serial-to-udp" or "udp-to-serial")"""
+    loop = asyncio.get_running_loop()
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+    serial_path = os.ttyname(slave)
+    udp_port = free_udp_port()
+    parser = PacketParser(packet_size)
+
+    def read_serial() -> None:
+        try:
+            data = os.read(master, 65536)
+        except (BlockingIOError, OSError):
+            return
+        if direction == "udp-to-serial":
+            parser.feed(data)
+
+    def read_udp(data: bytes) -> None:
+        if direction == "serial-to-udp":
+            parser.feed(data)
+
+    stop_bridge = await ENGINES[engine](serial_path, baud, udp_port)
+    transport, _protocol = await loop.create_datagram_endpoint(
+        lambda: UDPEndpoint(read_udp), remote_addr=("127.0.0.1", udp_port)
+    )
+    loop.add_reader(master, read_serial)
+    sent = 0
+    try:
+        # Bridges only send serial data to clients that already sent something
+        transport.sendto(b"\0")
+        await asyncio.sleep(0.1)
+
+        packets_per_second = baud / 10 / packet_size
+        padding = bytes(packet_size - HEADER.size)
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < duration:
+            due = int(elapsed * packets_per_second) + 1
+            packets = []
+            for sequence in range(sent, due):
+                packets.append(HEADER.pack(MAGIC, sequence, time.perf_counter_ns()) + padding)
+            sent = max(sent, due)
+            if direction == "serial-to-udp":
+                await write_all(master, b"".join(packets))
+            else:
+                for packet in packets:
+                    transport.sendto(packet)
+            await asyncio.sleep(PACING_INTERVAL)
+        await asyncio.sleep(DRAIN_TIME)
+    finally:
+        loop.remove_reader(master)
+        transport.close()
+        await stop_bridge()
+        os.close(master)
+        os.close(slave)
+
+    transfer_time = parser.last_receive_time - start if parser.received else 0.0
+    return BenchmarkResult(
+        engine=engine,
+        direction=direction,
+        baud=int(baud),
+        packet_size=packet_size,
+        sent_packets=sent,
+        received_packets=len(parser.received),
+        throughput=parser.received_bytes / transfer_time if transfer_time else 0.0,
+        p50_latency=quantile(parser.latencies, 0.5),
+        p99_latency=quantile(parser.latencies, 0.99),
+    )
+
+
+def print_result(result: BenchmarkResult) -> None:
+    print(
+        f"{result.engine:<12}{result.direction:<15}{result.baud:>9}{result.packet_size:>7}"
+        f"{result.baud / 10:>12.0f}{result.throughput:>12.0f}"
+        f"{result.p50_latency * 1e3:>9.2f}{result.p99_latency * 1e3:>9.2f}{result.loss * 100:>8.2f}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument(
+        "--bauds",
+        nargs="+",
+        type=int,
+        choices=[int(baud) for baud in Baudrate],
+        default=[int(Baudrate.b115200), int(Baudrate.b921600), int(Baudrate.b4000000)],
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=[16, 64, 256, 1024], help="Packet sizes in bytes.")
+    parser.add_argument("--directions", nargs="+", choices=["serial-to-udp", "udp-to-serial"], default=None)
+    parser.add_argument("--duration", type=float, default=2.0, help="Traffic time of each measurement, in seconds.")
+    args = parser.parse_args()
+    if min(args.sizes) < HEADER.size:
+        parser.error(f"Packets need at least {HEADER.size} bytes.")
+
+    print(
+        f"{'engine':<12}{'direction':<15}{'baud':>9}{'size':>7}{'offered B/s':>12}{'recv B/s':>12}"
+        f"{'p50 ms':>9}{'p99 ms':>9}{'loss %':>8}"
+    )
+    for engine in args.engines:
+        for direction in args.directions or ["serial-to-udp", "udp-to-serial"]:
+            for baud in args.bauds:
+                for size in args.sizes:
+                    if not engine_available(engine):
+                        print(f"{engine:<12}{direction:<15}{baud:>9}{size:>7}  skipped, engine not available")
+                        continue
+                    result = await run_benchmark(engine, direction, Baudrate(baud), size, args.duration)
+                    print_result(result)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,15 +1,21 @@
 import logging
+import os
 import shlex
 import time
+from pathlib import Path
 from shutil import which
-from subprocess import PIPE, Popen
+from subprocess import PIPE, Popen, TimeoutExpired
+from typing import Optional, Tuple
 
 from serial.tools.list_ports_linux import SysFS
 
 from bridges.serialhelper import Baudrate
 
+# Time in seconds for a bridges process to open its serial port and UDP socket
+READY_TIMEOUT = 5.0
+READY_POLL_INTERVAL = 0.01
+
 
-# pylint: disable=too-many-arguments
 class Bridge:
     """Basic abstraction of Bridges. Used to bridge serial devices to UDP ports"""
 
@@ -27,19 +33,47 @@ class Bridge:
         logging.info(f"Launching bridge link with command '{command_line}'.")
         # pylint: disable=consider-using-with
         self.process = Popen(shlex.split(command_line), stdout=PIPE, stderr=PIPE)
-        time.sleep(1.0)
-        if self.process.poll() is not None:
-            _stdout, strerr = self.process.communicate()
-            error = strerr.decode("utf-8") if strerr else "Empty error"
-            raise RuntimeError(f'Failed to initialize bridge, code: {self.process.returncode}, message: "{error}".')
+        deadline = time.monotonic() + READY_TIMEOUT
+        while not self._is_ready(serial_port.device):
+            if self.process.poll() is not None:
+                _stdout, strerr = self.process.communicate()
+                error = strerr.decode("utf-8") if strerr else "Empty error"
+                raise RuntimeError(f'Failed to initialize bridge, code: {self.process.returncode}, message: "{error}".')
+            if time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError(f"Bridge did not open {serial_port.device} and its UDP socket in time.")
+            time.sleep(READY_POLL_INTERVAL)
+
+    def _is_ready(self, device: str) -> bool:
+        """Whether the process has both the serial port and a socket open, which it does once it is bridging"""
+        fd_folder = Path(f"/proc/{self.process.pid}/fd")
+        try:
+            targets = [os.readlink(fd) for fd in fd_folder.iterdir()]
+        except OSError:
+            # The process exited, or its file descriptors changed while being listed
+            return False
+        return os.path.realpath(device) in targets and any(target.startswith("socket:") for target in targets)
+
+    def io_counters(self) -> Optional[Tuple[int, int]]:
+        """Bytes read and written by the process, adding its serial port and UDP socket, or None if it exited
+
+        Each forwarded byte is read from one side and written to the other, so both grow with the traffic.
+        """
+        try:
+            io_lines = Path(f"/proc/{self.process.pid}/io").read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return None
+        counters = dict(line.split(": ", 1) for line in io_lines)
+        return int(counters["rchar"]), int(counters["wchar"])
 
     def stop(self) -> None:
         if not self.process:
             raise RuntimeError("Bridges process doesn't exist.")
         self.process.kill()
-        time.sleep(1.0)
-        if self.process.poll() is None:
-            raise RuntimeError("Failed to kill bridges process.")
+        try:
+            self.process.wait(timeout=1.0)
+        except TimeoutExpired as error:
+            raise RuntimeError("Failed to kill bridges process.") from error
 
     def __del__(self) -> None:
         self.stop()
@@ -0,0 +1,236 @@
+"""In-process engine for serial to UDP links, as an alternative to the external `bridges` binary used by Bridge
+
+Many links are multiplexed on a single asyncio event loop, using the non-blocking file descriptors of the serial ports.
+Data read from a serial port is handed to the UDP socket as a view of the read buffer, and data received from UDP is
+written to the serial port directly, only being buffered when the port can't take it all at once.
+
+Links are ready as soon as `BridgeEngine.add_link` returns, without waiting fixed times.
+"""
+
+import asyncio
+import dataclasses
+import errno
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, cast
+
+import serial
+
+from bridges.serialhelper import Baudrate
+
+Address = Tuple[str, int]
+
+# Largest read from a serial port, sent as a single datagram
+READ_BUFFER_SIZE = 4096
+# Bytes waiting to be written to a serial port, beyond which data received from UDP is dropped
+MAX_SERIAL_BACKLOG = 64 * 1024
+# Time in seconds without receiving data from an UDP client before it's disconnected, when automatic disconnect is on
+CLIENT_TIMEOUT = 10.0
+
+
+@dataclass
+class LinkStatistics:  # pylint: disable=too-many-instance-attributes
+    """Traffic counters of a link, packets being serial reads and UDP datagrams"""
+
+    serial_to_udp_bytes: int = 0
+    serial_to_udp_packets: int = 0
+    udp_to_serial_bytes: int = 0
+    udp_to_serial_packets: int = 0
+    # Bytes received from UDP that didn't fit in the serial backlog
+    dropped_bytes: int = 0
+    serial_errors: int = 0
+    udp_errors: int = 0
+    # Time since epoch of the last data received from each side, 0 if none was received yet
+    last_serial_activity: float = 0.0
+    last_udp_activity: float = 0.0
+
+    def copy(self) -> "LinkStatistics":
+        return dataclasses.replace(self)
+
+
+class SerialUDPLink(asyncio.DatagramProtocol):  # pylint: disable=too-many-instance-attributes
+    """Bridge between a serial port and an UDP socket
+
+    Data from the serial port is sent to every UDP client that has sent data to the link, and data from any client is
+    written to the serial port.
+    """
+
+    def __init__(self, serial_path: str, baud: Baudrate, automatic_disconnect: bool = True) -> None:
+        self.serial_path = serial_path
+        self.baud = baud
+        self.automatic_disconnect = automatic_disconnect
+        self.statistics = LinkStatistics()
+        # Reason the link closed by itself, if it did
+        self.error: Optional[str] = None
+        # Time since epoch of the last datagram received from each client
+        self.clients: Dict[Address, float] = {}
+        self.closed: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+
+        self._loop = asyncio.get_running_loop()
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._buffer = bytearray(READ_BUFFER_SIZE)
+        self._buffer_view = memoryview(self._buffer)
+        self._backlog = bytearray()
+        self._serial = serial.Serial(serial_path, int(baud), timeout=0, write_timeout=0, exclusive=True)
+        self._fd = self._serial.fileno()
+        self._loop.add_reader(self._fd, self._read_serial)
+
+    def __str__(self) -> str:
+        description = f"{self.serial_path}:{int(self.baud)}"
+        if self.local_address is not None:
+            description += f"//{self.local_address[0]}:{self.local_address[1]}"
+        return description
+
+    @property
+    def local_address(self) -> Optional[Address]:
+        if self._transport is None:
+            return None
+        address: Address = self._transport.get_extra_info("sockname")[:2]
+        return address
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self._transport = cast(asyncio.DatagramTransport, transport)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.close()
+
+    def error_received(self, exc: Exception) -> None:
+        # Usually an ICMP port unreachable from a client that went away
+        self.statistics.udp_errors += 1
+
+    def datagram_received(self, data: bytes, addr: Address) -> None:
+        now = time.time()
+        self.clients[addr] = now
+        self.statistics.udp_to_serial_bytes += len(data)
+        self.statistics.udp_to_serial_packets += 1
+        self.statistics.last_udp_activity = now
+        self._write_serial(data)
+
+    def _active_clients(self, now: float) -> List[Address]:
+        if self.automatic_disconnect:
+            for client in [client for client, last_seen in self.clients.items() if now - last_seen > CLIENT_TIMEOUT]:
+                logging.debug(f"Disconnecting inactive client {client} from {self}.")
+                del self.clients[client]
+        return list(self.clients)
+
+    def _read_serial(self) -> None:
+        try:
+            size = os.readv(self._fd, [self._buffer_view])
+        except BlockingIOError:
+            return
+        except OSError as error:
+            self._serial_error(error)
+            return
+        if not size:
+            # Device went away
+            self._serial_error(OSError(errno.EIO, "Serial port closed"))
+            return
+
+        now = time.time()
+        self.statistics.serial_to_udp_bytes += size
+        self.statistics.serial_to_udp_packets += 1
+        self.statistics.last_serial_activity = now
+        if self._transport is None:
+            return
+        # The transport only copies the data when it can't be sent right away
+        data = self._buffer_view[:size]
+        for client in self._active_clients(now):
+            self._transport.sendto(data, client)
+
+    def _write_serial(self, data: bytes) -> None:
+        if self._backlog:
+            self._queue_serial(memoryview(data))
+            return
+        try:
+            written = os.write(self._fd, data)
+        except BlockingIOError:
+            written = 0
+        except OSError as error:
+            self._serial_error(error)
+            return
+        if written < len(data):
+            self._queue_serial(memoryview(data)[written:])
+            self._loop.add_writer(self._fd, self._flush_serial)
+
+    def _queue_serial(self, data: memoryview) -> None:
+        space = MAX_SERIAL_BACKLOG - len(self._backlog)
+        if len(data) > space:
+            self.statistics.dropped_bytes += len(data) - space
+            data = data[:space]
+        self._backlog += data
+
+    def _flush_serial(self) -> None:
+        try:
+            written = os.write(self._fd, self._backlog)
+        except BlockingIOError:
+            return
+        except OSError as error:
+            self._serial_error(error)
+            return
+        del self._backlog[:written]
+        if not self._backlog:
+            self._loop.remove_writer(self._fd)
+
+    def _serial_error(self, error: OSError) -> None:
+        if error.errno in [errno.EINTR, errno.EAGAIN]:
+            return
+        self.statistics.serial_errors += 1
+        logging.error(f"Serial error on {self}, closing link: {error}")
+        self.error = f"Serial error: {error}"
+        self.close()
+
+    def close(self) -> None:
+        if self.closed.done():
+            return
+        self._loop.remove_reader(self._fd)
+        self._loop.remove_writer(self._fd)
+        self._serial.close()
+        if self._transport is not None:
+            self._transport.close()
+        self.closed.set_result(None)
+
+
+class BridgeEngine:
+    """Serial to UDP links running on the current event loop"""
+
+    def __init__(self) -> None:
+        self._links: List[SerialUDPLink] = []
+
+    @property
+    def links(self) -> List[SerialUDPLink]:
+        return [link for link in self._links if not link.closed.done()]
+
+    async def add_link(
+        self, serial_path: str, baud: Baudrate, ip: str, udp_port: int, automatic_disconnect: bool = True
+    ) -> SerialUDPLink:
+        """Open the serial port and bind the UDP socket, returning the link ready to transfer data
+
+        Raises:
+            serial.SerialException: If the serial port can't be opened.
+            OSError: If the UDP socket can't be bound.
+        """
+        loop = asyncio.get_running_loop()
+        link = SerialUDPLink(serial_path, baud, automatic_disconnect)
+        try:
+            await loop.create_datagram_endpoint(lambda: link, local_addr=(ip, udp_port))
+        except Exception:
+            link.close()
+            raise
+        self._links.append(link)
+        logging.info(f"Bridge link {link} started.")
+        return link
+
+    async def remove_link(self, link: SerialUDPLink) -> None:
+        if link not in self._links:
+            raise RuntimeError("Bridge link doesn't exist.")
+        self._links.remove(link)
+        # Described before closing, while it still has its UDP address
+        description = str(link)
+        link.close()
+        await link.closed
+        logging.info(f"Bridge link {description} stopped.")
+
+    async def stop(self) -> None:
+        await asyncio.gather(*[self.remove_link(link) for link in list(self._links)])
@@ -1,9 +1,9 @@
-import logging
 from enum import IntEnum
-from pathlib import Path
 
 from serial.tools.list_ports_linux import SysFS
 
+from bridges.serialtuning import tune_port
+
 
 class Baudrate(IntEnum):
     b9600 = 9600
@@ -28,16 +28,6 @@ class Baudrate(IntEnum):
 
 def set_low_latency(port: SysFS) -> None:
     """
-    sets the latency_timer for the serial adapter
+    sets the lowest latency settings available for the serial adapter, see bridges.serialtuning
     """
-
-    device_name = Path(port.device.strip()).name
-    latency_file = f"/sys/bus/usb-serial/devices/{device_name}/latency_timer"
-    logging.info(f"Latency file: {latency_file}")
-
-    try:
-        with open(latency_file, "w", encoding="utf-8") as p:
-            p.write("1")
-            p.flush()
-    except IOError:
-        logging.warning(f"Unable to set latency for device {device_name}, your device may work slower than expected.")
+    tune_port(port.device.strip())
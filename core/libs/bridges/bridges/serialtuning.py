@@ -0,0 +1,196 @@
+"""Low-latency tuning of serial ports
+
+The adapter behind a port is detected from its sysfs driver, and the available settings are applied and read back:
+- The latency timer of USB adapters that have one (FTDI), which holds received data for up to 16 ms by default.
+- The ASYNC_LOW_LATENCY flag of the tty, through the TIOCGSERIAL and TIOCSSERIAL ioctls, unless other processes use it.
+
+Ports with a loopback (TX wired to RX) can also have their round-trip latency measured.
+"""
+
+import array
+import errno
+import fcntl
+import logging
+import os
+import statistics
+import termios
+import time
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import List, Optional
+
+import serial
+
+SYS_CLASS_TTY = Path("/sys/class/tty")
+PROC = Path("/proc")
+# Milliseconds, the lowest value accepted by the adapters
+LOW_LATENCY_TIMER = 1
+
+# From linux/serial.h, flags being the fifth int of serial_struct
+TIOCGSERIAL = getattr(termios, "TIOCGSERIAL", 0x541E)
+TIOCSSERIAL = getattr(termios, "TIOCSSERIAL", 0x541F)
+ASYNC_LOW_LATENCY = 0x2000
+SERIAL_STRUCT_FLAGS = 4
+SERIAL_STRUCT_XMIT_FIFO_SIZE = 5
+
+LOOPBACK_SAMPLES = 20
+# Time in seconds to wait for each probe to come back
+LOOPBACK_TIMEOUT = 0.1
+
+
+class AdapterType(str, Enum):
+    FTDI = "ftdi"
+    CP210X = "cp210x"
+    CH341 = "ch341"
+    PL2303 = "pl2303"
+    CDC_ACM = "cdc_acm"
+    # USB adapters with other drivers
+    USB_SERIAL = "usb_serial"
+    # UARTs of the board itself
+    ONBOARD = "onboard"
+    UNKNOWN = "unknown"
+
+
+USB_SERIAL_DRIVERS = {
+    "ftdi_sio": AdapterType.FTDI,
+    "cp210x": AdapterType.CP210X,
+    "ch341": AdapterType.CH341,
+    "ch341-uart": AdapterType.CH341,
+    "pl2303": AdapterType.PL2303,
+    "cdc_acm": AdapterType.CDC_ACM,
+}
+
+
+@dataclass
+class SerialTuningReport:
+    """Low-latency settings of a port, as read back after applying them"""
+
+    device: str
+    adapter: AdapterType
+    # Latency timer in milliseconds, for adapters that have one
+    latency_timer: Optional[int] = None
+    low_latency: bool = False
+    transmit_fifo_size: Optional[int] = None
+    # Median round-trip time in seconds of a loopback probe, when measured on a port with a loopback
+    loopback_latency: Optional[float] = None
+
+
+def _sysfs_device(device: str) -> Path:
+    return SYS_CLASS_TTY.joinpath(Path(os.path.realpath(device)).name, "device")
+
+
+def detect_adapter(device: str) -> AdapterType:
+    sysfs_device = _sysfs_device(device)
+    try:
+        driver = os.readlink(sysfs_device.joinpath("driver"))
+    except OSError:
+        return AdapterType.UNKNOWN
+    adapter = USB_SERIAL_DRIVERS.get(Path(driver).name)
+    if adapter is not None:
+        return adapter
+    if "/usb" in os.path.realpath(sysfs_device):
+        return AdapterType.USB_SERIAL
+    return AdapterType.ONBOARD
+
+
+def set_latency_timer(device: str, latency_timer: int = LOW_LATENCY_TIMER) -> Optional[int]:
+    """Set the latency timer of an USB adapter, returning the value in use, or None if the adapter has no timer"""
+    latency_file = _sysfs_device(device).joinpath("latency_timer")
+    if not latency_file.exists():
+        return None
+    try:
+        latency_file.write_text(str(latency_timer), encoding="utf-8")
+    except OSError as error:
+        logging.warning(f"Unable to set latency timer of {device}, it may work slower than expected: {error}")
+    try:
+        return int(latency_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def port_users(device: str) -> List[int]:
+    """PIDs of the processes with the port open, as MAVLink routers, Ping devices or bridges using it
+
+    Only processes visible to this one, with enough privileges to read their file descriptors, are found.
+    """
+    device_path = os.path.realpath(device)
+    users = []
+    for process in PROC.iterdir():
+        if not process.name.isdigit():
+            continue
+        try:
+            if any(os.path.realpath(fd) == device_path for fd in process.joinpath("fd").iterdir()):
+                users.append(int(process.name))
+        except OSError:
+            # Processes that exited meanwhile, or that we are not allowed to inspect
+            continue
+    return users
+
+
+def set_low_latency_flag(report: SerialTuningReport) -> None:
+    """Set the ASYNC_LOW_LATENCY flag of the port, filling the report with the flag and FIFO size read back
+
+    Skipped on ports used by other processes, since opening and closing a port can toggle its modem lines, which
+    resets some of the boards attached to it.
+    """
+    users = [pid for pid in port_users(report.device) if pid != os.getpid()]
+    if users:
+        logging.info(f"Not setting low latency mode of {report.device}, in use by processes {users}.")
+        return
+    try:
+        fd = os.open(report.device, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    except OSError as error:
+        logging.warning(f"Unable to open {report.device} to set low latency mode: {error}")
+        return
+    try:
+        serial_struct = array.array("i", [0] * 32)
+        fcntl.ioctl(fd, TIOCGSERIAL, serial_struct)
+        if not serial_struct[SERIAL_STRUCT_FLAGS] & ASYNC_LOW_LATENCY:
+            serial_struct[SERIAL_STRUCT_FLAGS] |= ASYNC_LOW_LATENCY
+            fcntl.ioctl(fd, TIOCSSERIAL, serial_struct)
+            fcntl.ioctl(fd, TIOCGSERIAL, serial_struct)
+        report.low_latency = bool(serial_struct[SERIAL_STRUCT_FLAGS] & ASYNC_LOW_LATENCY)
+        report.transmit_fifo_size = serial_struct[SERIAL_STRUCT_XMIT_FIFO_SIZE] or None
+    except OSError as error:
+        # Pseudo-terminals and some drivers don't support these ioctls, or need more privileges
+        level = logging.DEBUG if error.errno in [errno.ENOTTY, errno.EINVAL] else logging.WARNING
+        logging.log(level, f"Unable to set low latency mode of {report.device}: {error}")
+    finally:
+        os.close(fd)
+
+
+def measure_loopback_latency(
+    device: str, baud: int, samples: int = LOOPBACK_SAMPLES, timeout: float = LOOPBACK_TIMEOUT
+) -> Optional[float]:
+    """Measure the median round-trip time of probes written to a port and read back through its loopback
+
+    Returns None if the probes don't come back, as when the port has no loopback.
+    Only use it on ports with nothing connected but the loopback, since the probes are sent to whatever is there,
+    and that no other process uses, see `port_users`.
+    """
+    round_trips: List[float] = []
+    with serial.Serial(device, baud, timeout=timeout, exclusive=True) as port:
+        port.reset_input_buffer()
+        for sample in range(samples):
+            probe = b"BlueOS" + sample.to_bytes(2, "big")
+            start = time.perf_counter()
+            port.write(probe)
+            if port.read(len(probe)) != probe:
+                return None
+            round_trips.append(time.perf_counter() - start)
+    return statistics.median(round_trips)
+
+
+def tune_port(device: str, loopback_baud: Optional[int] = None) -> SerialTuningReport:
+    """Apply the lowest latency settings available for the port, optionally measuring the latency through a loopback
+
+    The measurement is only done when a baud rate is given, see `measure_loopback_latency`.
+    """
+    report = SerialTuningReport(device=device, adapter=detect_adapter(device))
+    report.latency_timer = set_latency_timer(device)
+    set_low_latency_flag(report)
+    if loopback_baud is not None:
+        report.loopback_latency = measure_loopback_latency(device, loopback_baud)
+    logging.info(f"Serial port tuned: {report}")
+    return report
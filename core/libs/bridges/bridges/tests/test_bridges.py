@@ -0,0 +1,67 @@
+import os
+import pty
+import sys
+import time
+import tty
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from serial.tools.list_ports_linux import SysFS
+
+from .. import bridges
+from ..bridges import Bridge
+from ..serialhelper import Baudrate
+
+# Stand-in for the bridges tool, opening its serial port and UDP socket after a delay, or failing
+FAKE_BRIDGES = f"""#!{sys.executable}
+import socket, sys, time
+arguments = sys.argv[1:]
+serial_path = arguments[arguments.index("-p") + 1].rsplit(":", 1)[0]
+if serial_path == "/dev/does-not-exist":
+    sys.exit("Failed to open serial port")
+time.sleep(0.2)
+port = open(serial_path, "rb", buffering=0)
+udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+udp.bind(("127.0.0.1", 0))
+time.sleep(60)
+"""
+
+
+@pytest.fixture(name="fake_bridges", autouse=True)
+def fixture_fake_bridges(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    executable = tmp_path.joinpath("bridges")
+    executable.write_text(FAKE_BRIDGES, encoding="utf-8")
+    executable.chmod(0o755)
+    monkeypatch.setenv("PATH", str(tmp_path), prepend=os.pathsep)
+
+
+@pytest.fixture(name="serial_path")
+def fixture_serial_path() -> Iterator[str]:
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    yield os.ttyname(slave)
+    os.close(slave)
+    os.close(master)
+
+
+def test_bridge_waits_until_ready(serial_path: str) -> None:
+    start = time.monotonic()
+    bridge = Bridge(SysFS(serial_path), Baudrate.b115200, "127.0.0.1", 0)
+    try:
+        # Ready once the process opened the port, instead of after a fixed wait
+        assert 0.2 < time.monotonic() - start < 1.0
+        assert bridge.process.poll() is None
+    finally:
+        bridge.stop()
+
+
+def test_bridge_fails_to_start() -> None:
+    with pytest.raises(RuntimeError, match="Failed to open serial port"):
+        Bridge(SysFS("/dev/does-not-exist"), Baudrate.b115200, "127.0.0.1", 0)
+
+
+def test_bridge_not_ready_in_time(serial_path: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(bridges, "READY_TIMEOUT", 0.05)
+    with pytest.raises(RuntimeError, match="in time"):
+        Bridge(SysFS(serial_path), Baudrate.b115200, "127.0.0.1", 0)
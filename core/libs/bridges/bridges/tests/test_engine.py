@@ -0,0 +1,124 @@
+import asyncio
+import os
+import pty
+import socket
+import tty
+from typing import Iterator, Set, Tuple
+
+import pytest
+
+from .. import engine
+from ..engine import BridgeEngine, SerialUDPLink
+from ..serialhelper import Baudrate
+
+
+@pytest.fixture(name="serial_pair")
+def fixture_serial_pair() -> Iterator[Tuple[int, str]]:
+    """Pseudo-terminal standing for a serial device, as the master file descriptor and the path of the port
+
+    Tests that close the master themselves, to unplug the device, take it out with `unplug`.
+    """
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+    yield master, os.ttyname(slave)
+    os.close(slave)
+    if master not in unplugged:
+        os.close(master)
+    unplugged.discard(master)
+
+
+# Masters closed by the tests, which must not be closed again since their file descriptors can be reused
+unplugged: Set[int] = set()
+
+
+def unplug(master: int) -> None:
+    os.close(master)
+    unplugged.add(master)
+
+
+def udp_client(link: SerialUDPLink) -> socket.socket:
+    assert link.local_address is not None
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.connect(link.local_address)
+    client.setblocking(False)
+    return client
+
+
+async def read_serial(master: int, size: int, timeout: float = 1.0) -> bytes:
+    data = b""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while len(data) < size and asyncio.get_running_loop().time() < deadline:
+        try:
+            data += os.read(master, size - len(data))
+        except BlockingIOError:
+            await asyncio.sleep(0.01)
+    return data
+
+
+@pytest.mark.asyncio
+async def test_data_flows_both_ways(serial_pair: Tuple[int, str]) -> None:
+    master, serial_path = serial_pair
+    bridge_engine = BridgeEngine()
+    link = await bridge_engine.add_link(serial_path, Baudrate.b115200, "127.0.0.1", 0, automatic_disconnect=False)
+    client = udp_client(link)
+    loop = asyncio.get_running_loop()
+    try:
+        # UDP to serial, which also makes the client known to the link
+        client.send(b"from udp")
+        assert await read_serial(master, 8) == b"from udp"
+
+        # Serial to UDP
+        os.write(master, b"from serial")
+        assert await asyncio.wait_for(loop.sock_recv(client, 1024), 1.0) == b"from serial"
+
+        statistics = link.statistics.copy()
+        assert (statistics.udp_to_serial_bytes, statistics.udp_to_serial_packets) == (8, 1)
+        assert (statistics.serial_to_udp_bytes, statistics.serial_to_udp_packets) == (11, 1)
+        assert statistics.last_udp_activity and statistics.last_serial_activity
+        assert list(link.clients) == [client.getsockname()]
+        assert not statistics.serial_errors
+    finally:
+        client.close()
+        await bridge_engine.stop()
+    assert link.closed.done()
+    assert not bridge_engine.links
+
+
+@pytest.mark.asyncio
+async def test_serial_backlog_overflow(serial_pair: Tuple[int, str], monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(engine, "MAX_SERIAL_BACKLOG", 1024)
+    master, serial_path = serial_pair
+    bridge_engine = BridgeEngine()
+    link = await bridge_engine.add_link(serial_path, Baudrate.b115200, "127.0.0.1", 0, automatic_disconnect=False)
+    client = udp_client(link)
+    try:
+        # Nothing reads the serial side, so the pseudo-terminal fills up, then the backlog
+        for _ in range(200):
+            client.send(bytes(1000))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.1)
+        statistics = link.statistics.copy()
+        assert statistics.dropped_bytes > 0
+
+        # Everything that was not dropped reaches the serial port
+        expected = statistics.udp_to_serial_bytes - statistics.dropped_bytes
+        assert len(await read_serial(master, expected + 1, timeout=0.5)) == expected
+    finally:
+        client.close()
+        await bridge_engine.stop()
+
+
+@pytest.mark.asyncio
+async def test_link_closes_on_serial_error(serial_pair: Tuple[int, str]) -> None:
+    master, serial_path = serial_pair
+    bridge_engine = BridgeEngine()
+    link = await bridge_engine.add_link(serial_path, Baudrate.b115200, "127.0.0.1", 0)
+
+    # The port goes away, as when an USB adapter is unplugged
+    unplug(master)
+    await asyncio.wait_for(link.closed, 1.0)
+    assert link.error is not None
+    assert link.statistics.serial_errors == 1
+    assert not bridge_engine.links
+    await bridge_engine.stop()
@@ -0,0 +1,121 @@
+import logging
+import os
+import pty
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from .. import serialtuning
+from ..serialtuning import (
+    AdapterType,
+    SerialTuningReport,
+    detect_adapter,
+    port_users,
+    set_latency_timer,
+    set_low_latency_flag,
+)
+
+
+@pytest.fixture(name="sys_class_tty")
+def fixture_sys_class_tty(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    sys_class_tty = tmp_path.joinpath("sys", "class", "tty")
+    sys_class_tty.mkdir(parents=True)
+    monkeypatch.setattr(serialtuning, "SYS_CLASS_TTY", sys_class_tty)
+    return sys_class_tty
+
+
+def add_port(tmp_path: Path, name: str, device_path: str, driver: Optional[str]) -> str:
+    """Add a port to the fake sysfs tree, with its device under `device_path`, returning the path of the port"""
+    device = tmp_path.joinpath("sys", "devices", device_path, name)
+    device.mkdir(parents=True)
+    if driver is not None:
+        driver_path = tmp_path.joinpath("sys", "bus", "drivers", driver)
+        driver_path.mkdir(parents=True, exist_ok=True)
+        device.joinpath("driver").symlink_to(driver_path)
+    tty = tmp_path.joinpath("sys", "class", "tty", name)
+    tty.mkdir()
+    tty.joinpath("device").symlink_to(device)
+
+    port = tmp_path.joinpath("dev", name)
+    port.parent.mkdir(exist_ok=True)
+    port.touch()
+    return str(port)
+
+
+@pytest.mark.parametrize(
+    "name, device_path, driver, adapter",
+    [
+        ("ttyUSB0", "pci0000:00/usb1/1-1/1-1:1.0", "ftdi_sio", AdapterType.FTDI),
+        ("ttyACM0", "pci0000:00/usb1/1-2/1-2:1.0", "cdc_acm", AdapterType.CDC_ACM),
+        ("ttyUSB1", "pci0000:00/usb1/1-3/1-3:1.0", "some_usb_serial", AdapterType.USB_SERIAL),
+        ("ttyAMA0", "platform/fe201000.serial", "uart-pl011", AdapterType.ONBOARD),
+        ("ttyS0", "platform/serial8250", None, AdapterType.UNKNOWN),
+    ],
+)
+@pytest.mark.usefixtures("sys_class_tty")
+def test_detect_adapter(
+    tmp_path: Path, name: str, device_path: str, driver: Optional[str], adapter: AdapterType
+) -> None:
+    port = add_port(tmp_path, name, device_path, driver)
+    assert detect_adapter(port) == adapter
+
+
+@pytest.mark.usefixtures("sys_class_tty")
+def test_detect_adapter_follows_links(tmp_path: Path) -> None:
+    port = add_port(tmp_path, "ttyUSB0", "pci0000:00/usb1/1-1/1-1:1.0", "ftdi_sio")
+    by_id = tmp_path.joinpath("dev", "serial", "by-id", "usb-FTDI_FT232R-if00-port0")
+    by_id.parent.mkdir(parents=True)
+    by_id.symlink_to(port)
+    assert detect_adapter(str(by_id)) == AdapterType.FTDI
+    assert detect_adapter(str(tmp_path.joinpath("dev", "ttyUSB9"))) == AdapterType.UNKNOWN
+
+
+def test_set_latency_timer(tmp_path: Path, sys_class_tty: Path) -> None:
+    port = add_port(tmp_path, "ttyUSB0", "pci0000:00/usb1/1-1/1-1:1.0", "ftdi_sio")
+    latency_timer = sys_class_tty.joinpath("ttyUSB0", "device", "latency_timer")
+    latency_timer.write_text("16\n", encoding="utf-8")
+
+    assert set_latency_timer(port) == serialtuning.LOW_LATENCY_TIMER
+    assert latency_timer.read_text(encoding="utf-8") == str(serialtuning.LOW_LATENCY_TIMER)
+    assert set_latency_timer(port, 4) == 4
+
+
+def test_set_latency_timer_without_timer(tmp_path: Path, sys_class_tty: Path) -> None:
+    port = add_port(tmp_path, "ttyACM0", "pci0000:00/usb1/1-2/1-2:1.0", "cdc_acm")
+    assert set_latency_timer(port) is None
+    assert not sys_class_tty.joinpath("ttyACM0", "device", "latency_timer").exists()
+
+
+def test_port_users() -> None:
+    master, slave = pty.openpty()
+    port = os.ttyname(slave)
+    try:
+        assert port_users(port) == [os.getpid()]
+    finally:
+        os.close(slave)
+        os.close(master)
+    assert not port_users(port)
+
+
+def test_low_latency_flag_is_not_set_on_ports_in_use(caplog: pytest.LogCaptureFixture) -> None:
+    caplog.set_level(logging.DEBUG)
+    master, slave = pty.openpty()
+    report = SerialTuningReport(device=os.ttyname(slave), adapter=AdapterType.UNKNOWN)
+    try:
+        # Another service, holding the port open
+        with subprocess.Popen(["sleep", "10"], stdin=slave) as user:
+            set_low_latency_flag(report)
+            user.kill()
+        assert f"in use by processes [{user.pid}]" in caplog.text
+        assert "Unable to set low latency mode" not in caplog.text
+
+        # Only this process uses it now, so the port is opened, even if pseudo-terminals don't support the flag
+        caplog.clear()
+        set_low_latency_flag(report)
+        assert "in use" not in caplog.text
+        assert "Unable to set low latency mode" in caplog.text
+    finally:
+        os.close(slave)
+        os.close(master)
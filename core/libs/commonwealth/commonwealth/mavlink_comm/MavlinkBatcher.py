@@ -0,0 +1,106 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from loguru import logger
+
+from commonwealth.mavlink_comm.MavlinkComm import MavlinkMessenger
+from commonwealth.mavlink_comm.typedefs import BatchStats
+
+
+class MavlinkBatcher:
+    # pylint: disable=too-many-instance-attributes
+    """Queue messages from many producers and send them in batches through a single MavlinkMessenger.
+
+    Messages queued within the same time window are sent together, and only one batch is in flight at a time. The
+    queue is bounded: when the upstream can't keep up, the oldest queued messages are dropped, since newer telemetry
+    supersedes them.
+
+    A batch is coalesced into a single write only when the messenger has a native (UDP/TCP) transport. Through
+    mavlink2rest, which takes one message per request, a batch is still sent as one POST per message, so batching
+    only bounds the queue and the number of requests in flight.
+    """
+
+    def __init__(self, messenger: MavlinkMessenger, window: float = 0.01, max_pending: int = 64) -> None:
+        assert window >= 0, "window should not be negative"
+        assert max_pending > 0, "max_pending should be positive"
+
+        self.messenger = messenger
+        self._window = window
+        self._max_pending = max_pending
+        self._pending: Deque[Tuple[float, Dict[str, Any]]] = deque()
+        self._stats: Dict[str, BatchStats] = {}
+
+        # Asyncio primitives are created lazily, as they need to live inside a running event loop
+        self._new_message: Optional[asyncio.Event] = None
+        self._worker: Optional["asyncio.Task[None]"] = None
+        self._closing = False
+
+    def _message_stats(self, message_name: str) -> BatchStats:
+        return self._stats.setdefault(message_name, BatchStats())
+
+    def stats(self) -> Dict[str, BatchStats]:
+        """Sent, dropped and failed counters, with queue latency, for each message type."""
+        return {name: stats.copy() for name, stats in self._stats.items()}
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def send_mavlink_message(self, message: Dict[str, Any]) -> None:
+        """Queue message to be sent on the next batch. Drop-in replacement for MavlinkMessenger's method."""
+        if self._worker is None or self._worker.done():
+            self._new_message = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        assert self._new_message is not None
+
+        if len(self._pending) >= self._max_pending:
+            _, dropped_message = self._pending.popleft()
+            self._message_stats(dropped_message["type"]).dropped += 1
+        self._pending.append((time.monotonic(), message))
+        self._new_message.set()
+
+    async def _run(self) -> None:
+        assert self._new_message is not None
+        while not self._closing:
+            await self._new_message.wait()
+            if not self._closing:
+                # Give other producers the chance to join this batch
+                await asyncio.sleep(self._window)
+            self._new_message.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Send all queued messages right away."""
+        if not self._pending:
+            return
+
+        batch = list(self._pending)
+        self._pending.clear()
+        try:
+            await self.messenger.send_mavlink_messages([message for _, message in batch])
+            failed = False
+        except Exception as error:
+            logger.warning(f"Failed to send batch of {len(batch)} Mavlink messages. {error}")
+            failed = True
+
+        now = time.monotonic()
+        for queued_time, message in batch:
+            stats = self._message_stats(message["type"])
+            if failed:
+                stats.failed += 1
+            else:
+                stats.record_latency(1000 * (now - queued_time))
+
+    async def close(self) -> None:
+        """Send remaining messages and stop the batching worker."""
+        self._closing = True
+        try:
+            if self._worker is not None and self._new_message is not None:
+                # Let the worker finish the batch in flight instead of cancelling it
+                self._new_message.set()
+                await self._worker
+            self._worker = None
+            await self.flush()
+        finally:
+            self._closing = False
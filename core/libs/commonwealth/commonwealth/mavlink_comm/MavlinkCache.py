@@ -0,0 +1,70 @@
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from commonwealth.mavlink_comm.typedefs import CacheStats
+
+
+class CachedMessage(NamedTuple):
+    package: Any
+    # Monotonic time of when the package was received by this process
+    timestamp: float
+
+    def age(self) -> float:
+        return time.monotonic() - self.timestamp
+
+
+def package_age(package: Any) -> float:
+    """Time, in seconds, since mavlink2rest received the message of a REST package, or zero if unknown."""
+    try:
+        last_update = package["status"]["time"]["last_update"]
+    except (KeyError, TypeError):
+        return 0.0
+
+    # mavlink2rest timestamps have nanosecond precision, more than what datetime is able to parse
+    match = re.fullmatch(r"([^.]+)(?:\.(\d+))?(Z|[+-]\d{2}:\d{2})", last_update)
+    if match is None:
+        return 0.0
+    date, fraction, offset = match.groups()
+    fraction = (fraction or "").ljust(6, "0")[:6]
+    offset = "+00:00" if offset == "Z" else offset
+    try:
+        received = datetime.fromisoformat(f"{date}.{fraction}{offset}")
+    except ValueError:
+        return 0.0
+    return max(0.0, (datetime.now(timezone.utc) - received).total_seconds())
+
+
+class MavlinkCache:
+    """Latest received package for each (system ID, component ID, message name)."""
+
+    def __init__(self) -> None:
+        self._messages: Dict[Tuple[int, int, str], CachedMessage] = {}
+        self._stats = CacheStats()
+
+    def update(self, system_id: int, component_id: int, message_name: str, package: Any, age: float = 0.0) -> None:
+        """Store a package, which was received `age` seconds ago."""
+        timestamp = time.monotonic() - age
+        self._messages[(system_id, component_id, message_name.upper())] = CachedMessage(package, timestamp)
+
+    def get(
+        self, system_id: int, component_id: int, message_name: str, max_age: Optional[float] = None
+    ) -> Optional[CachedMessage]:
+        """Get cached message, if it exists and is not older than max_age seconds."""
+        cached = self._messages.get((system_id, component_id, message_name.upper()))
+        if cached is None or (max_age is not None and cached.age() > max_age):
+            self._stats.misses += 1
+            return None
+        self._stats.hits += 1
+        return cached
+
+    def peek(self, system_id: int, component_id: int, message_name: str) -> Optional[CachedMessage]:
+        """Get cached message regardless of its age, without counting it as a hit or miss."""
+        return self._messages.get((system_id, component_id, message_name.upper()))
+
+    def clear(self) -> None:
+        self._messages.clear()
+
+    def stats(self) -> CacheStats:
+        return self._stats.copy(update={"entries": len(self._messages)})
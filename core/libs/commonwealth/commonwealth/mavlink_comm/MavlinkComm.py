@@ -2,24 +2,118 @@ import asyncio
 import json
 import os
 import time
-from typing import Any, Dict, Optional
+from types import TracebackType
+from typing import Any, AsyncGenerator, Dict, List, Optional, Set, Tuple, Type
 
 import aiohttp
+from loguru import logger
 
 from commonwealth.mavlink_comm.exceptions import (
     FetchUpdatedMessageFail,
+    MavlinkMessageEncodeFail,
     MavlinkMessageReceiveFail,
     MavlinkMessageSendFail,
 )
+from commonwealth.mavlink_comm.MavlinkCache import (
+    CachedMessage,
+    MavlinkCache,
+    package_age,
+)
+from commonwealth.mavlink_comm.MavlinkFrame import encode_message, is_supported
+from commonwealth.mavlink_comm.MavlinkRateLimiter import TokenBucket
+from commonwealth.mavlink_comm.MavlinkTransport import AbstractTransport
+from commonwealth.mavlink_comm.typedefs import (
+    CacheStats,
+    ConnectionStats,
+    RateLimitStats,
+)
 
 
 class MavlinkMessenger:
-    def __init__(self) -> None:
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, connection_limit_per_host: int = 4, keepalive_timeout: float = 30.0) -> None:
         self.system_id = int(os.environ.get("MAV_SYSTEM_ID", 1))
         self.component_id = int(os.environ.get("MAV_COMPONENT_ID_ONBOARD_COMPUTER4", 194))
-        self.sequence = 0
         self.m2r_address = "localhost:6040"
 
+        # Each (system ID, component ID) pair has its own packet sequence
+        self._sequences: Dict[Tuple[int, int], int] = {}
+        # Per message type limits, protecting the autopilot link from chatty producers
+        self._rate_limits: Dict[str, TokenBucket] = {}
+
+        # HTTP session is created lazily, as it needs to live inside a running event loop
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._connection_limit_per_host = connection_limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._connection_stats = ConnectionStats()
+
+        # Upstream websocket streams, one per message name, shared by all of its subscribers
+        self._streams: Dict[str, "asyncio.Task[None]"] = {}
+        self._subscribers: Dict[str, Set["asyncio.Queue[Any]"]] = {}
+        self._connected_streams: Set["asyncio.Task[None]"] = set()
+
+        # Native transport used to send supported messages directly to the router, bypassing mavlink2rest
+        self._transport: Optional[AbstractTransport] = None
+
+        # Latest value of every message received, and tasks keeping some of them up to date
+        self._cache = MavlinkCache()
+        self._cache_feeders: Dict[str, "asyncio.Task[None]"] = {}
+
+    async def __aenter__(self) -> "MavlinkMessenger":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the HTTP session and release all pooled connections."""
+        for feeder in self._cache_feeders.values():
+            feeder.cancel()
+        self._cache_feeders.clear()
+        for stream in self._streams.values():
+            stream.cancel()
+        self._streams.clear()
+        if self._transport is not None:
+            await self._transport.close()
+        if self._session is None:
+            return
+        await self._session.close()
+        self._session = None
+
+    def connection_stats(self) -> ConnectionStats:
+        return self._connection_stats.copy()
+
+    async def _on_connection_create_end(self, *_: Any) -> None:
+        self._connection_stats.created += 1
+
+    async def _on_connection_reuseconn(self, *_: Any) -> None:
+        self._connection_stats.reused += 1
+
+    async def _on_request_end(self, *_: Any) -> None:
+        self._connection_stats.requests += 1
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        trace_config.on_request_end.append(self._on_request_end)
+        return trace_config
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared keep-alive HTTP session, creating it if necessary."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self._connection_limit_per_host,
+                keepalive_timeout=self._keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config()])
+        return self._session
+
     def set_system_id(self, system_id: int) -> None:
         self.system_id = system_id
 
@@ -27,7 +121,52 @@ class MavlinkMessenger:
         self.component_id = component_id
 
     def set_sequence(self, sequence: int) -> None:
-        self.sequence = sequence
+        self._sequences[(self.system_id, self.component_id)] = sequence % 256
+
+    @property
+    def sequence(self) -> int:
+        """Sequence number to be used by the next packet sent with the current system and component IDs."""
+        return self._sequences.get((self.system_id, self.component_id), 0)
+
+    def _next_sequence(self) -> int:
+        sequence = self.sequence
+        self._sequences[(self.system_id, self.component_id)] = (sequence + 1) % 256
+        return sequence
+
+    def set_rate_limit(self, message_name: str, rate: float, burst: int = 1, max_delay: float = 0.0) -> None:
+        """Limit how often a message type can be sent.
+
+        Args:
+            message_name (str): Name of the Mavlink message, e.g. "GPS_INPUT".
+            rate (float): Average number of messages per second allowed.
+            burst (int): Number of messages that can be sent at once after a quiet period.
+            max_delay (float): Maximum time in seconds a message can be held waiting for its turn before being dropped.
+        """
+        self._rate_limits[message_name.upper()] = TokenBucket(rate, burst, max_delay)
+
+    def remove_rate_limit(self, message_name: str) -> None:
+        self._rate_limits.pop(message_name.upper(), None)
+
+    def rate_limit_stats(self) -> Dict[str, RateLimitStats]:
+        return {name: bucket.stats() for name, bucket in self._rate_limits.items()}
+
+    async def _admit(self, message: Dict[str, Any]) -> bool:
+        """Wait for the message's turn to be sent. Returns False if it should be dropped instead."""
+        bucket = self._rate_limits.get(message["type"])
+        if bucket is None:
+            return True
+        delay = bucket.reserve()
+        if delay is None:
+            logger.debug(f"Dropping {message['type']} message, as it exceeds its rate limit.")
+            return False
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return True
+
+    def set_transport(self, transport: Optional[AbstractTransport]) -> None:
+        """Send supported messages as raw MAVLink frames through the given transport.
+        Messages without a frame definition keep going through mavlink2rest, which is also used if None is given."""
+        self._transport = transport
 
     def set_m2r_address(self, address: str) -> None:
         if len(address.split(":")) != 2:
@@ -38,6 +177,10 @@ class MavlinkMessenger:
     def m2r_rest_url(self) -> str:
         return f"http://{self.m2r_address}/mavlink"
 
+    @property
+    def m2r_ws_url(self) -> str:
+        return f"ws://{self.m2r_address}/ws/mavlink"
+
     async def get_mavlink_message(
         self, message_name: Optional[str] = None, vehicle: Optional[int] = 1, component: Optional[int] = 1
     ) -> Any:
@@ -46,23 +189,233 @@ class MavlinkMessenger:
             request_url += f"/{message_name.upper()}"
 
         request_timeout = 1.0
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(request_url, timeout=request_timeout) as response:
-                    if not response.status == 200:
-                        raise MavlinkMessageReceiveFail(f"Received status code of {response.status}.")
-                    message = await response.json()
-            except asyncio.exceptions.TimeoutError as error:
-                raise MavlinkMessageReceiveFail(f"Request timed out after {request_timeout} second.") from error
+        session = self._get_session()
+        try:
+            async with session.get(request_url, timeout=request_timeout) as response:
+                if not response.status == 200:
+                    raise MavlinkMessageReceiveFail(f"Received status code of {response.status}.")
+                message = await response.json()
+        except asyncio.exceptions.TimeoutError as error:
+            raise MavlinkMessageReceiveFail(f"Request timed out after {request_timeout} second.") from error
 
+        if vehicle is not None and component is not None:
+            # Without a name, the response holds the latest package of every message type of the component
+            packages = {message_name: message} if message_name else message
+            for name, package in packages.items():
+                self._cache.update(vehicle, component, name, package, package_age(package))
         return message
 
+    async def get_mavlink_messages(
+        self,
+        message_names: Optional[List[str]] = None,
+        vehicle: int = 1,
+        component: int = 1,
+        max_age: Optional[float] = None,
+    ) -> Dict[str, Optional[CachedMessage]]:
+        """Get the latest packages of many message types in a single round-trip.
+
+        A few missing messages are fetched concurrently, through the pooled connections. When there are more of
+        them than connections, the whole component is fetched with a single request instead.
+
+        Args:
+            message_names (Optional[List[str]]): Names of the Mavlink messages. Defaults to all messages.
+            vehicle (int): System ID of the sender.
+            component (int): Component ID of the sender.
+            max_age (Optional[float]): Cached messages not older than this, in seconds, are not fetched again.
+                Defaults to always fetching.
+
+        Returns:
+            Dict[str, Optional[CachedMessage]]: Package and its reception time for each message, or None for
+            messages that mavlink2rest has not received or could not be fetched.
+        """
+        if message_names is None:
+            packages = await self.get_mavlink_message(None, vehicle, component)
+            return {name: self._cache.peek(vehicle, component, name) for name in packages}
+        message_names = [name.upper() for name in message_names]
+
+        missing = message_names
+        if max_age is not None:
+            missing = [name for name in message_names if self._cache.get(vehicle, component, name, max_age) is None]
+        if len(missing) > self._connection_limit_per_host:
+            await self.get_mavlink_message(None, vehicle, component)
+        elif missing:
+            results = await asyncio.gather(
+                *[self.get_mavlink_message(name, vehicle, component) for name in missing], return_exceptions=True
+            )
+            for result in results:
+                # Unavailable messages are reported as missing, but other errors are not expected
+                if isinstance(result, Exception) and not isinstance(result, MavlinkMessageReceiveFail):
+                    raise result
+
+        return {name: self._cache.peek(vehicle, component, name) for name in message_names}
+
+    def cached_mavlink_message(
+        self, message_name: str, vehicle: int = 1, component: int = 1, max_age: Optional[float] = None
+    ) -> Any:
+        """Get latest received message, without any network round-trip.
+
+        Args:
+            message_name (str): Name of the Mavlink message, e.g. "HEARTBEAT".
+            vehicle (int): System ID of the sender.
+            component (int): Component ID of the sender.
+            max_age (Optional[float]): Maximum age of the message in seconds. Defaults to any age.
+
+        Returns:
+            Any: Cached Mavlink2Rest package, or None if there's none fresh enough.
+        """
+        cached = self._cache.get(vehicle, component, message_name, max_age)
+        return cached.package if cached else None
+
+    async def get_cached_mavlink_message(
+        self, message_name: str, vehicle: int = 1, component: int = 1, max_age: float = 1.0
+    ) -> Any:
+        """Get message from cache if it's not older than max_age seconds, fetching it from mavlink2rest otherwise."""
+        package = self.cached_mavlink_message(message_name, vehicle, component, max_age)
+        if package is not None:
+            return package
+        return await self.get_mavlink_message(message_name, vehicle, component)
+
+    def start_caching(self, message_name: str) -> None:
+        """Keep cache of a given message type up to date with a background subscription."""
+        message_name = message_name.upper()
+        if message_name in self._cache_feeders and not self._cache_feeders[message_name].done():
+            return
+        self._cache_feeders[message_name] = asyncio.create_task(self._feed_cache(message_name))
+
+    def stop_caching(self, message_name: str) -> None:
+        feeder = self._cache_feeders.pop(message_name.upper(), None)
+        if feeder is not None:
+            feeder.cancel()
+
+    async def _feed_cache(self, message_name: str) -> None:
+        while True:
+            try:
+                # Cache is updated when packages are published, subscribing is enough
+                async for _ in self.subscribe(message_name):
+                    pass
+            except MavlinkMessageReceiveFail as error:
+                logger.debug(f"Cache feed for {message_name} interrupted, retrying. {error}")
+                await asyncio.sleep(1.0)
+
+    def cache_stats(self) -> CacheStats:
+        return self._cache.stats()
+
+    def _publish(self, message_name: str, item: Any) -> None:
+        if isinstance(item, dict):
+            self._cache.update(item["header"]["system_id"], item["header"]["component_id"], message_name, item)
+        for queue in self._subscribers.get(message_name, set()):
+            # Subscribers only care about the latest state, so slow ones lose their oldest messages
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(item)
+
+    async def _stream_messages(self, message_name: str) -> None:
+        """Forward every message of a given type, received from mavlink2rest's websocket, to its subscribers."""
+        session = self._get_session()
+        stream = asyncio.current_task()
+        try:
+            async with session.ws_connect(self.m2r_ws_url, params={"filter": f"^{message_name}$"}) as websocket:
+                self._connected_streams.add(stream)  # type: ignore
+                async for frame in websocket:
+                    if frame.type != aiohttp.WSMsgType.TEXT:
+                        continue
+                    self._publish(message_name, json.loads(frame.data))
+            error = MavlinkMessageReceiveFail(f"Stream for {message_name} was closed by mavlink2rest.")
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError) as stream_error:
+            error = MavlinkMessageReceiveFail(f"Stream for {message_name} failed: {stream_error}")
+        finally:
+            self._connected_streams.discard(stream)  # type: ignore
+        self._publish(message_name, error)
+
+    async def wait_stream(self, message_name: str, timeout: float = 1.0) -> None:
+        """Wait until the upstream stream of a subscribed message type is connected.
+
+        Useful when a subscriber must not miss a reply to something it's about to send.
+        """
+        message_name = message_name.upper()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            stream = self._streams.get(message_name)
+            if stream in self._connected_streams:
+                return
+            if stream is not None and stream.done():
+                break
+            await asyncio.sleep(0.01)
+        raise MavlinkMessageReceiveFail(f"Stream for {message_name} is not available.")
+
+    async def subscribe(
+        self,
+        message_name: str,
+        vehicle: Optional[int] = None,
+        component: Optional[int] = None,
+        queue_size: int = 10,
+    ) -> AsyncGenerator[Any, None]:
+        """Iterate over new messages of a given type as they are pushed by mavlink2rest.
+
+        All subscribers of the same message type share a single upstream websocket stream, which is closed
+        when the last of them leaves.
+
+        Args:
+            message_name (str): Name of the Mavlink message, e.g. "HEARTBEAT".
+            vehicle (Optional[int]): Only yield messages from this system ID. Defaults to any.
+            component (Optional[int]): Only yield messages from this component ID. Defaults to any.
+            queue_size (int): Number of messages kept for a slow subscriber before dropping the oldest ones.
+
+        Yields:
+            Any: Mavlink2Rest package, containing "header" and "message" entries.
+        """
+        message_name = message_name.upper()
+        queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=queue_size)
+        self._subscribers.setdefault(message_name, set()).add(queue)
+        if message_name not in self._streams or self._streams[message_name].done():
+            self._streams[message_name] = asyncio.create_task(self._stream_messages(message_name))
+
+        try:
+            while True:
+                package = await queue.get()
+                if isinstance(package, Exception):
+                    raise package
+                header = package["header"]
+                if vehicle is not None and header["system_id"] != vehicle:
+                    continue
+                if component is not None and header["component_id"] != component:
+                    continue
+                yield package
+        finally:
+            subscribers = self._subscribers[message_name]
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[message_name]
+                stream = self._streams.pop(message_name, None)
+                if stream is not None:
+                    stream.cancel()
+
     async def get_updated_mavlink_message(
         self,
         message_name: str,
         vehicle: int = 1,
         component: int = 1,
         timeout: float = 10.0,
+    ) -> Any:
+        subscription = self.subscribe(message_name, vehicle, component)
+        try:
+            return await asyncio.wait_for(subscription.__anext__(), timeout)
+        except asyncio.exceptions.TimeoutError as error:
+            raise FetchUpdatedMessageFail(f"Did not receive an updated {message_name} before timeout.") from error
+        except MavlinkMessageReceiveFail as error:
+            logger.debug(f"Could not stream {message_name}, falling back to polling. {error}")
+        finally:
+            await subscription.aclose()
+
+        return await self._poll_updated_mavlink_message(message_name, vehicle, component, timeout)
+
+    async def _poll_updated_mavlink_message(
+        self,
+        message_name: str,
+        vehicle: int,
+        component: int,
+        timeout: float,
     ) -> Any:
         first_message = await self.get_mavlink_message(message_name, vehicle, component)
         first_message_counter = first_message["status"]["time"]["counter"]
@@ -79,18 +432,63 @@ class MavlinkMessenger:
         return new_message
 
     async def send_mavlink_message(self, message: Dict[str, Any]) -> None:
+        if not await self._admit(message):
+            return
+
+        if self._transport is not None and is_supported(message["type"]):
+            try:
+                frame = encode_message(message, self.system_id, self.component_id, self.sequence)
+                self._next_sequence()
+                await self._transport.send(frame)
+                return
+            except MavlinkMessageEncodeFail as error:
+                logger.debug(f"Could not encode message, sending it through mavlink2rest. {error}")
+
+        await self._post_mavlink_message(message)
+
+    async def send_mavlink_messages(self, messages: List[Dict[str, Any]]) -> None:
+        """Send multiple messages at once.
+
+        When a native transport is set, all supported messages are coalesced into a single write. The remaining ones,
+        and all of them without a native transport, are sent one POST after the other through mavlink2rest, which
+        takes a single message per request, reusing the same connection.
+        """
+        rest_messages = [message for message in messages if await self._admit(message)]
+        if self._transport is not None:
+            frames = bytearray()
+            native_messages, rest_messages = rest_messages, []
+            for message in native_messages:
+                try:
+                    if is_supported(message["type"]):
+                        frames += encode_message(message, self.system_id, self.component_id, self.sequence)
+                        self._next_sequence()
+                        continue
+                except MavlinkMessageEncodeFail as error:
+                    logger.debug(f"Could not encode message, sending it through mavlink2rest. {error}")
+                rest_messages.append(message)
+            if frames:
+                await self._transport.send(bytes(frames))
+
+        for message in rest_messages:
+            await self._post_mavlink_message(message)
+
+    async def _post_mavlink_message(self, message: Dict[str, Any]) -> None:
         mavlink2rest_package = {
-            "header": {"system_id": self.system_id, "component_id": self.component_id, "sequence": self.sequence},
+            "header": {
+                "system_id": self.system_id,
+                "component_id": self.component_id,
+                "sequence": self._next_sequence(),
+            },
             "message": message,
         }
 
         request_timeout = 1.0
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    self.m2r_rest_url, data=json.dumps(mavlink2rest_package), timeout=request_timeout
-                ) as response:
-                    if not response.status == 200:
-                        raise MavlinkMessageSendFail(f"Received status code of {response.status}.")
-            except asyncio.exceptions.TimeoutError as error:
-                raise MavlinkMessageSendFail(f"Request timed out after {request_timeout} second.") from error
+        session = self._get_session()
+        try:
+            async with session.post(
+                self.m2r_rest_url, data=json.dumps(mavlink2rest_package), timeout=request_timeout
+            ) as response:
+                if not response.status == 200:
+                    raise MavlinkMessageSendFail(f"Received status code of {response.status}.")
+        except asyncio.exceptions.TimeoutError as error:
+            raise MavlinkMessageSendFail(f"Request timed out after {request_timeout} second.") from error
@@ -0,0 +1,181 @@
+"""Minimal MAVLink v2 frame encoder for the messages BlueOS services send to the autopilot.
+
+Messages are described in the same JSON format used by mavlink2rest, so they can be sent through any transport.
+"""
+import struct
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from commonwealth.mavlink_comm.exceptions import MavlinkMessageEncodeFail
+
+MAVLINK_V2_STX = 0xFD
+
+
+class MessageDefinition(NamedTuple):
+    id: int
+    crc_extra: int
+    # Pairs of (field name, struct format), in wire order
+    fields: List[Tuple[str, str]]
+
+
+MESSAGE_DEFINITIONS: Dict[str, MessageDefinition] = {
+    "COMMAND_LONG": MessageDefinition(
+        76,
+        152,
+        [
+            ("param1", "f"),
+            ("param2", "f"),
+            ("param3", "f"),
+            ("param4", "f"),
+            ("param5", "f"),
+            ("param6", "f"),
+            ("param7", "f"),
+            ("command", "H"),
+            ("target_system", "B"),
+            ("target_component", "B"),
+            ("confirmation", "B"),
+        ],
+    ),
+    "DISTANCE_SENSOR": MessageDefinition(
+        132,
+        85,
+        [
+            ("time_boot_ms", "I"),
+            ("min_distance", "H"),
+            ("max_distance", "H"),
+            ("current_distance", "H"),
+            ("type", "B"),
+            ("id", "B"),
+            ("orientation", "B"),
+            ("covariance", "B"),
+            ("horizontal_fov", "f"),
+            ("vertical_fov", "f"),
+            ("quaternion", "4f"),
+            ("signal_quality", "B"),
+        ],
+    ),
+    "GPS_INPUT": MessageDefinition(
+        232,
+        151,
+        [
+            ("time_usec", "Q"),
+            ("time_week_ms", "I"),
+            ("lat", "i"),
+            ("lon", "i"),
+            ("alt", "f"),
+            ("hdop", "f"),
+            ("vdop", "f"),
+            ("vn", "f"),
+            ("ve", "f"),
+            ("vd", "f"),
+            ("speed_accuracy", "f"),
+            ("horiz_accuracy", "f"),
+            ("vert_accuracy", "f"),
+            ("ignore_flags", "H"),
+            ("time_week", "H"),
+            ("gps_id", "B"),
+            ("fix_type", "B"),
+            ("satellites_visible", "B"),
+            ("yaw", "H"),
+        ],
+    ),
+}
+
+# Enum entry names are unique across MAVLink, so a single lookup table is enough
+ENUM_VALUES: Dict[str, int] = {
+    "MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN": 246,
+    "MAV_CMD_COMPONENT_ARM_DISARM": 400,
+    "MAV_CMD_SET_MESSAGE_INTERVAL": 511,
+    "MAV_CMD_REQUEST_MESSAGE": 512,
+    "MAV_DISTANCE_SENSOR_LASER": 0,
+    "MAV_DISTANCE_SENSOR_ULTRASOUND": 1,
+    "MAV_DISTANCE_SENSOR_INFRARED": 2,
+    "MAV_DISTANCE_SENSOR_RADAR": 3,
+    "MAV_DISTANCE_SENSOR_UNKNOWN": 4,
+    "MAV_SENSOR_ROTATION_NONE": 0,
+    "MAV_SENSOR_ROTATION_YAW_45": 1,
+    "MAV_SENSOR_ROTATION_YAW_90": 2,
+    "MAV_SENSOR_ROTATION_YAW_135": 3,
+    "MAV_SENSOR_ROTATION_YAW_180": 4,
+    "MAV_SENSOR_ROTATION_YAW_225": 5,
+    "MAV_SENSOR_ROTATION_YAW_270": 6,
+    "MAV_SENSOR_ROTATION_YAW_315": 7,
+    "MAV_SENSOR_ROTATION_PITCH_180": 12,
+    "MAV_SENSOR_ROTATION_PITCH_90": 24,
+    "MAV_SENSOR_ROTATION_PITCH_270": 25,
+}
+
+
+def is_supported(message_name: str) -> bool:
+    return message_name in MESSAGE_DEFINITIONS
+
+
+def x25_crc(data: bytes, crc: int = 0xFFFF) -> int:
+    """CRC-16/MCRF4XX checksum, as used by MAVLink."""
+    for byte in data:
+        tmp = byte ^ (crc & 0xFF)
+        tmp = (tmp ^ (tmp << 4)) & 0xFF
+        crc = ((crc >> 8) ^ (tmp << 8) ^ (tmp << 3) ^ (tmp >> 4)) & 0xFFFF
+    return crc
+
+
+def field_value(message: Dict[str, Any], name: str) -> Any:
+    # Mavlink2Rest renames "type" fields to "mavtype", as "type" is used for the message name
+    value = message.get("mavtype" if name == "type" else name, 0)
+    if isinstance(value, dict):
+        if "bits" in value:
+            return value["bits"]
+        try:
+            return ENUM_VALUES[value["type"]]
+        except KeyError as error:
+            raise MavlinkMessageEncodeFail(f"Unknown enum value for field '{name}': {value}.") from error
+    return value
+
+
+def encode_payload(message: Dict[str, Any]) -> Tuple[MessageDefinition, bytes]:
+    message_name = message["type"]
+    try:
+        definition = MESSAGE_DEFINITIONS[message_name]
+    except KeyError as error:
+        raise MavlinkMessageEncodeFail(f"No frame definition available for {message_name}.") from error
+
+    payload = bytearray()
+    try:
+        for name, field_format in definition.fields:
+            value = field_value(message, name)
+            if field_format[0].isdigit():
+                payload += struct.pack(f"<{field_format}", *value)
+            else:
+                payload += struct.pack(f"<{field_format}", value)
+    except (struct.error, TypeError) as error:
+        raise MavlinkMessageEncodeFail(f"Invalid content for {message_name}: {error}") from error
+
+    # MAVLink 2 truncates empty bytes at the end of the payload, but always keeps the first one
+    return definition, bytes(payload[:1] + payload[1:].rstrip(b"\x00"))
+
+
+def encode_message(message: Dict[str, Any], system_id: int, component_id: int, sequence: int) -> bytes:
+    """Encode a Mavlink2Rest-formatted message into a MAVLink v2 frame.
+
+    Args:
+        message (Dict[str, Any]): Message content, following mavlink2rest's format.
+        system_id (int): Sender system ID.
+        component_id (int): Sender component ID.
+        sequence (int): Packet sequence number.
+
+    Returns:
+        bytes: MAVLink v2 frame, ready to be sent.
+    """
+    definition, payload = encode_payload(message)
+    header = struct.pack(
+        "<BBBBBBHB",
+        len(payload),
+        0,  # Incompatibility flags, no signing
+        0,  # Compatibility flags
+        sequence % 256,
+        system_id,
+        component_id,
+        definition.id & 0xFFFF,
+        definition.id >> 16,
+    )
+    crc = x25_crc(bytes([definition.crc_extra]), x25_crc(header + payload))
+    return bytes([MAVLINK_V2_STX]) + header + payload + struct.pack("<H", crc)
@@ -0,0 +1,51 @@
+import time
+from typing import Optional
+
+from commonwealth.mavlink_comm.typedefs import RateLimitStats
+
+
+class TokenBucket:
+    """Token-bucket limiter, allowing bursts of up to `burst` messages and `rate` messages per second on average.
+
+    Messages that would need to wait longer than `max_delay` seconds for a token are dropped.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, max_delay: float = 0.0) -> None:
+        assert rate > 0, "rate should be positive"
+        assert burst > 0, "burst should be positive"
+        assert max_delay >= 0, "max_delay should not be negative"
+
+        self.rate = rate
+        self.burst = burst
+        self.max_delay = max_delay
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._stats = RateLimitStats()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def reserve(self) -> Optional[float]:
+        """Reserve a token for a new message.
+
+        Returns:
+            Optional[float]: Time in seconds to wait before sending the message, or None if it should be dropped.
+        """
+        self._refill()
+        # Tokens can go negative, accounting for messages already waiting for their turn
+        delay = max(0.0, (1.0 - self._tokens) / self.rate)
+        if delay > self.max_delay:
+            self._stats.dropped += 1
+            return None
+
+        self._tokens -= 1.0
+        if delay > 0:
+            self._stats.throttled += 1
+        else:
+            self._stats.passed += 1
+        return delay
+
+    def stats(self) -> RateLimitStats:
+        return self._stats.copy()
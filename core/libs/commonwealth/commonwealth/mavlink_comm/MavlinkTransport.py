@@ -0,0 +1,96 @@
+import abc
+import asyncio
+from typing import Optional, Tuple
+
+from loguru import logger
+
+from commonwealth.mavlink_comm.exceptions import MavlinkMessageSendFail
+
+
+class AbstractTransport(metaclass=abc.ABCMeta):
+    """Raw link used to deliver encoded MAVLink frames to a mavlink-router endpoint."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+
+    @abc.abstractmethod
+    async def send(self, frame: bytes) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def close(self) -> None:
+        pass
+
+    def __str__(self) -> str:
+        return f"{type(self).__name__}:{self.host}:{self.port}"
+
+
+class UdpTransport(AbstractTransport):
+    """Send frames as datagrams to an UDP server endpoint, e.g. one created by ArduPilotManager."""
+
+    def __init__(self, host: str, port: int) -> None:
+        super().__init__(host, port)
+        self._transport: Optional[asyncio.DatagramTransport] = None
+
+    async def _connect(self) -> asyncio.DatagramTransport:
+        if self._transport is None or self._transport.is_closing():
+            loop = asyncio.get_running_loop()
+            # Incoming traffic from the router is not used, the default protocol discards it
+            self._transport, _ = await loop.create_datagram_endpoint(
+                asyncio.DatagramProtocol, remote_addr=(self.host, self.port)
+            )
+        return self._transport
+
+    async def send(self, frame: bytes) -> None:
+        try:
+            transport = await self._connect()
+            transport.sendto(frame)
+        except OSError as error:
+            raise MavlinkMessageSendFail(f"Could not send frame through {self}: {error}") from error
+
+    async def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+
+class TcpTransport(AbstractTransport):
+    """Send frames through a TCP connection to a TCP server endpoint, like the router's "Internal Link"."""
+
+    def __init__(self, host: str, port: int) -> None:
+        super().__init__(host, port)
+        self._connection: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._discard_task: Optional["asyncio.Task[None]"] = None
+
+    @staticmethod
+    async def _discard_incoming(reader: asyncio.StreamReader) -> None:
+        # The router forwards all vehicle traffic to us, so it needs to be consumed to avoid stalling the link
+        while await reader.read(4096):
+            pass
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        if self._connection is None or self._connection[1].is_closing():
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            self._connection = (reader, writer)
+            self._discard_task = asyncio.create_task(self._discard_incoming(reader))
+            logger.debug(f"Connected to {self}.")
+        return self._connection[1]
+
+    async def send(self, frame: bytes) -> None:
+        try:
+            writer = await self._connect()
+            writer.write(frame)
+            await writer.drain()
+        except OSError as error:
+            await self.close()
+            raise MavlinkMessageSendFail(f"Could not send frame through {self}: {error}") from error
+
+    async def close(self) -> None:
+        if self._discard_task is not None:
+            self._discard_task.cancel()
+            self._discard_task = None
+        if self._connection is not None:
+            writer = self._connection[1]
+            self._connection = None
+            writer.close()
@@ -1,18 +1,33 @@
-from typing import Any, Dict, List
+import asyncio
+from typing import Any, Dict, List, Optional
 
 from loguru import logger
 
-from commonwealth.mavlink_comm.exceptions import VehicleDisarmFail
+from commonwealth.mavlink_comm.exceptions import (
+    MavlinkCommandFail,
+    MavlinkCommandNotAcknowledged,
+    MavlinkMessageReceiveFail,
+    VehicleDisarmFail,
+)
 from commonwealth.mavlink_comm.MavlinkComm import MavlinkMessenger
 from commonwealth.mavlink_comm.typedefs import (
     FirmwareInfo,
     FirmwareVersionType,
     MavlinkMessageId,
     MavlinkVehicleType,
+    MessageSnapshot,
+    VehicleSnapshot,
 )
 
 MAV_MODE_FLAG_SAFETY_ARMED = 128
 
+# Maximum age, in seconds, of cached messages used to answer vehicle information requests
+AUTOPILOT_VERSION_MAX_AGE = 10.0
+HEARTBEAT_MAX_AGE = 2.0
+
+# Time, in seconds, to wait for the COMMAND_ACK stream to be connected before sending commands without it
+ACK_STREAM_TIMEOUT = 1.0
+
 
 class VehicleManager:
     def __init__(self) -> None:
@@ -22,6 +37,18 @@ class VehicleManager:
         self.target_component = 1
         self.confirmation = 0
 
+        # In-flight COMMAND_LONGs, by command type, waiting for their COMMAND_ACK
+        self._pending_commands: Dict[str, "asyncio.Queue[Dict[str, Any]]"] = {}
+        # The ACK only tells which command type it refers to, so only one command of each type can be in flight
+        self._command_locks: Dict[str, asyncio.Lock] = {}
+        self._ack_listener: Optional["asyncio.Task[None]"] = None
+
+    async def close(self) -> None:
+        if self._ack_listener is not None:
+            self._ack_listener.cancel()
+            self._ack_listener = None
+        await self.mavlink2rest.close()
+
     def set_target_system(self, target_system: int) -> None:
         self.target_system = target_system
 
@@ -47,16 +74,125 @@ class VehicleManager:
             "confirmation": self.confirmation,
         }
 
+    async def _listen_command_acks(self) -> None:
+        subscription = self.mavlink2rest.subscribe("COMMAND_ACK", self.target_system, self.target_component)
+        try:
+            async for package in subscription:
+                ack = package["message"]
+                # Skip ACKs addressed to other GCSs or companion components
+                if ack.get("target_system", 0) not in [0, self.mavlink2rest.system_id]:
+                    continue
+                if ack.get("target_component", 0) not in [0, self.mavlink2rest.component_id]:
+                    continue
+                pending = self._pending_commands.get(ack["command"]["type"])
+                if pending is not None:
+                    pending.put_nowait(ack)
+        except MavlinkMessageReceiveFail as error:
+            logger.debug(f"COMMAND_ACK stream stopped. {error}")
+        finally:
+            await subscription.aclose()
+
+    async def _ensure_ack_listener(self) -> bool:
+        """Make sure COMMAND_ACKs are being listened to, returning False if they can't be received."""
+        if self._ack_listener is None or self._ack_listener.done():
+            self._ack_listener = asyncio.create_task(self._listen_command_acks())
+        try:
+            await self.mavlink2rest.wait_stream("COMMAND_ACK", ACK_STREAM_TIMEOUT)
+            return True
+        except MavlinkMessageReceiveFail as error:
+            logger.warning(f"Could not listen to command acknowledgements. {error}")
+            return False
+
+    async def send_command_long(
+        self,
+        command_type: str,
+        params: List[float],
+        ack_timeout: float = 1.0,
+        retries: int = 3,
+        backoff: float = 2.0,
+    ) -> Optional[Dict[str, Any]]:
+        """Send a COMMAND_LONG and wait for its COMMAND_ACK, resending it if no ACK arrives.
+
+        Commands of different types can be in flight at the same time, while commands of the same type are queued.
+
+        Args:
+            command_type (str): MAV_CMD name, e.g. "MAV_CMD_COMPONENT_ARM_DISARM".
+            params (List[float]): Command parameters, missing ones are sent as zero.
+            ack_timeout (float): Time, in seconds, to wait for the ACK of the first attempt.
+            retries (int): Number of attempts before giving up.
+            backoff (float): Factor applied to the ACK timeout after each attempt.
+
+        Returns:
+            Optional[Dict[str, Any]]: Accepted COMMAND_ACK message, or None if ACKs could not be received and
+            the command was sent without confirmation.
+        """
+        lock = self._command_locks.setdefault(command_type, asyncio.Lock())
+        async with lock:
+            if not await self._ensure_ack_listener():
+                await self.mavlink2rest.send_mavlink_message(self.command_long_message(command_type, params))
+                return None
+
+            timeout = ack_timeout
+            for attempt in range(retries):
+                message = self.command_long_message(command_type, params)
+                # Confirmation field tells the vehicle this is a retransmission of the same command
+                message["confirmation"] = (self.confirmation + attempt) % 256
+                ack = await self._send_and_wait_ack(message, timeout)
+                timeout *= backoff
+                if ack is None:
+                    logger.debug(f"No ACK for {command_type} (attempt {attempt + 1}/{retries}).")
+                    continue
+
+                result = ack["result"]["type"]
+                if result == "MAV_RESULT_ACCEPTED":
+                    return ack
+                if result == "MAV_RESULT_TEMPORARILY_REJECTED":
+                    logger.debug(f"{command_type} temporarily rejected (attempt {attempt + 1}/{retries}).")
+                    await asyncio.sleep(ack_timeout * backoff**attempt)
+                    continue
+                raise MavlinkCommandFail(f"{command_type} was not accepted by the vehicle: {result}.")
+
+            raise MavlinkCommandNotAcknowledged(f"{command_type} was not acknowledged after {retries} attempts.")
+
+    async def _send_and_wait_ack(self, message: Dict[str, Any], timeout: float) -> Optional[Dict[str, Any]]:
+        command_type = message["command"]["type"]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        acks: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._pending_commands[command_type] = acks
+        try:
+            await self.mavlink2rest.send_mavlink_message(message)
+            while True:
+                try:
+                    ack = await asyncio.wait_for(acks.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    return None
+                if ack["result"]["type"] != "MAV_RESULT_IN_PROGRESS":
+                    return ack
+                # Long running commands report progress, keep waiting for the final result without resending
+                deadline = loop.time() + timeout
+        finally:
+            del self._pending_commands[command_type]
+
     async def request_message(self, message_id: int) -> None:
-        message = self.command_long_message("MAV_CMD_REQUEST_MESSAGE", [message_id])
-        await self.mavlink2rest.send_mavlink_message(message)
+        await self.send_command_long("MAV_CMD_REQUEST_MESSAGE", [message_id])
 
     async def get_firmware_info(self) -> FirmwareInfo:
-        request_message = self.command_long_message(
-            "MAV_CMD_REQUEST_MESSAGE", [MavlinkMessageId.AUTOPILOT_VERSION.value]
+        autopilot_version = self.mavlink2rest.cached_mavlink_message(
+            MavlinkMessageId.AUTOPILOT_VERSION.name,
+            self.target_system,
+            self.target_component,
+            max_age=AUTOPILOT_VERSION_MAX_AGE,
         )
-        await self.mavlink2rest.send_mavlink_message(request_message)
-        autopilot_version = await self.mavlink2rest.get_mavlink_message(MavlinkMessageId.AUTOPILOT_VERSION.name)
+        if autopilot_version is None:
+            try:
+                await self.request_message(MavlinkMessageId.AUTOPILOT_VERSION.value)
+            except MavlinkCommandFail as error:
+                # Not every autopilot acknowledges the request, the last message received may still be available
+                logger.debug(f"Could not request AUTOPILOT_VERSION, using the last one received. {error}")
+            autopilot_version = await self.mavlink2rest.get_mavlink_message(
+                MavlinkMessageId.AUTOPILOT_VERSION.name, self.target_system, self.target_component
+            )
         flight_sw_version_raw = autopilot_version["message"]["flight_sw_version"]
 
         major, minor, patch, version_type_raw = flight_sw_version_raw.to_bytes(4, byteorder="big")
@@ -67,16 +203,50 @@ class VehicleManager:
         return FirmwareInfo(version=firmware_version, type=version_type)
 
     async def get_vehicle_type(self) -> MavlinkVehicleType:
-        heartbeat_message = await self.mavlink2rest.get_updated_mavlink_message("HEARTBEAT")
+        heartbeat_message = self.mavlink2rest.cached_mavlink_message(
+            "HEARTBEAT", self.target_system, self.target_component, max_age=HEARTBEAT_MAX_AGE
+        )
+        if heartbeat_message is None:
+            heartbeat_message = await self.mavlink2rest.get_updated_mavlink_message(
+                "HEARTBEAT", self.target_system, self.target_component
+            )
         return MavlinkVehicleType[heartbeat_message["message"]["mavtype"]["type"]]  # type: ignore
 
+    async def snapshot(
+        self, message_names: Optional[List[str]] = None, max_age: Optional[float] = None
+    ) -> VehicleSnapshot:
+        """Get the latest state of many messages of the target vehicle in a single round-trip.
+
+        Args:
+            message_names (Optional[List[str]]): Names of the Mavlink messages, e.g. ["HEARTBEAT", "SYS_STATUS"].
+                Defaults to all messages received from the target component.
+            max_age (Optional[float]): Cached messages not older than this, in seconds, are not fetched again.
+
+        Returns:
+            VehicleSnapshot: Package and age of each message.
+        """
+        cached_messages = await self.mavlink2rest.get_mavlink_messages(
+            message_names, self.target_system, self.target_component, max_age
+        )
+        messages = {
+            name: MessageSnapshot(package=cached.package, age=cached.age()) if cached else MessageSnapshot()
+            for name, cached in cached_messages.items()
+        }
+        return VehicleSnapshot(system_id=self.target_system, component_id=self.target_component, messages=messages)
+
+    async def _reboot_or_shutdown(self, action: float) -> None:
+        # Resending could reboot the vehicle twice, so a single attempt is made
+        try:
+            await self.send_command_long("MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN", [action], retries=1)
+        except MavlinkCommandNotAcknowledged as error:
+            # Autopilots often go down before sending the ACK
+            logger.warning(f"Assuming the vehicle is going down. {error}")
+
     async def reboot_vehicle(self) -> None:
-        message = self.command_long_message("MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN", [1.0])
-        await self.mavlink2rest.send_mavlink_message(message)
+        await self._reboot_or_shutdown(1.0)
 
     async def shutdown_vehicle(self) -> None:
-        shutdown_message = self.command_long_message("MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN", [2.0])
-        await self.mavlink2rest.send_mavlink_message(shutdown_message)
+        await self._reboot_or_shutdown(2.0)
 
     async def is_heart_beating(self) -> bool:
         try:
@@ -96,12 +266,15 @@ class VehicleManager:
         return bool(base_mode_bits & MAV_MODE_FLAG_SAFETY_ARMED)
 
     async def disarm_vehicle(self) -> None:
-        if not await self.is_vehicle_armed():
-            logger.debug("Vehicle already disarmed.")
-            return
-
-        disarm_message = self.command_long_message("MAV_CMD_COMPONENT_ARM_DISARM", [])
+        try:
+            ack = await self.send_command_long("MAV_CMD_COMPONENT_ARM_DISARM", [0.0])
+        except MavlinkCommandFail as error:
+            # Autopilot refuses to disarm an already disarmed vehicle
+            if not await self.is_vehicle_armed():
+                logger.debug("Vehicle already disarmed.")
+                return
+            raise VehicleDisarmFail("Failed to disarm vehicle. Please try a manual disarm.") from error
 
-        await self.mavlink2rest.send_mavlink_message(disarm_message)
-        if await self.is_vehicle_armed():
+        # Without ACKs, the only way to know if it worked is checking the vehicle state
+        if ack is None and await self.is_vehicle_armed():
             raise VehicleDisarmFail("Failed to disarm vehicle. Please try a manual disarm.")
@@ -15,5 +15,17 @@ class FetchUpdatedMessageFail(RuntimeError):
     """Unable to get an updated mavlink message."""
 
 
+class MavlinkCommandFail(RuntimeError):
+    """Mavlink command was not accepted by the vehicle."""
+
+
+class MavlinkCommandNotAcknowledged(MavlinkCommandFail):
+    """Mavlink command was not acknowledged by the vehicle, which may still have executed it."""
+
+
 class VehicleDisarmFail(RuntimeError):
     """Could not disarm vehicle."""
+
+
+class MavlinkMessageEncodeFail(RuntimeError):
+    """Mavlink message could not be encoded into a frame."""
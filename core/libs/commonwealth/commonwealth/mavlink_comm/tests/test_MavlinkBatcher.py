@@ -0,0 +1,72 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+from ..MavlinkBatcher import MavlinkBatcher
+from ..MavlinkComm import MavlinkMessenger
+from ..MavlinkFrame import encode_message
+from ..MavlinkTransport import UdpTransport
+from .test_MavlinkComm import (
+    SERVER_ADDRESS,
+    SERVER_HOST,
+    SERVER_PORT,
+    fake_mavlink2rest,
+)
+
+
+@pytest.mark.asyncio
+async def test_slow_upstream_drops_oldest_messages() -> None:
+    async with fake_mavlink2rest(post_delay=0.05) as server, MavlinkMessenger() as messenger:
+        messenger.set_m2r_address(SERVER_ADDRESS)
+        batcher = MavlinkBatcher(messenger, window=0.01, max_pending=5)
+
+        # First message is sent alone, while the following ones pile up behind it
+        await batcher.send_mavlink_message({"type": "GPS_INPUT", "lat": 0})
+        await asyncio.sleep(0.02)
+        for lat in range(1, 21):
+            await batcher.send_mavlink_message({"type": "GPS_INPUT", "lat": lat})
+        assert batcher.pending() == 5
+        await asyncio.sleep(0.1)
+        await batcher.close()
+
+        # Only the newest messages survive, sent on a single connection
+        assert [package["message"]["lat"] for package in server.received_packages] == [0, 16, 17, 18, 19, 20]
+        assert messenger.connection_stats().created == 1
+
+        stats = batcher.stats()["GPS_INPUT"]
+        assert stats.sent == 6
+        assert stats.dropped == 15
+        assert not stats.failed
+        assert stats.max_latency_ms >= stats.average_latency_ms > 0
+
+
+@pytest.mark.asyncio
+async def test_native_transport_coalesces_frames() -> None:
+    loop = asyncio.get_running_loop()
+    datagrams: "asyncio.Queue[bytes]" = asyncio.Queue()
+
+    class RouterProtocol(asyncio.DatagramProtocol):
+        def datagram_received(self, data: bytes, addr: Any) -> None:
+            datagrams.put_nowait(data)
+
+    router, _ = await loop.create_datagram_endpoint(RouterProtocol, local_addr=(SERVER_HOST, SERVER_PORT))
+    messages = [
+        {"type": "DISTANCE_SENSOR", "current_distance": distance, "quaternion": [0] * 4} for distance in range(3)
+    ]
+    try:
+        async with MavlinkMessenger() as messenger:
+            messenger.set_transport(UdpTransport(SERVER_HOST, SERVER_PORT))
+            batcher = MavlinkBatcher(messenger, window=0.05)
+            for message in messages:
+                await batcher.send_mavlink_message(message)
+
+            datagram = await asyncio.wait_for(datagrams.get(), 1.0)
+            assert datagram == b"".join(
+                encode_message(message, messenger.system_id, messenger.component_id, sequence)
+                for sequence, message in enumerate(messages)
+            )
+            assert batcher.stats()["DISTANCE_SENSOR"].sent == 3
+            await batcher.close()
+    finally:
+        router.close()
@@ -0,0 +1,241 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncContextManager, AsyncIterator, Dict, List
+
+import pytest
+from aiohttp import web
+
+from ..exceptions import MavlinkMessageReceiveFail
+from ..MavlinkComm import MavlinkMessenger
+from ..MavlinkFrame import encode_message
+from ..MavlinkTransport import UdpTransport
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 26040
+SERVER_ADDRESS = f"{SERVER_HOST}:{SERVER_PORT}"
+STREAM_PERIOD = 0.01
+COMPONENT_MESSAGES = [
+    "HEARTBEAT",
+    "AUTOPILOT_VERSION",
+    "SYS_STATUS",
+    "ATTITUDE",
+    "GPS_RAW_INT",
+    "SCALED_PRESSURE",
+    "RAW_IMU",
+    "VFR_HUD",
+]
+
+
+class FakeMavlink2Rest:
+    def __init__(self, websocket: bool = True, post_delay: float = 0.0) -> None:
+        self.post_delay = post_delay
+        self.received_packages: List[Dict[str, Any]] = []
+        self.get_requests = 0
+        self.component_requests = 0
+        self.websocket_connections = 0
+        self.app = web.Application()
+        self.app.router.add_post("/mavlink", self.post_message)
+        self.app.router.add_get("/mavlink/vehicles/{vehicle}/components/{component}/messages", self.get_messages)
+        self.app.router.add_get("/mavlink/vehicles/{vehicle}/components/{component}/messages/{name}", self.get_message)
+        if websocket:
+            self.app.router.add_get("/ws/mavlink", self.stream_messages)
+
+    async def post_message(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.post_delay)
+        self.received_packages.append(await request.json())
+        return web.Response(text="Ok.")
+
+    async def get_message(self, request: web.Request) -> web.Response:
+        self.get_requests += 1
+        name = request.match_info["name"]
+        return web.json_response({"message": {"type": name}, "status": {"time": {"counter": self.get_requests}}})
+
+    async def get_messages(self, _request: web.Request) -> web.Response:
+        self.component_requests += 1
+        status = {"time": {"counter": self.component_requests, "last_update": "2021-05-12T09:22:16.539806500-03:00"}}
+        return web.json_response({name: {"message": {"type": name}, "status": status} for name in COMPONENT_MESSAGES})
+
+    async def stream_messages(self, request: web.Request) -> web.WebSocketResponse:
+        self.websocket_connections += 1
+        name = request.query["filter"].strip("^$")
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        counter = 0
+        while not websocket.closed:
+            counter += 1
+            # Alternate between two components, so subscribers can filter them
+            component = 1 + counter % 2
+            header = {"system_id": 1, "component_id": component, "sequence": counter % 256}
+            await websocket.send_json({"header": header, "message": {"type": name, "counter": counter}})
+            await asyncio.sleep(STREAM_PERIOD)
+        return websocket
+
+
+@asynccontextmanager
+async def serve(server: FakeMavlink2Rest) -> AsyncIterator[FakeMavlink2Rest]:
+    runner = web.AppRunner(server.app)
+    await runner.setup()
+    await web.TCPSite(runner, SERVER_HOST, SERVER_PORT).start()
+    try:
+        yield server
+    finally:
+        await runner.cleanup()
+
+
+def fake_mavlink2rest(websocket: bool = True, post_delay: float = 0.0) -> AsyncContextManager[FakeMavlink2Rest]:
+    return serve(FakeMavlink2Rest(websocket, post_delay))
+
+
+@pytest.mark.asyncio
+async def test_session_reuses_connections() -> None:
+    async with fake_mavlink2rest() as server, MavlinkMessenger() as messenger:
+        messenger.set_m2r_address(SERVER_ADDRESS)
+        for distance in range(10):
+            await messenger.send_mavlink_message({"type": "DISTANCE_SENSOR", "current_distance": distance})
+        message = await messenger.get_mavlink_message("heartbeat")
+
+        stats = messenger.connection_stats()
+        assert stats.requests == 11
+        assert stats.created == 1
+        assert stats.reused == 10
+
+    assert message["message"]["type"] == "HEARTBEAT"
+    assert [package["message"]["current_distance"] for package in server.received_packages] == list(range(10))
+    assert messenger._session is None
+
+
+@pytest.mark.asyncio
+async def test_subscribers_share_stream() -> None:
+    async def collect(messenger: MavlinkMessenger, component: int) -> List[Dict[str, Any]]:
+        subscription = messenger.subscribe("HEARTBEAT", vehicle=1, component=component)
+        packages = [await subscription.__anext__() for _ in range(3)]
+        await subscription.aclose()
+        return packages
+
+    async with fake_mavlink2rest() as server, MavlinkMessenger() as messenger:
+        messenger.set_m2r_address(SERVER_ADDRESS)
+        first, second = await asyncio.gather(collect(messenger, 1), collect(messenger, 2))
+
+        assert server.websocket_connections == 1
+        assert all(package["header"]["component_id"] == 1 for package in first)
+        assert all(package["header"]["component_id"] == 2 for package in second)
+
+        # Last subscriber leaving closes the upstream stream
+        assert not messenger._streams
+        assert not messenger._subscribers
+
+        updated_message = await messenger.get_updated_mavlink_message("HEARTBEAT", timeout=1.0)
+        assert updated_message["message"]["type"] == "HEARTBEAT"
+        assert not server.get_requests
+
+
+@pytest.mark.asyncio
+async def test_stream_timeout_reaches_subscribers(monkeypatch: pytest.MonkeyPatch) -> None:
+    def timeout(*_args: Any, **_kwargs: Any) -> None:
+        raise asyncio.TimeoutError()
+
+    async with MavlinkMessenger() as messenger:
+        monkeypatch.setattr(messenger._get_session(), "ws_connect", timeout)
+        subscription = messenger.subscribe("HEARTBEAT")
+        with pytest.raises(MavlinkMessageReceiveFail):
+            await asyncio.wait_for(subscription.__anext__(), 1.0)
+
+
+@pytest.mark.asyncio
+async def test_updated_message_falls_back_to_polling() -> None:
+    async with fake_mavlink2rest(websocket=False) as server, MavlinkMessenger() as messenger:
+        messenger.set_m2r_address(SERVER_ADDRESS)
+        updated_message = await messenger.get_updated_mavlink_message("HEARTBEAT", timeout=0.1)
+
+        assert updated_message["status"]["time"]["counter"] > 1
+        assert server.get_requests >= 2
+
+
+@pytest.mark.asyncio
+async def test_native_transport() -> None:
+    loop = asyncio.get_running_loop()
+    frames: "asyncio.Queue[bytes]" = asyncio.Queue()
+
+    class RouterProtocol(asyncio.DatagramProtocol):
+        def datagram_received(self, data: bytes, addr: Any) -> None:
+            frames.put_nowait(data)
+
+    router, _ = await loop.create_datagram_endpoint(RouterProtocol, local_addr=(SERVER_HOST, SERVER_PORT))
+    distance_message = {"type": "DISTANCE_SENSOR", "current_distance": 150, "quaternion": [0, 0, 0, 0]}
+    try:
+        async with fake_mavlink2rest() as server, MavlinkMessenger() as messenger:
+            messenger.set_m2r_address(SERVER_ADDRESS)
+            messenger.set_transport(UdpTransport(SERVER_HOST, SERVER_PORT))
+
+            await messenger.send_mavlink_message(distance_message)
+            frame = await asyncio.wait_for(frames.get(), 1.0)
+            assert frame == encode_message(distance_message, messenger.system_id, messenger.component_id, 0)
+
+            # Messages without a frame definition still go through mavlink2rest
+            await messenger.send_mavlink_message({"type": "PARAM_SET"})
+            assert [package["message"]["type"] for package in server.received_packages] == ["PARAM_SET"]
+    finally:
+        router.close()
+
+
+@pytest.mark.asyncio
+async def test_latest_value_cache() -> None:
+    async with fake_mavlink2rest() as server, MavlinkMessenger() as messenger:
+        messenger.set_m2r_address(SERVER_ADDRESS)
+        assert messenger.cached_mavlink_message("AUTOPILOT_VERSION") is None
+
+        first = await messenger.get_cached_mavlink_message("AUTOPILOT_VERSION", max_age=10.0)
+        second = await messenger.get_cached_mavlink_message("AUTOPILOT_VERSION", max_age=10.0)
+        assert first == second
+        assert server.get_requests == 1
+
+        await asyncio.sleep(0.01)
+        await messenger.get_cached_mavlink_message("AUTOPILOT_VERSION", max_age=0.01)
+        assert server.get_requests == 2
+
+        # Background stream keeps the cache fresh for each component
+        messenger.start_caching("HEARTBEAT")
+        await asyncio.sleep(5 * STREAM_PERIOD)
+        for component in [1, 2]:
+            heartbeat = messenger.cached_mavlink_message("HEARTBEAT", component=component, max_age=1.0)
+            assert heartbeat["header"]["component_id"] == component
+        messenger.stop_caching("HEARTBEAT")
+        assert server.get_requests == 2
+
+        stats = messenger.cache_stats()
+        assert stats.entries == 3
+        assert stats.hits == 3
+        assert stats.misses == 3
+
+
+@pytest.mark.asyncio
+async def test_sequence_and_rate_limit() -> None:
+    async with fake_mavlink2rest() as server, MavlinkMessenger() as messenger:
+        messenger.set_m2r_address(SERVER_ADDRESS)
+        messenger.set_sequence(254)
+        for _ in range(3):
+            await messenger.send_mavlink_message({"type": "HEARTBEAT"})
+        # Other components have their own sequence
+        messenger.set_component_id(220)
+        await messenger.send_mavlink_message({"type": "HEARTBEAT"})
+
+        headers = [package["header"] for package in server.received_packages]
+        assert [header["sequence"] for header in headers] == [254, 255, 0, 0]
+        assert [header["component_id"] for header in headers] == [194, 194, 194, 220]
+
+        server.received_packages.clear()
+        messenger.set_rate_limit("GPS_INPUT", rate=20.0, burst=2)
+        for _ in range(5):
+            await messenger.send_mavlink_message({"type": "GPS_INPUT"})
+        assert len(server.received_packages) == 2
+
+        # Messages allowed to wait are throttled instead of dropped
+        messenger.set_rate_limit("GPS_INPUT", rate=20.0, burst=1, max_delay=0.1)
+        for _ in range(3):
+            await messenger.send_mavlink_message({"type": "GPS_INPUT"})
+        assert len(server.received_packages) == 5
+
+        stats = messenger.rate_limit_stats()["GPS_INPUT"]
+        assert stats.passed == 1
+        assert stats.throttled == 2
+        assert not stats.dropped
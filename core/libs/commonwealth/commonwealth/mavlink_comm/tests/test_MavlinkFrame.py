@@ -0,0 +1,86 @@
+import pytest
+
+from ..exceptions import MavlinkMessageEncodeFail
+from ..MavlinkFrame import encode_message, x25_crc
+
+DISTANCE_SENSOR_MESSAGE = {
+    "type": "DISTANCE_SENSOR",
+    "time_boot_ms": 1234,
+    "min_distance": 20,
+    "max_distance": 5000,
+    "current_distance": 150,
+    "mavtype": {"type": "MAV_DISTANCE_SENSOR_ULTRASOUND"},
+    "id": 0,
+    "orientation": {"type": "MAV_SENSOR_ROTATION_PITCH_270"},
+    "covariance": 255,
+    "horizontal_fov": 0.52,
+    "vertical_fov": 0.52,
+    "quaternion": [0, 0, 0, 0],
+    "signal_quality": 87,
+}
+
+COMMAND_LONG_MESSAGE = {
+    "type": "COMMAND_LONG",
+    "param1": 1.0,
+    "param2": 0,
+    "param3": 0,
+    "param4": 0,
+    "param5": 0,
+    "param6": 0,
+    "param7": 0,
+    "command": {"type": "MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN"},
+    "target_system": 1,
+    "target_component": 1,
+    "confirmation": 0,
+}
+
+GPS_INPUT_MESSAGE = {
+    "type": "GPS_INPUT",
+    "time_usec": 0,
+    "gps_id": 0,
+    "ignore_flags": {"bits": 56},
+    "time_week_ms": 0,
+    "time_week": 0,
+    "fix_type": 3,
+    "lat": -275630000,
+    "lon": -484590000,
+    "alt": 12.5,
+    "hdop": 0.9,
+    "vdop": 0,
+    "vn": 0,
+    "ve": 0,
+    "vd": 0,
+    "speed_accuracy": 0,
+    "horiz_accuracy": 0,
+    "vert_accuracy": 0,
+    "satellites_visible": 9,
+    "yaw": 0,
+}
+
+
+def test_crc() -> None:
+    # Reference value for CRC-16/MCRF4XX
+    assert x25_crc(b"123456789") == 0x6F91
+
+
+def test_encode_message() -> None:
+    # Reference frames generated with pymavlink
+    assert encode_message(DISTANCE_SENSOR_MESSAGE, 1, 194, 7) == bytes.fromhex(
+        "fd2700000701c2840000d2040000140088139600010019ffb81e053fb81e053f0000000000000000000000000000000057facf"
+    )
+    assert encode_message(COMMAND_LONG_MESSAGE, 1, 194, 255) == bytes.fromhex(
+        "fd200000ff01c24c00000000803f000000000000000000000000000000000000000000000000f600010189d3"
+    )
+    assert encode_message(GPS_INPUT_MESSAGE, 1, 194, 3) == bytes.fromhex(
+        "fd3f00000301c2e80000000000000000000000000000503892ef50be1de3000048416666663f00000000000000000000000000"
+        + "00000000000000000000000000000038000000000309df3d"
+    )
+
+
+def test_encode_invalid_message() -> None:
+    with pytest.raises(MavlinkMessageEncodeFail):
+        encode_message({"type": "PARAM_SET"}, 1, 194, 0)
+    with pytest.raises(MavlinkMessageEncodeFail):
+        encode_message({**COMMAND_LONG_MESSAGE, "command": {"type": "MAV_CMD_UNKNOWN"}}, 1, 194, 0)
+    with pytest.raises(MavlinkMessageEncodeFail):
+        encode_message({**DISTANCE_SENSOR_MESSAGE, "quaternion": [0, 0]}, 1, 194, 0)
@@ -0,0 +1,216 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import pytest
+from aiohttp import web
+
+from ..exceptions import MavlinkCommandFail
+from ..VehicleManager import VehicleManager
+from .test_MavlinkComm import (
+    COMPONENT_MESSAGES,
+    SERVER_ADDRESS,
+    FakeMavlink2Rest,
+    fake_mavlink2rest,
+    serve,
+)
+
+
+class FakeVehicle(FakeMavlink2Rest):
+    """Answer COMMAND_LONGs with COMMAND_ACKs, following a script of results for each command type.
+
+    A None in place of the results means the command is ignored, as if it was lost.
+    """
+
+    def __init__(self, results: Dict[str, List[Optional[List[str]]]], ack_delay: float = 0.0) -> None:
+        super().__init__()
+        self.results = results
+        self.ack_delay = ack_delay
+        self.ack_streams: Set[web.WebSocketResponse] = set()
+
+    async def post_message(self, request: web.Request) -> web.Response:
+        response = await super().post_message(request)
+        package = self.received_packages[-1]
+        if package["message"]["type"] == "COMMAND_LONG":
+            asyncio.create_task(self.acknowledge(package))
+        return response
+
+    async def acknowledge(self, package: Dict[str, Any]) -> None:
+        command = package["message"]["command"]["type"]
+        for result in self.results[command].pop(0) or []:
+            await asyncio.sleep(self.ack_delay)
+            ack = {
+                "type": "COMMAND_ACK",
+                "command": {"type": command},
+                "result": {"type": result},
+                "target_system": package["header"]["system_id"],
+                "target_component": package["header"]["component_id"],
+            }
+            for websocket in self.ack_streams:
+                await websocket.send_json(
+                    {"header": {"system_id": 1, "component_id": 1, "sequence": 0}, "message": ack}
+                )
+
+    async def stream_messages(self, request: web.Request) -> web.WebSocketResponse:
+        if request.query["filter"] != "^COMMAND_ACK$":
+            return await super().stream_messages(request)
+        self.websocket_connections += 1
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        self.ack_streams.add(websocket)
+        try:
+            async for _ in websocket:
+                pass
+        finally:
+            self.ack_streams.discard(websocket)
+        return websocket
+
+
+def sent_commands(server: FakeMavlink2Rest) -> List[Any]:
+    return [
+        (package["message"]["command"]["type"], package["message"]["confirmation"])
+        for package in server.received_packages
+    ]
+
+
+@pytest.mark.asyncio
+async def test_command_accepted() -> None:
+    server = FakeVehicle({"MAV_CMD_COMPONENT_ARM_DISARM": [["MAV_RESULT_ACCEPTED"]]})
+    async with serve(server):
+        vehicle_manager = VehicleManager()
+        vehicle_manager.mavlink2rest.set_m2r_address(SERVER_ADDRESS)
+        try:
+            await vehicle_manager.disarm_vehicle()
+        finally:
+            await vehicle_manager.close()
+
+    assert sent_commands(server) == [("MAV_CMD_COMPONENT_ARM_DISARM", 0)]
+    # Only the ACK stream was used, there was no need to check the HEARTBEAT
+    assert server.websocket_connections == 1
+    assert not server.get_requests
+
+
+@pytest.mark.asyncio
+async def test_concurrent_commands() -> None:
+    server = FakeVehicle(
+        {
+            "MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN": [["MAV_RESULT_ACCEPTED"]],
+            "MAV_CMD_REQUEST_MESSAGE": [["MAV_RESULT_ACCEPTED"]] * 3,
+        },
+        ack_delay=0.2,
+    )
+    async with serve(server):
+        vehicle_manager = VehicleManager()
+        vehicle_manager.mavlink2rest.set_m2r_address(SERVER_ADDRESS)
+        try:
+            start = time.monotonic()
+            await asyncio.gather(vehicle_manager.reboot_vehicle(), vehicle_manager.request_message(148))
+            # Both commands were in flight at the same time
+            assert time.monotonic() - start < 0.4
+
+            # Commands of the same type wait for each other
+            await asyncio.gather(vehicle_manager.request_message(148), vehicle_manager.request_message(0))
+            assert time.monotonic() - start > 0.6
+        finally:
+            await vehicle_manager.close()
+
+
+@pytest.mark.asyncio
+async def test_command_retries() -> None:
+    server = FakeVehicle(
+        {
+            "MAV_CMD_REQUEST_MESSAGE": [
+                None,
+                ["MAV_RESULT_TEMPORARILY_REJECTED"],
+                ["MAV_RESULT_IN_PROGRESS", "MAV_RESULT_ACCEPTED"],
+                ["MAV_RESULT_DENIED"],
+            ]
+        }
+    )
+    async with serve(server):
+        vehicle_manager = VehicleManager()
+        vehicle_manager.mavlink2rest.set_m2r_address(SERVER_ADDRESS)
+        try:
+            ack = await vehicle_manager.send_command_long("MAV_CMD_REQUEST_MESSAGE", [148], ack_timeout=0.05)
+            assert ack is not None
+            assert ack["result"]["type"] == "MAV_RESULT_ACCEPTED"
+            assert sent_commands(server) == [("MAV_CMD_REQUEST_MESSAGE", confirmation) for confirmation in range(3)]
+
+            with pytest.raises(MavlinkCommandFail):
+                await vehicle_manager.request_message(148)
+            assert len(server.received_packages) == 4
+        finally:
+            await vehicle_manager.close()
+
+
+@pytest.mark.asyncio
+async def test_reboot_without_ack() -> None:
+    server = FakeVehicle({"MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN": [None, ["MAV_RESULT_DENIED"]]})
+    async with serve(server):
+        vehicle_manager = VehicleManager()
+        vehicle_manager.mavlink2rest.set_m2r_address(SERVER_ADDRESS)
+        try:
+            # The vehicle rebooted before acknowledging it, which is taken as success
+            await vehicle_manager.reboot_vehicle()
+            assert sent_commands(server) == [("MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN", 0)]
+
+            # Refusals are still errors
+            with pytest.raises(MavlinkCommandFail):
+                await vehicle_manager.shutdown_vehicle()
+        finally:
+            await vehicle_manager.close()
+
+
+class FakeVersionedVehicle(FakeVehicle):
+    async def get_message(self, request: web.Request) -> web.Response:
+        if request.match_info["name"] != "AUTOPILOT_VERSION":
+            return await super().get_message(request)
+        self.get_requests += 1
+        # 4.1.0, official release
+        return web.json_response({"message": {"type": "AUTOPILOT_VERSION", "flight_sw_version": 0x040100FF}})
+
+
+@pytest.mark.asyncio
+async def test_firmware_info_without_request_ack() -> None:
+    server = FakeVersionedVehicle({"MAV_CMD_REQUEST_MESSAGE": [["MAV_RESULT_UNSUPPORTED"]]})
+    async with serve(server):
+        vehicle_manager = VehicleManager()
+        vehicle_manager.mavlink2rest.set_m2r_address(SERVER_ADDRESS)
+        try:
+            firmware_info = await vehicle_manager.get_firmware_info()
+        finally:
+            await vehicle_manager.close()
+
+    assert firmware_info.version == "4.1.0"
+    assert server.get_requests == 1
+
+
+@pytest.mark.asyncio
+async def test_snapshot() -> None:
+    async with fake_mavlink2rest() as server:
+        vehicle_manager = VehicleManager()
+        vehicle_manager.mavlink2rest.set_m2r_address(SERVER_ADDRESS)
+        try:
+            # Few messages are fetched concurrently
+            snapshot = await vehicle_manager.snapshot(["heartbeat", "SYS_STATUS"])
+            assert list(snapshot.messages) == ["HEARTBEAT", "SYS_STATUS"]
+            assert server.get_requests == 2
+            heartbeat = snapshot.messages["HEARTBEAT"]
+            assert heartbeat.age is not None and heartbeat.age < 1.0
+
+            # Messages still fresh are taken from cache, and the rest of them with a single request
+            snapshot = await vehicle_manager.snapshot(COMPONENT_MESSAGES, max_age=10.0)
+            assert server.get_requests == 2
+            assert server.component_requests == 1
+            for name, message in snapshot.messages.items():
+                assert message.package is not None
+                assert message.package["message"]["type"] == name
+            # Packages of the whole component carry the time they were received by mavlink2rest
+            attitude = snapshot.messages["ATTITUDE"]
+            assert attitude.age is not None and attitude.age > 3600
+
+            snapshot = await vehicle_manager.snapshot()
+            assert list(snapshot.messages) == COMPONENT_MESSAGES
+            assert server.component_requests == 2
+        finally:
+            await vehicle_manager.close()
@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Any, Dict, Optional
 
 from pydantic import BaseModel
 
@@ -75,3 +76,47 @@ class FirmwareInfo(BaseModel):
 class MavlinkMessageId(Enum):
     HEARTBEAT = 0
     AUTOPILOT_VERSION = 148
+
+
+class ConnectionStats(BaseModel):
+    created: int = 0
+    reused: int = 0
+    requests: int = 0
+
+
+class BatchStats(BaseModel):
+    sent: int = 0
+    dropped: int = 0
+    failed: int = 0
+    average_latency_ms: float = 0.0
+    max_latency_ms: float = 0.0
+
+    def record_latency(self, latency_ms: float) -> None:
+        self.average_latency_ms += (latency_ms - self.average_latency_ms) / (self.sent + 1)
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self.sent += 1
+
+
+class CacheStats(BaseModel):
+    entries: int = 0
+    hits: int = 0
+    misses: int = 0
+
+
+class RateLimitStats(BaseModel):
+    passed: int = 0
+    throttled: int = 0
+    dropped: int = 0
+
+
+class MessageSnapshot(BaseModel):
+    # Mavlink2Rest package, or None if the message is not available
+    package: Optional[Dict[str, Any]] = None
+    # Time, in seconds, since the message was received
+    age: Optional[float] = None
+
+
+class VehicleSnapshot(BaseModel):
+    system_id: int
+    component_id: int
+    messages: Dict[str, MessageSnapshot]
@@ -0,0 +1,138 @@
+"""Compare load and save cost of each settings serializer with the real settings classes of the services
+
+Usage: python -m commonwealth.settings.benchmark [--items N] [--runs N] [--services-path PATH]
+"""
+
+import argparse
+import importlib.util
+import json
+import pathlib
+import timeit
+from typing import Any, Callable, Dict, List, Tuple, Type
+
+import pykson  # type: ignore
+from pykson import Pykson
+
+from commonwealth.settings.schema import SettingsSchema, _class_fields
+from commonwealth.settings.serializers import (
+    ORJSON_AVAILABLE,
+    JsonSerializer,
+    OrjsonSerializer,
+    SettingsSerializer,
+    SnapshotSerializer,
+)
+from commonwealth.settings.settings import BaseSettings
+
+# Service settings file and latest settings class, relative to the services folder
+SERVICE_SETTINGS = {
+    "beacon": ("beacon/settings.py", "SettingsV3"),
+    "bridget": ("bridget/settings.py", "SettingsV1"),
+    "nmea_injector": ("nmea_injector/nmea_injector/settings.py", "SettingsV1"),
+    "ping": ("ping/settings.py", "SettingsV1"),
+    "wifi": ("wifi/settings.py", "SettingsV1"),
+}
+
+SCALAR_SAMPLES: List[Tuple[Type[pykson.Field], Callable[[int], Any]]] = [
+    (pykson.BooleanField, lambda index: bool(index % 2)),
+    (pykson.IntegerField, lambda index: index),
+    (pykson.FloatField, lambda index: index / 3),
+]
+
+DEFAULT_SERVICES_PATH = pathlib.Path(__file__).resolve().parents[4].joinpath("services")
+
+
+def load_settings_class(services_path: pathlib.Path, service: str) -> Type[BaseSettings]:
+    relative_path, class_name = SERVICE_SETTINGS[service]
+    spec = importlib.util.spec_from_file_location(f"benchmark_{service}_settings", services_path / relative_path)
+    assert spec is not None and spec.loader is not None, f"Could not find settings of {service}"
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    settings_class: Type[BaseSettings] = getattr(module, class_name)
+    return settings_class
+
+
+def sample_value(field: pykson.Field, index: int, items: int) -> Any:
+    """Synthetic value for a field, with object lists holding the requested number of items"""
+    if isinstance(field, pykson.ObjectListField):
+        return [sample_object(field.item_type, item, items) for item in range(items)]
+    if isinstance(field, pykson.ObjectField):
+        return sample_object(field.item_type, index, items)
+    if isinstance(field, pykson.ListField):
+        return [f"item-{index}-{item}" for item in range(4)]
+    if isinstance(field, (pykson.MultipleChoiceStringField, pykson.MultipleChoiceIntegerField)):
+        return sorted(field.options)[0]
+    for field_type, sample in SCALAR_SAMPLES:
+        if isinstance(field, field_type):
+            return sample(index)
+    return f"{field.name}-{index}"
+
+
+def sample_object(cls: Type[pykson.JsonObject], index: int, items: int) -> Any:
+    instance = cls()
+    for field in _class_fields(cls):
+        setattr(instance, field.name, sample_value(field, index, items))
+    return instance
+
+
+def pykson_codec(settings: BaseSettings) -> Tuple[Callable[[], Any], Callable[[Any], Any]]:
+    """Encoding and decoding done by BaseSettings before the schema and serializers"""
+    settings_class = settings.__class__
+    return (
+        lambda: Pykson().to_json(settings),
+        lambda content: Pykson().from_json(json.loads(content), settings_class),
+    )
+
+
+def serializer_codec(
+    settings: BaseSettings, serializer: SettingsSerializer
+) -> Tuple[Callable[[], Any], Callable[[Any], Any]]:
+    schema = SettingsSchema.of(settings.__class__)
+    return (
+        lambda: serializer.dumps(schema.to_dict(settings)),
+        lambda content: schema.from_dict(serializer.loads(content)),
+    )
+
+
+def measure(dumps: Callable[[], Any], loads: Callable[[Any], Any], runs: int) -> Tuple[float, float, int]:
+    """Mean save and load time in microseconds, and content size in bytes"""
+    content = dumps()
+    save_us = timeit.timeit(dumps, number=runs) / runs * 1e6
+    load_us = timeit.timeit(lambda: loads(content), number=runs) / runs * 1e6
+    size = len(content.encode("utf-8") if isinstance(content, str) else content)
+    return save_us, load_us, size
+
+
+def benchmark(settings: BaseSettings, runs: int) -> Dict[str, Tuple[float, float, int]]:
+    serializers: List[SettingsSerializer] = [JsonSerializer(), SnapshotSerializer()]
+    if ORJSON_AVAILABLE:
+        serializers.insert(1, OrjsonSerializer())
+
+    results = {"pykson": measure(*pykson_codec(settings), runs)}
+    for serializer in serializers:
+        results[serializer.NAME] = measure(*serializer_codec(settings, serializer), runs)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=16, help="Number of items on each list of objects.")
+    parser.add_argument("--runs", type=int, default=200, help="Number of loads and saves measured.")
+    parser.add_argument("--services-path", type=pathlib.Path, default=DEFAULT_SERVICES_PATH)
+    args = parser.parse_args()
+
+    print(f"{'service':<15}{'backend':<10}{'save (us)':>12}{'load (us)':>12}{'size (B)':>10}")
+    for service in SERVICE_SETTINGS:
+        try:
+            settings_class = load_settings_class(args.services_path, service)
+        except Exception as error:
+            print(f"{service:<15}skipped, could not import settings: {error}")
+            continue
+
+        settings = sample_object(settings_class, 0, args.items)
+        settings.VERSION = settings_class.VERSION
+        for backend, (save_us, load_us, size) in benchmark(settings, args.runs).items():
+            print(f"{service:<15}{backend:<10}{save_us:>12.1f}{load_us:>12.1f}{size:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,32 @@
 import pathlib
 import re
-from typing import Any, Optional, Type
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Type
 
 import appdirs
 from loguru import logger
+from pydantic import BaseModel
 
+from commonwealth.settings.persistence import DebouncedWriter, PersistenceStats
 from commonwealth.settings.settings import BaseSettings, SettingsFromTheFuture
+from commonwealth.settings.watcher import FileWatcher
+
+
+class LoadStats(BaseModel):
+    # File the settings were loaded from, None if defaults were used
+    source: Optional[str] = None
+    # Whether the settings came from an older version and had to be migrated
+    migrated: bool = False
+    # Time spent looking for settings files
+    discovery_ms: float = 0.0
+    # Time spent reading, migrating and deserializing settings
+    load_ms: float = 0.0
 
 
 class Manager:
+    # pylint: disable=too-many-instance-attributes
     SETTINGS_NAME_PREFIX = "settings-"
+    SETTINGS_NAME_PATTERN = re.compile(f"^{SETTINGS_NAME_PREFIX}(\\d+)\\.json$")
 
     def __init__(
         self,
@@ -17,6 +34,7 @@ class Manager:
         settings_type: Type[BaseSettings],
         config_folder: Optional[pathlib.Path] = None,
         load: bool = True,
+        save_debounce: float = 0.0,
     ) -> None:
         assert project_name, "project_name should be not empty"
         assert issubclass(settings_type, BaseSettings), "settings_type should use BaseSettings as subclass"
@@ -30,6 +48,14 @@ class Manager:
         self.config_folder.mkdir(parents=True, exist_ok=True)
         self.settings_type = settings_type
         self._settings = None
+        # Settings files of older versions, by version, indexed when first needed
+        self._older_versions: Optional[Dict[int, pathlib.Path]] = None
+        self._load_stats = LoadStats()
+        # Saves requested within save_debounce seconds are coalesced into a single write
+        self._writer = DebouncedWriter(self.settings_file_path(), save_debounce)
+        # Callbacks for changes made to the settings file by others, like another process or the user
+        self._subscribers: List[Callable[[], None]] = []
+        self._watcher: Optional[FileWatcher] = None
         logger.debug(
             f"Starting {project_name} settings with {settings_type.__name__}, configuration path: {config_folder}"
         )
@@ -92,34 +118,121 @@ class Manager:
         return settings_data
 
     def save(self) -> None:
-        """Save settings"""
-        self.settings.save(self.settings_file_path())
+        """Save settings. Settings are only written if changed, and after the debounce window, if any"""
+        # Serialized right away, so later changes to the settings don't race with the write
+        self._writer.request(self.settings.dumps())
+
+    def flush(self) -> None:
+        """Write pending settings changes right away"""
+        self._writer.flush()
+
+    def write_stats(self) -> PersistenceStats:
+        """Number of save requests and of actual writes of the settings file
+
+        Returns:
+            PersistenceStats: Save counters
+        """
+        return self._writer.stats()
+
+    def subscribe(self, callback: Callable[[], None]) -> None:
+        """Call a function whenever the settings file content is changed by someone else
+
+        Callbacks run from a background thread. Settings are invalidated before they are called, so the next access
+        to `settings` loads the new content.
+
+        Args:
+            callback (Callable[[], None]): Function to be called
+        """
+        self._subscribers.append(callback)
+        if self._watcher is None:
+            self._watcher = FileWatcher(self.settings_file_path(), self._on_file_change)
+            self._watcher.start()
+
+    def unsubscribe(self, callback: Callable[[], None]) -> None:
+        """Stop calling a function on settings file changes
+
+        Args:
+            callback (Callable[[], None]): Function previously subscribed
+        """
+        self._subscribers.remove(callback)
+        if not self._subscribers and self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def _on_file_change(self) -> None:
+        try:
+            content = self.settings_file_path().read_bytes()
+        except FileNotFoundError:
+            # Settings in memory are kept, and the file is created again on the next save
+            return
+        # Our own writes, or writes with the same content, are not changes
+        if content == self._writer.known_content:
+            return
+        self._writer.known_content = content
+
+        if self._writer.pending():
+            logger.warning(f"{self.settings_file_path()} was changed externally, discarding unsaved changes.")
+            self._writer.discard()
+        logger.info(f"{self.settings_file_path()} was changed externally, reloading settings.")
+        self._settings = None
+        for callback in list(self._subscribers):
+            callback()
+
+    def load_stats(self) -> LoadStats:
+        """Source and timings of the last settings load
+
+        Returns:
+            LoadStats: Load information
+        """
+        return self._load_stats.copy()
+
+    def _older_settings_files(self) -> Dict[int, pathlib.Path]:
+        if self._older_versions is None:
+            discovery_start = time.perf_counter()
+            self._older_versions = {}
+            for possible_file in self.config_folder.iterdir():
+                result = Manager.SETTINGS_NAME_PATTERN.match(possible_file.name)
+                # Files from the future are not even considered, since they can't be loaded
+                if result and int(result.group(1)) < self.settings_type.VERSION:
+                    self._older_versions[int(result.group(1))] = possible_file
+            self._load_stats.discovery_ms = 1000 * (time.perf_counter() - discovery_start)
+        return self._older_versions
+
+    def _candidate_files(self) -> Iterator[pathlib.Path]:
+        """Settings files that can be loaded, from the newest to the oldest version"""
+        current_file = self.settings_file_path()
+        if current_file.exists():
+            yield current_file
+        # The folder is only scanned when the current version is not available
+        for _version, older_file in sorted(self._older_settings_files().items(), reverse=True):
+            yield older_file
 
     def load(self) -> None:
         """Load settings"""
+        # Make sure changes waiting to be written are not lost
+        self.flush()
 
-        def get_settings_version_from_filename(filename: pathlib.Path) -> int:
-            result = re.search(f"{Manager.SETTINGS_NAME_PREFIX}(\\d+)", filename.name)
-            assert result
-            assert len(result.groups()) == 1
-            return int(result.group(1))
-
-        # Get all possible settings candidates and sort it by version
-        valid_files = [
-            possible_file
-            for possible_file in self.config_folder.iterdir()
-            if possible_file.name.startswith(Manager.SETTINGS_NAME_PREFIX)
-        ]
-        valid_files.sort(key=get_settings_version_from_filename, reverse=True)
-
-        logger.debug(f"Found possible candidates for settings source: {valid_files}")
-        for valid_file in valid_files:
+        start_time = time.perf_counter()
+        self._load_stats = LoadStats()
+        for valid_file in self._candidate_files():
             logger.debug(f"Checking {valid_file} for settings")
             try:
-                self._settings = Manager.load_from_file(self.settings_type, valid_file)
-                logger.debug(f"Using {valid_file} as settings source")
-                return
+                settings = Manager.load_from_file(self.settings_type, valid_file)
             except SettingsFromTheFuture as exception:
                 logger.debug("Invalid settings, going to try another file:", exception)
+                continue
+
+            self._load_stats.source = str(valid_file)
+            if valid_file != self.settings_file_path():
+                # Store migrated settings, so the migration doesn't need to run again on the next load
+                self._load_stats.migrated = True
+                settings.save(self.settings_file_path())
+            self._settings = settings
+            break
+        else:
+            self._settings = Manager.load_from_file(self.settings_type, self.settings_file_path())
+        self._writer.known_content = self.settings_file_path().read_bytes()
 
-        self._settings = Manager.load_from_file(self.settings_type, self.settings_file_path())
+        total_ms = 1000 * (time.perf_counter() - start_time)
+        self._load_stats.load_ms = total_ms - self._load_stats.discovery_ms
+        logger.debug(f"Settings of {self.project_name} loaded in {total_ms:.1f} ms: {self._load_stats}")
@@ -0,0 +1,144 @@
+import atexit
+import os
+import pathlib
+import threading
+import weakref
+from typing import Optional
+
+from loguru import logger
+from pydantic import BaseModel
+
+
+class PersistenceStats(BaseModel):
+    # Number of times a save was requested
+    requested: int = 0
+    # Number of times the file was actually written
+    written: int = 0
+    # Number of writes skipped as the file already had the same content
+    skipped: int = 0
+    failed: int = 0
+
+
+def write_atomically(file_path: pathlib.Path, content: bytes) -> None:
+    """Replace file content, so readers never find it partially written, even after a power loss
+
+    Args:
+        file_path (pathlib.Path): Path for the file
+        content (bytes): New content of the file
+    """
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = file_path.with_name(f".{file_path.name}.tmp")
+    with open(temporary_path, "wb") as temporary_file:
+        temporary_file.write(content)
+        temporary_file.flush()
+        os.fsync(temporary_file.fileno())
+    os.replace(temporary_path, file_path)
+
+    # The rename is only durable once the directory entry is synced
+    directory = os.open(file_path.parent, os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+# Writers with a debounce window, flushed when the service exits so pending writes are not lost
+_debounced_writers: "weakref.WeakSet[DebouncedWriter]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_debounced_writers() -> None:
+    # Log sinks may already be closed at exit, as the ones of test runners, so nothing is logged
+    for writer in list(_debounced_writers):
+        writer.flush(log=False)
+
+
+class DebouncedWriter:
+    """Persist a file, coalescing writes requested within a debounce window and skipping the unchanged ones
+
+    Content is given when the write is requested, so the background write never sees a half-updated state, and a burst
+    of save requests costs a single write. With no debounce window, writes happen synchronously on each request.
+    """
+
+    def __init__(self, file_path: pathlib.Path, debounce: float = 0.0) -> None:
+        assert debounce >= 0, "debounce should not be negative"
+
+        self.file_path = file_path
+        self.debounce = debounce
+        self._content: Optional[bytes] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+        self._stats = PersistenceStats()
+        # Latest content known to be in the file, as written or read by this process
+        self.known_content: Optional[bytes] = None
+        if debounce > 0:
+            _debounced_writers.add(self)
+
+    def request(self, content: bytes) -> None:
+        """Request file to be written with the given content
+
+        Args:
+            content (bytes): Content to be written, replacing any content still pending
+        """
+        with self._lock:
+            self._stats.requested += 1
+            self._content = content
+            if self.debounce <= 0:
+                self.flush()
+                return
+            if self._timer is None:
+                self._timer = threading.Timer(self.debounce, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_in_background(self) -> None:
+        try:
+            self.flush()
+        except Exception as error:
+            logger.error(f"Failed to save {self.file_path}: {error}")
+
+    def flush(self, log: bool = True) -> None:
+        """Write pending content right away
+
+        Args:
+            log (bool): Log the write
+        """
+        with self._lock:
+            content = self._content
+            self.discard()
+            if content is None:
+                return
+            self._write(content, log)
+
+    def discard(self) -> None:
+        """Drop pending content without writing it"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._content = None
+
+    def _write(self, content: bytes, log: bool = True) -> None:
+        # Set before writing, so watchers of this file can tell this change apart from external ones
+        self.known_content = content
+        try:
+            if self.file_path.read_bytes() == content:
+                self._stats.skipped += 1
+                return
+        except FileNotFoundError:
+            pass
+
+        if log:
+            logger.debug(f"Saving settings on: {self.file_path}")
+        try:
+            write_atomically(self.file_path, content)
+        except OSError:
+            self._stats.failed += 1
+            raise
+        self._stats.written += 1
+
+    def pending(self) -> bool:
+        return self._content is not None
+
+    def stats(self) -> PersistenceStats:
+        return self._stats.copy()
@@ -0,0 +1,140 @@
+import json
+from typing import Any, Callable, Dict, FrozenSet, List, Tuple, Type
+
+import pykson  # type: ignore
+from loguru import logger
+from pykson import Field, Pykson
+
+# Fields holding values that are already JSON compatible, and are copied as they are
+PLAIN_FIELDS = (
+    pykson.IntegerField,
+    pykson.FloatField,
+    pykson.BooleanField,
+    pykson.StringField,
+    pykson.MultipleChoiceStringField,
+    pykson.MultipleChoiceIntegerField,
+)
+
+Encoder = Callable[[Any], Any]
+Decoder = Callable[[Any], Any]
+
+
+class UnsupportedField(TypeError):
+    """Field type can't be handled by a compiled schema."""
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _class_fields(cls: Type[pykson.JsonObject]) -> List[Field]:
+    """All fields of a class, including inherited ones, with subclass definitions taking precedence"""
+    fields: Dict[str, Field] = {}
+    for klass in cls.__mro__:
+        for name, item in vars(klass).items():
+            if isinstance(item, Field) and name not in fields:
+                fields[name] = item
+    return list(fields.values())
+
+
+class SettingsSchema:
+    """Encoder and decoder of a pykson class, generated once from its fields
+
+    Converting through a compiled schema avoids pykson's per call introspection of the class hierarchy, which
+    dominates the cost of serializing settings with long lists of objects. Classes with field types not supported by
+    the schema fall back to pykson itself.
+    """
+
+    _schemas: Dict[Type[pykson.JsonObject], "SettingsSchema"] = {}
+
+    def __init__(self, cls: Type[pykson.JsonObject]) -> None:
+        self.cls = cls
+        self.compiled = False
+        self._fields: List[Tuple[str, str, Encoder, Decoder]] = []
+        self._serialized_names: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def of(cls, settings_type: Type[pykson.JsonObject]) -> "SettingsSchema":
+        """Get compiled schema of a class, compiling it on the first use"""
+        if settings_type not in cls._schemas:
+            schema = SettingsSchema(settings_type)
+            # Registered before compiling, so classes referring to themselves don't recurse forever
+            cls._schemas[settings_type] = schema
+            schema._compile()
+        return cls._schemas[settings_type]
+
+    def _compile(self) -> None:
+        try:
+            fields = [
+                (field.name, field.serialized_name, *self._field_codec(field)) for field in _class_fields(self.cls)
+            ]
+        except UnsupportedField as error:
+            logger.debug(f"Using pykson to serialize {self.cls.__name__}: {error}")
+            return
+        self._fields = fields
+        self._serialized_names = frozenset(serialized_name for _, serialized_name, _, _ in fields)
+        self.compiled = True
+
+    @staticmethod
+    def _field_codec(field: Field) -> Tuple[Encoder, Decoder]:
+        if isinstance(field, pykson.ObjectListField):
+            item_schema = SettingsSchema.of(field.item_type)
+            item_type = field.item_type
+
+            def encode_list(values: Any) -> Any:
+                return None if values is None else [item_schema.to_dict(value) for value in values]
+
+            def decode_list(values: Any) -> Any:
+                if values is None:
+                    return None
+                # Migrations may add already built objects to the data
+                return [value if isinstance(value, item_type) else item_schema.from_dict(value) for value in values]
+
+            return encode_list, decode_list
+
+        if isinstance(field, pykson.ObjectField):
+            object_schema = SettingsSchema.of(field.item_type)
+
+            def encode_object(value: Any) -> Any:
+                return None if value is None else object_schema.to_dict(value)
+
+            def decode_object(value: Any) -> Any:
+                if value is None or isinstance(value, object_schema.cls):
+                    return value
+                return object_schema.from_dict(value)
+
+            return encode_object, decode_object
+
+        if isinstance(field, pykson.ListField):
+            if isinstance(field.item_type, Field) and not isinstance(field.item_type, PLAIN_FIELDS):
+                raise UnsupportedField(f"List of {type(field.item_type).__name__} is not supported.")
+
+            def copy_list(values: Any) -> Any:
+                return None if values is None else list(values)
+
+            return copy_list, copy_list
+
+        if isinstance(field, PLAIN_FIELDS):
+            return _identity, _identity
+
+        raise UnsupportedField(f"{type(field).__name__} is not supported.")
+
+    def to_dict(self, instance: pykson.JsonObject) -> Dict[str, Any]:
+        """Convert object to a dictionary of JSON compatible values"""
+        if not self.compiled:
+            return dict(json.loads(Pykson().to_json(instance)))
+        return {serialized_name: encode(getattr(instance, name)) for name, serialized_name, encode, _ in self._fields}
+
+    def from_dict(self, data: Dict[str, Any]) -> Any:
+        """Create object from its dictionary representation"""
+        if not self.compiled:
+            return Pykson().from_json(data, self.cls)
+        unknown_names = data.keys() - self._serialized_names
+        if unknown_names:
+            raise ValueError(f"Unknown attributes for {self.cls.__name__}: {sorted(unknown_names)}")
+        # Attributes are set after creation, as not all pykson classes accept their fields as arguments
+        instance = self.cls()
+        for name, serialized_name, _, decode in self._fields:
+            if serialized_name in data:
+                setattr(instance, name, decode(data[serialized_name]))
+        return instance
@@ -0,0 +1,94 @@
+import abc
+import json
+import marshal
+from typing import Any, Dict
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+class SettingsSerializer(abc.ABC):
+    """Conversion between the dictionary representation of settings and the content of their files"""
+
+    # Name used on logs and benchmarks
+    NAME = ""
+
+    @abc.abstractmethod
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        pass
+
+    @abc.abstractmethod
+    def loads(self, content: bytes) -> Dict[str, Any]:
+        pass
+
+    def __repr__(self) -> str:
+        return self.NAME
+
+
+class JsonSerializer(SettingsSerializer):
+    """Standard library JSON, producing the same files as Pykson"""
+
+    NAME = "json"
+
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        return json.dumps(data).encode("utf-8")
+
+    def loads(self, content: bytes) -> Dict[str, Any]:
+        result = json.loads(content)
+        if not isinstance(result, dict):
+            raise ValueError(f"Settings content is not a JSON object: {result}")
+        return result
+
+
+class OrjsonSerializer(JsonSerializer):
+    """Compact JSON through orjson, which is several times faster than the standard library"""
+
+    NAME = "orjson"
+
+    def __init__(self) -> None:
+        assert ORJSON_AVAILABLE, "orjson is not installed"
+
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        return bytes(orjson.dumps(data))
+
+    def loads(self, content: bytes) -> Dict[str, Any]:
+        result = orjson.loads(content)
+        if not isinstance(result, dict):
+            raise ValueError(f"Settings content is not a JSON object: {result}")
+        return result
+
+
+class SnapshotSerializer(SettingsSerializer):
+    """Binary snapshot, the fastest format to load and save, but not human readable
+
+    The format depends on the Python version, so snapshots are only meant to be read by the same BlueOS image that
+    wrote them.
+    """
+
+    NAME = "snapshot"
+    MAGIC = b"BLUEOS-SETTINGS-SNAPSHOT-1\n"
+
+    def dumps(self, data: Dict[str, Any]) -> bytes:
+        return self.MAGIC + marshal.dumps(data)
+
+    def loads(self, content: bytes) -> Dict[str, Any]:
+        if not content.startswith(self.MAGIC):
+            raise ValueError("Content is not a settings snapshot.")
+        try:
+            result = marshal.loads(content[len(self.MAGIC) :])
+        except (EOFError, TypeError) as error:
+            raise ValueError(f"Settings snapshot is corrupted: {error}") from error
+        if not isinstance(result, dict):
+            raise ValueError(f"Settings snapshot does not contain a dictionary: {result}")
+        return result
+
+
+def default_serializer() -> SettingsSerializer:
+    """Fastest JSON serializer available"""
+    if ORJSON_AVAILABLE:
+        return OrjsonSerializer()
+    return JsonSerializer()
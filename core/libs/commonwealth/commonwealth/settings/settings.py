@@ -1,11 +1,14 @@
 import abc
-import json
 import pathlib
-from typing import Any, Dict
+from typing import Any, Dict, Set
 
 import pykson  # type: ignore
 from loguru import logger
-from pykson import Field, Pykson
+from pykson import Field
+
+from commonwealth.settings.persistence import write_atomically
+from commonwealth.settings.schema import SettingsSchema
+from commonwealth.settings.serializers import SettingsSerializer, default_serializer
 
 
 class BadSettingsFile(ValueError):
@@ -24,23 +27,35 @@ class BadAttributes(BadSettingsFile):
     """Attributes on settings file are not valid."""
 
 
+_validated_settings_types: Set[type] = set()
+
+
 class BaseSettings(pykson.JsonObject):
     """Base settings class that has version control and struct based serialization/deserialization"""
 
     VERSION = pykson.IntegerField(default_value=0)
+    # Backend used to read and write settings files, can be replaced by each settings class
+    SERIALIZER: SettingsSerializer = default_serializer()
 
     def __init__(self, *args: str, **kwargs: int) -> None:
-        # Make sure that all attributes are derivated from Pykson.Field
-        for key, item in type(self).__dict__.items():
+        # Class attributes don't change between instances, so each settings class is only validated once
+        if type(self) not in _validated_settings_types:
+            type(self).validate_fields()
+            _validated_settings_types.add(type(self))
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def validate_fields(cls) -> None:
+        """Make sure that all attributes are derivated from Pykson.Field"""
+        for key, item in cls.__dict__.items():
             # Remove default attributes and version tracker from validation
-            if key in ["__doc__", "__module__", "VERSION"]:
+            if key in ["__doc__", "__module__", "VERSION", "SERIALIZER"]:
                 continue
             if callable(item):
                 continue
             assert isinstance(
                 item, Field
             ), f"Class attributes must be from Pykson.Field or derivated: {type(item)}: {key}"
-        super().__init__(*args, **kwargs)
 
     @abc.abstractmethod
     def migrate(self, data: Dict[str, Any]) -> None:
@@ -61,33 +76,46 @@ class BaseSettings(pykson.JsonObject):
             raise RuntimeError(f"Settings file does not exist: {file_path}")
 
         logger.debug(f"Loading settings from file: {file_path}")
-        with open(file_path, encoding="utf-8") as settings_file:
-            result = json.load(settings_file)
+        self.loads(file_path.read_bytes())
 
-            if "VERSION" not in result.keys():
-                raise BadSettingsFile(f"Settings file does not appears to contain a valid settings format: {result}")
+    def loads(self, content: bytes) -> None:
+        """Load settings from serialized content, migrating it if needed
 
-            version = result["VERSION"]
+        Args:
+            content (bytes): Settings file content
+        """
+        try:
+            result = self.SERIALIZER.loads(content)
+        except ValueError as error:
+            raise BadSettingsFile(f"Settings file could not be parsed by {self.SERIALIZER}: {error}") from error
+
+        if "VERSION" not in result.keys():
+            raise BadSettingsFile(f"Settings file does not appears to contain a valid settings format: {result}")
 
-            if version <= 0:
-                raise BadAttributes("Settings file contains invalid version number")
+        version = result["VERSION"]
 
-            if version > self.VERSION:
-                raise SettingsFromTheFuture(
-                    f"Settings file comes from a future settings version: {version}, "
-                    f"latest supported: {self.VERSION}, tomorrow does not exist"
-                )
+        if version <= 0:
+            raise BadAttributes("Settings file contains invalid version number")
 
-            if version < self.VERSION:
-                self.migrate(result)
-                version = result["VERSION"]
+        if version > self.VERSION:
+            raise SettingsFromTheFuture(
+                f"Settings file comes from a future settings version: {version}, "
+                f"latest supported: {self.VERSION}, tomorrow does not exist"
+            )
 
-            if version != self.VERSION:
-                raise MigrationFail("Migrate chain failed to update to the latest settings version available")
+        if version < self.VERSION:
+            self.migrate(result)
+            version = result["VERSION"]
 
-            # Copy new content to settings class
-            new = Pykson().from_json(result, self.__class__)
-            self.__dict__.update(new.__dict__)
+        if version != self.VERSION:
+            raise MigrationFail("Migrate chain failed to update to the latest settings version available")
+
+        # Copy new content to settings class
+        try:
+            new = SettingsSchema.of(self.__class__).from_dict(result)
+        except ValueError as error:
+            raise BadAttributes(f"Settings file contains invalid attributes: {error}") from error
+        self.__dict__.update(new.__dict__)
 
     def save(self, file_path: pathlib.Path) -> None:
         """Save settings to file
@@ -95,13 +123,16 @@ class BaseSettings(pykson.JsonObject):
         Args:
             file_path (pathlib.Path): Path for the settings file
         """
-        # Path for settings file does not exist, lets ensure that it does
-        parent_path = file_path.parent.absolute()
-        parent_path.mkdir(parents=True, exist_ok=True)
+        logger.debug(f"Saving settings on: {file_path}")
+        write_atomically(file_path, self.dumps())
+
+    def dumps(self) -> bytes:
+        """Serialize settings
 
-        with open(file_path, "w", encoding="utf-8") as settings_file:
-            logger.debug(f"Saving settings on: {file_path}")
-            settings_file.write(Pykson().to_json(self))
+        Returns:
+            bytes: Settings file content
+        """
+        return self.SERIALIZER.dumps(SettingsSchema.of(self.__class__).to_dict(self))
 
     def reset(self) -> None:
         """Reset internal data to default values"""
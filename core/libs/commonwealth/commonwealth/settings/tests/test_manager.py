@@ -198,3 +198,32 @@ def test_fallback_settings_save_load() -> None:
     assert settings_manager.settings.version_2_variable == 2
     assert settings_manager.settings.version_3_variable == 3
     assert settings_manager.settings.version_12_variable == 12
+
+
+def test_migrated_settings_are_stored() -> None:
+    temporary_folder = tempfile.mkdtemp()
+    config_path = pathlib.Path(temporary_folder)
+    settings_folder = config_path.joinpath("ManagerTest")
+
+    settings_manager = manager.Manager("ManagerTest", SettingsV1, config_path)
+    assert settings_manager.load_stats().source is None
+    settings_manager.settings.version_1_variable = 2022
+    settings_manager.save()
+
+    # Load v3 with migration from v1
+    settings_manager = manager.Manager("ManagerTest", SettingsV3, config_path)
+    stats = settings_manager.load_stats()
+
+    assert stats.migrated
+    assert stats.source == str(settings_folder.joinpath("settings-1.json"))
+    assert settings_manager.settings.version_1_variable == 2022
+    assert settings_folder.joinpath("settings-3.json").exists()
+
+    # Migrated settings are loaded directly, without looking for older files
+    settings_manager = manager.Manager("ManagerTest", SettingsV3, config_path)
+    stats = settings_manager.load_stats()
+
+    assert not stats.migrated
+    assert stats.source == str(settings_folder.joinpath("settings-3.json"))
+    assert not stats.discovery_ms
+    assert settings_manager.settings.version_1_variable == 2022
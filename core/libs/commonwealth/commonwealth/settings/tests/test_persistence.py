@@ -0,0 +1,82 @@
+import gc
+import os
+import pathlib
+import tempfile
+import time
+import weakref
+from typing import List
+
+from loguru import logger
+
+from .. import persistence
+from ..persistence import DebouncedWriter, write_atomically
+
+
+def test_atomic_write() -> None:
+    file_path = pathlib.Path(tempfile.mkdtemp()).joinpath("settings-1.json")
+    write_atomically(file_path, b"first")
+    write_atomically(file_path, b"second")
+
+    assert file_path.read_bytes() == b"second"
+    # Temporary file is renamed over the settings file, nothing is left behind
+    assert os.listdir(file_path.parent) == [file_path.name]
+
+
+def test_unchanged_content_is_not_written() -> None:
+    file_path = pathlib.Path(tempfile.mkdtemp()).joinpath("settings-1.json")
+    writer = DebouncedWriter(file_path)
+
+    writer.request(b"content")
+    writer.request(b"content")
+    writer.request(b"new content")
+
+    assert file_path.read_bytes() == b"new content"
+    stats = writer.stats()
+    assert stats.requested == 3
+    assert stats.written == 2
+    assert stats.skipped == 1
+
+
+def test_debounced_writes_are_coalesced() -> None:
+    file_path = pathlib.Path(tempfile.mkdtemp()).joinpath("settings-1.json")
+    writer = DebouncedWriter(file_path, debounce=0.05)
+
+    for value in range(10):
+        writer.request(str(value).encode())
+    assert writer.pending()
+    assert not file_path.exists()
+
+    time.sleep(0.2)
+    assert not writer.pending()
+    # Only the latest state is written
+    assert file_path.read_bytes() == b"9"
+    assert writer.stats().written == 1
+
+    writer.request(b"flushed")
+    writer.flush()
+    assert file_path.read_bytes() == b"flushed"
+    assert writer.stats().written == 2
+
+
+def test_debounced_writers_are_not_kept_alive() -> None:
+    writer = DebouncedWriter(pathlib.Path(tempfile.mkdtemp()).joinpath("settings-1.json"), debounce=0.05)
+    assert writer in persistence._debounced_writers
+    reference = weakref.ref(writer)
+    del writer
+    gc.collect()
+    assert reference() is None
+
+
+def test_pending_writes_are_flushed_at_exit_without_logging() -> None:
+    writer = DebouncedWriter(pathlib.Path(tempfile.mkdtemp()).joinpath("settings-1.json"), debounce=10.0)
+    messages: List[str] = []
+    sink = logger.add(messages.append, level="DEBUG")
+    try:
+        writer.request(b"pending")
+        # Sinks may already be closed when the service exits
+        persistence._flush_debounced_writers()
+    finally:
+        logger.remove(sink)
+    assert writer.file_path.read_bytes() == b"pending"
+    assert not writer.pending()
+    assert not messages
@@ -0,0 +1,77 @@
+from typing import Any, Dict
+
+import pykson  # type: ignore
+import pytest
+
+from .. import serializers, settings
+from ..schema import SettingsSchema
+
+
+class Endpoint(pykson.JsonObject):
+    name = pykson.StringField()
+    port = pykson.IntegerField()
+    enabled = pykson.BooleanField()
+
+
+class SettingsV1(settings.BaseSettings):
+    VERSION = 1
+    main = pykson.ObjectField(Endpoint)
+    endpoints = pykson.ObjectListField(Endpoint)
+    tags = pykson.ListField(item_type=str)
+
+    def __init__(self, *args: str, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.VERSION = SettingsV1.VERSION
+
+    def migrate(self, data: Dict[str, Any]) -> None:
+        pass
+
+
+class DatedSettings(SettingsV1):
+    created = pykson.DateField()
+
+
+def example_settings() -> SettingsV1:
+    example = SettingsV1()
+    example.main = Endpoint(name="main", port=1, enabled=True)
+    example.endpoints = [Endpoint(name=f"endpoint-{index}", port=index, enabled=False) for index in range(10)]
+    example.tags = ["first", "second"]
+    return example
+
+
+@pytest.mark.parametrize(
+    "serializer",
+    [serializers.JsonSerializer(), serializers.OrjsonSerializer(), serializers.SnapshotSerializer()],
+    ids=str,
+)
+def test_serializers_round_trip(serializer: serializers.SettingsSerializer, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(SettingsV1, "SERIALIZER", serializer)
+    original = example_settings()
+    loaded = SettingsV1()
+    loaded.loads(original.dumps())
+
+    assert loaded.VERSION == 1
+    assert loaded.main.name == "main"
+    assert [endpoint.port for endpoint in loaded.endpoints] == list(range(10))
+    assert all(isinstance(endpoint, Endpoint) for endpoint in loaded.endpoints)
+    assert loaded.tags == ["first", "second"]
+    assert loaded.dumps() == original.dumps()
+
+
+def test_bad_content() -> None:
+    with pytest.raises(settings.BadSettingsFile):
+        SettingsV1().loads(b"[]")
+    with pytest.raises(ValueError):
+        serializers.SnapshotSerializer().loads(b'{"VERSION": 1}')
+    with pytest.raises(settings.BadAttributes):
+        SettingsV1().loads(b'{"VERSION": 1, "unknown": 2}')
+
+
+def test_schema_is_compiled_once() -> None:
+    schema = SettingsSchema.of(SettingsV1)
+    assert schema.compiled
+    assert SettingsSchema.of(SettingsV1) is schema
+    assert SettingsSchema.of(Endpoint).compiled
+    # Date fields need pykson's own formatting
+    assert not SettingsSchema.of(DatedSettings).compiled
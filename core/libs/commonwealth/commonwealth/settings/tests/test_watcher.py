@@ -0,0 +1,34 @@
+import pathlib
+import tempfile
+import threading
+
+import pytest
+
+from .. import watcher
+from ..persistence import write_atomically
+
+
+@pytest.mark.parametrize("inotify", [True, False])
+def test_file_watcher(inotify: bool, monkeypatch: pytest.MonkeyPatch) -> None:
+    if not inotify:
+        monkeypatch.setattr(watcher, "_load_inotify", lambda: None)
+
+    file_path = pathlib.Path(tempfile.mkdtemp()).joinpath("settings-1.json")
+    changed = threading.Event()
+    file_watcher = watcher.FileWatcher(file_path, changed.set, poll_interval=0.01)
+    file_watcher.start()
+    try:
+        assert file_watcher.uses_inotify() == inotify
+
+        # Other files in the same folder are ignored
+        file_path.with_name("settings-2.json").write_text("other", encoding="utf-8")
+        assert not changed.wait(0.1)
+
+        write_atomically(file_path, b"first")
+        assert changed.wait(1.0)
+
+        changed.clear()
+        file_path.write_text("second", encoding="utf-8")
+        assert changed.wait(1.0)
+    finally:
+        file_watcher.stop()
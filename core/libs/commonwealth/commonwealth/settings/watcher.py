@@ -0,0 +1,127 @@
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import select
+import struct
+import threading
+from typing import Callable, Optional, Tuple
+
+from loguru import logger
+
+# From linux/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+FileSignature = Optional[Tuple[int, int, int]]
+
+
+def _load_inotify() -> Optional[ctypes.CDLL]:
+    library = ctypes.util.find_library("c")
+    if library is None:
+        return None
+    libc = ctypes.CDLL(library, use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    return libc
+
+
+class FileWatcher:
+    """Call a function from a background thread whenever a file is written, replaced or deleted
+
+    Uses inotify when available, and falls back to polling the file status otherwise. The parent folder is watched
+    instead of the file itself, so files replaced by a rename, like the atomically written settings, keep being
+    watched.
+    """
+
+    def __init__(self, file_path: pathlib.Path, callback: Callable[[], None], poll_interval: float = 1.0) -> None:
+        self.file_path = file_path
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify_fd: Optional[int] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._inotify_fd = self._start_inotify()
+        target = self._watch_inotify if self._inotify_fd is not None else self._watch_stat
+        self._thread = threading.Thread(target=target, name=f"watcher-{self.file_path.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+
+    def uses_inotify(self) -> bool:
+        return self._inotify_fd is not None
+
+    def _notify(self) -> None:
+        try:
+            self.callback()
+        except Exception as error:
+            logger.exception(f"Failed to handle change of {self.file_path}: {error}")
+
+    def _start_inotify(self) -> Optional[int]:
+        libc = _load_inotify()
+        if libc is None:
+            logger.debug("inotify not available, falling back to polling for file changes.")
+            return None
+        fd = int(libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC))
+        if fd < 0:
+            logger.debug(f"Could not start inotify: {os.strerror(ctypes.get_errno())}")
+            return None
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(fd, bytes(self.file_path.parent), mask) < 0:
+            logger.debug(f"Could not watch {self.file_path.parent}: {os.strerror(ctypes.get_errno())}")
+            os.close(fd)
+            return None
+        return fd
+
+    def _watch_inotify(self) -> None:
+        assert self._inotify_fd is not None
+        while not self._stop.is_set():
+            # Timeout allows checking if the watcher was stopped
+            readable, _, _ = select.select([self._inotify_fd], [], [], self.poll_interval)
+            if not readable:
+                continue
+            events = os.read(self._inotify_fd, 4096)
+            if self.file_path.name in self._parse_inotify_names(events):
+                self._notify()
+
+    @staticmethod
+    def _parse_inotify_names(events: bytes) -> Tuple[str, ...]:
+        names = []
+        offset = 0
+        while offset < len(events):
+            _wd, _mask, _cookie, length = INOTIFY_EVENT_HEADER.unpack_from(events, offset)
+            offset += INOTIFY_EVENT_HEADER.size
+            names.append(events[offset : offset + length].rstrip(b"\0").decode(errors="replace"))
+            offset += length
+        return tuple(names)
+
+    def _signature(self) -> FileSignature:
+        try:
+            status = self.file_path.stat()
+        except FileNotFoundError:
+            return None
+        return (status.st_ino, status.st_size, status.st_mtime_ns)
+
+    def _watch_stat(self) -> None:
+        signature = self._signature()
+        while not self._stop.wait(self.poll_interval):
+            new_signature = self._signature()
+            if new_signature != signature:
+                signature = new_signature
+                self._notify()
@@ -1,16 +1,81 @@
+import abc
+import asyncio
 import pathlib
 import shutil
+import signal
 import subprocess
+import tempfile
 import time
 from ipaddress import IPv4Address, IPv4Interface, IPv4Network
-from typing import Any, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import psutil
 from loguru import logger
+from pydantic import BaseModel
 
+from commonwealth.utils.decorators import cached
+
+DEFAULT_CONFIG_FOLDER = pathlib.Path(tempfile.gettempdir()).joinpath("dnsmasq")
+
+
+@cached(ttl=float("inf"), max_size=32)
+async def _check(
+    binary: pathlib.Path, binary_mtime_ns: int, arguments: Tuple[str, ...]  # pylint: disable=unused-argument
+) -> None:
+    """Run dnsmasq syntax check for the arguments
+
+    Results are cached, and the modification time of the binary is part of the key, so checks only run again when the
+    binary is updated. Failed checks are not cached.
+    """
+    process = await asyncio.create_subprocess_exec(
+        binary, *arguments, "--test", stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    output, _ = await process.communicate()
+    if process.returncode:
+        message = output.decode("utf-8", errors="ignore").strip()
+        raise RuntimeError(f"Dnsmasq check failed ({process.returncode}): {message}")
+
+
+class DHCPLease(BaseModel):
+    # Seconds since epoch when the lease expires, 0 for leases that never expire
+    expiry: int
+    mac_address: str
+    ip: str
+    hostname: Optional[str]
+    client_id: Optional[str]
+
+
+def read_leases(leases_path: pathlib.Path) -> List[DHCPLease]:
+    """IPv4 leases of a dnsmasq lease file, where each line is "<expiry> <mac> <ip> <hostname> <client id>"."""
+    try:
+        lines = leases_path.read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+        return []
+
+    leases = []
+    for line in lines:
+        fields = line.split()
+        # IPv6 leases are stored after a "duid" line, and are not used
+        if fields and fields[0] == "duid":
+            break
+        if len(fields) < 5 or not fields[0].isdigit():
+            continue
+        expiry, mac_address, ip, hostname, client_id = fields[:5]
+        leases.append(
+            DHCPLease(
+                expiry=int(expiry),
+                mac_address=mac_address,
+                ip=ip,
+                hostname=None if hostname == "*" else hostname,
+                client_id=None if client_id == "*" else client_id,
+            )
+        )
+    return leases
+
+
+class DHCPInterfaceConfig:
+    """DHCP configuration of a served interface"""
 
-# pylint: disable=too-many-arguments
-class Dnsmasq:
     def __init__(
         self,
         interface: str,
@@ -19,25 +84,55 @@ class Dnsmasq:
         ipv4_lease_range: Optional[tuple[IPv4Address, IPv4Address]] = None,
         lease_time: str = "24h",
     ) -> None:
-        self._subprocess: Optional[Any] = None
-
         if interface not in psutil.net_if_stats():
             raise ValueError(f"Interface '{interface}' not found. Available interfaces are {psutil.net_if_stats()}.")
-        self._interface = interface
+        self.interface = interface
 
-        self._ipv4_gateway = ipv4_gateway
+        self.ipv4_gateway = ipv4_gateway
 
         if subnet_mask is None:
             # If no subnet mask is defined we assume a class C (24 bit) subnet
             subnet_mask = IPv4Address("255.255.255.0")
-        self._subnet_mask = subnet_mask
+        self.subnet_mask = subnet_mask
 
         if ipv4_lease_range is None:
             # If no lease-range is defined we offer all available IPs for lease
             ipv4_lease_range = (list(self.ipv4_network.hosts())[0], list(self.ipv4_network.hosts())[-1])
-        self._ipv4_lease_range = ipv4_lease_range
+        self.ipv4_lease_range = ipv4_lease_range
+
+        self.lease_time = lease_time
 
-        self._lease_time = lease_time
+    @property
+    def ipv4_network(self) -> IPv4Network:
+        return IPv4Interface(f"{self.ipv4_gateway}/{self.subnet_mask}").network
+
+    def validate(self) -> None:
+        if not (self.ipv4_lease_range[0] in self.ipv4_network and self.ipv4_lease_range[1] in self.ipv4_network):
+            raise ValueError("Initial and final DHCP lease addresses must be in the gateway/subnet network.")
+
+        if not self.ipv4_lease_range[1] > self.ipv4_lease_range[0]:
+            raise ValueError("Final DHCP lease address must be greater than the initial one.")
+
+    def dhcp_range(self) -> str:
+        return f"{self.ipv4_lease_range[0]},{self.ipv4_lease_range[1]},{self.subnet_mask},{self.lease_time}"
+
+
+class DnsmasqProcess(abc.ABC):
+    """Lifecycle of a dnsmasq process
+
+    The process is only started with `start`, which returns as soon as dnsmasq has bound the DHCP socket, so several
+    servers can be started concurrently.
+    """
+
+    # Maximum time, in seconds, for dnsmasq to bind the DHCP socket after being launched
+    STARTUP_TIMEOUT = 5.0
+    # Maximum time, in seconds, for dnsmasq to exit after being terminated, before being killed
+    STOP_TIMEOUT = 3.0
+    POLL_INTERVAL = 0.05
+    DHCP_PORT = 67
+
+    def __init__(self) -> None:
+        self._subprocess: Optional[Any] = None
 
         binary_path = shutil.which(self.binary_name())
         if binary_path is None:
@@ -45,10 +140,6 @@ class Dnsmasq:
             raise ValueError
 
         self._binary = pathlib.Path(binary_path)
-        self.validate_binary()
-
-        self.validate_config()
-        self.start()
 
     @staticmethod
     def binary_name() -> str:
@@ -57,20 +148,132 @@ class Dnsmasq:
     def binary(self) -> pathlib.Path:
         return self._binary
 
-    def validate_binary(self) -> None:
+    @property
+    @abc.abstractmethod
+    def name(self) -> str:
+        """Description of the served interfaces, for logging"""
+
+    @abc.abstractmethod
+    def command_list(self) -> List[Union[str, pathlib.Path]]:
+        """Command line of the dnsmasq process"""
+
+    async def validate_binary(self) -> None:
         if self.binary() is None:
             raise RuntimeError("Binary not available.")
 
-        subprocess.check_output([self.binary(), "--test"])
+        await _check(self.binary(), self.binary().stat().st_mtime_ns, ())
 
-    def validate_config(self) -> None:
-        if not (self._ipv4_lease_range[0] in self.ipv4_network and self._ipv4_lease_range[1] in self.ipv4_network):
-            raise ValueError("Initial and final DHCP lease addresses must be in the gateway/subnet network.")
+    async def validate_config(self) -> None:
+        arguments = tuple(str(argument) for argument in self.command_list()[1:])
+        await _check(self.binary(), self.binary().stat().st_mtime_ns, arguments)
 
-        if not self._ipv4_lease_range[1] > self._ipv4_lease_range[0]:
-            raise ValueError("Final DHCP lease address must be greater than the initial one.")
+    def write_config(self) -> None:
+        """Write the files used by the command line, if any"""
+
+    def is_dhcp_socket_bound(self) -> bool:
+        """Check if the dnsmasq process is already listening for DHCP requests"""
+        if not self.is_running():
+            return False
+        assert self._subprocess is not None
+        try:
+            process = psutil.Process(self._subprocess.pid)
+            # Renamed on psutil 6.0
+            if hasattr(process, "net_connections"):
+                connections = process.net_connections(kind="udp")
+            else:
+                connections = process.connections(kind="udp")
+        except psutil.Error:
+            return False
+        return any(connection.laddr and connection.laddr.port == self.DHCP_PORT for connection in connections)
+
+    async def _wait_ready(self) -> None:
+        assert self._subprocess is not None
+        deadline = time.monotonic() + self.STARTUP_TIMEOUT
+        while not self.is_dhcp_socket_bound():
+            if not self.is_running():
+                raise RuntimeError(f"Failed to initialize Dnsmasq ({self._subprocess.returncode}).")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Dnsmasq did not bind the DHCP socket in {self.STARTUP_TIMEOUT} seconds.")
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    async def start(self) -> None:
+        """Validate binary and configuration, start dnsmasq and wait until it is ready to serve DHCP requests"""
+        if self.is_running():
+            logger.info(f"DHCP Server for {self.name} is already running.")
+            return
+        try:
+            await self.validate_binary()
+            await self.validate_config()
+            self.write_config()
+            # pylint: disable=consider-using-with
+            self._subprocess = subprocess.Popen(self.command_list(), shell=False, encoding="utf-8", errors="ignore")
+            await self._wait_ready()
+            logger.info(f"DHCP Server started for {self.name}.")
+        except Exception as error:
+            self.kill()
+            raise RuntimeError("Unable to start DHCP Server.") from error
+
+    async def stop(self) -> None:
+        """Terminate dnsmasq, so it can save its leases, killing it if it does not exit in time"""
+        if not self.is_running():
+            logger.info("Tried to stop DHCP Server, but it was already not running.")
+            return
+        assert self._subprocess is not None
+        self._subprocess.terminate()
+        deadline = time.monotonic() + self.STOP_TIMEOUT
+        while self.is_running():
+            if time.monotonic() > deadline:
+                logger.warning("DHCP Server did not exit in time, killing it.")
+                self.kill()
+                break
+            await asyncio.sleep(self.POLL_INTERVAL)
+        logger.info(f"DHCP Server stopped for {self.name}.")
+
+    def kill(self) -> None:
+        if self.is_running():
+            assert self._subprocess is not None
+            self._subprocess.kill()
+
+    async def restart(self) -> None:
+        await self.stop()
+        await self.start()
+
+    def is_running(self) -> bool:
+        return self._subprocess is not None and self._subprocess.poll() is None
+
+    @property
+    def pid(self) -> Optional[int]:
+        if not self.is_running():
+            return None
+        assert self._subprocess is not None
+        return int(self._subprocess.pid)
+
+    def __del__(self) -> None:
+        # Can't wait for a graceful stop from here
+        self.kill()
+
+
+class Dnsmasq(DnsmasqProcess):
+    """DHCP server for a single interface"""
+
+    def __init__(
+        self,
+        interface: str,
+        ipv4_gateway: IPv4Address,
+        subnet_mask: Optional[IPv4Address] = None,
+        ipv4_lease_range: Optional[tuple[IPv4Address, IPv4Address]] = None,
+        lease_time: str = "24h",
+    ) -> None:
+        super().__init__()
+        self._config = DHCPInterfaceConfig(interface, ipv4_gateway, subnet_mask, ipv4_lease_range, lease_time)
 
-        subprocess.check_output([*self.command_list(), "--test"])
+    @property
+    def name(self) -> str:
+        return f"interface '{self.interface}'"
+
+    async def validate_config(self) -> None:
+        self._config.validate()
+        await super().validate_config()
 
     def command_list(self) -> List[Union[str, pathlib.Path]]:
         """List of arguments to be used in the command line call.
@@ -79,9 +282,9 @@ class Dnsmasq:
         return [
             self.binary(),
             "--no-daemon",
-            f"--interface={self._interface}",
-            f"--dhcp-range={self._ipv4_lease_range[0]},{self._ipv4_lease_range[1]},{self._subnet_mask},{self._lease_time}",  # fmt: skip
-            f"--dhcp-option=option:router,{self._ipv4_gateway}",
+            f"--interface={self.interface}",
+            f"--dhcp-range={self._config.dhcp_range()}",
+            f"--dhcp-option=option:router,{self.ipv4_gateway}",
             "--bind-interfaces",
             "--dhcp-option=option6:information-refresh-time,6h",
             "--dhcp-authoritative",
@@ -94,48 +297,169 @@ class Dnsmasq:
             "--user=root",
         ]
 
-    def start(self) -> None:
-        try:
-            # pylint: disable=consider-using-with
-            self._subprocess = subprocess.Popen(self.command_list(), shell=False, encoding="utf-8", errors="ignore")
-            time.sleep(3)
-            if not self.is_running():
-                exit_code = self._subprocess.returncode
-                raise RuntimeError(f"Failed to initialize Dnsmasq ({exit_code}).")
-            logger.info("DHCP Server started.")
-        except Exception as error:
-            raise RuntimeError("Unable to start DHCP Server.") from error
-
-    def stop(self) -> None:
-        if self.is_running():
-            assert self._subprocess is not None
-            self._subprocess.kill()
-            logger.info("DHCP Server stopped.")
-        else:
-            logger.info("Tried to stop DHCP Server, but it was already not running.")
-
-    def restart(self) -> None:
-        self.stop()
-        self.start()
-
-    def is_running(self) -> bool:
-        return self._subprocess is not None and self._subprocess.poll() is None
-
     @property
     def interface(self) -> str:
-        return self._interface
+        return self._config.interface
 
     @property
     def ipv4_gateway(self) -> IPv4Address:
-        return self._ipv4_gateway
+        return self._config.ipv4_gateway
 
     @property
     def ipv4_lease_range(self) -> tuple[IPv4Address, IPv4Address]:
-        return self._ipv4_lease_range
+        return self._config.ipv4_lease_range
 
     @property
     def ipv4_network(self) -> IPv4Network:
-        return IPv4Interface(f"{self._ipv4_gateway}/{self._subnet_mask}").network
+        return self._config.ipv4_network
 
-    def __del__(self) -> None:
-        self.stop()
+
+class MultiInterfaceDnsmasq(DnsmasqProcess):
+    """Single DHCP server for several interfaces, sharing one dnsmasq process and cache
+
+    The served interfaces are written to a generated config file, and the DHCP options of each interface to an options
+    file. Dnsmasq reloads the options file on SIGHUP, so gateway changes are applied by signalling it, while adding or
+    removing interfaces restarts the process, as dnsmasq does not reload interfaces and ranges. Leases are kept on a
+    lease file, so clients keep their addresses across restarts.
+
+    Args:
+        config_folder (pathlib.Path, optional): Folder for the config, options and lease files.
+            Defaults to DEFAULT_CONFIG_FOLDER.
+    """
+
+    def __init__(self, config_folder: Optional[pathlib.Path] = None) -> None:
+        super().__init__()
+        self._config_folder = config_folder or DEFAULT_CONFIG_FOLDER
+        self._interfaces: Dict[str, DHCPInterfaceConfig] = {}
+        # Config of the running process, to find out how changes should be applied
+        self._applied_config: Optional[List[str]] = None
+        self._applied_dhcp_options: Optional[List[str]] = None
+        # Created on first use, so it belongs to the event loop running the server
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def name(self) -> str:
+        return f"interfaces {sorted(self._interfaces)}"
+
+    @property
+    def config_path(self) -> pathlib.Path:
+        return self._config_folder.joinpath("dnsmasq.conf")
+
+    @property
+    def dhcp_options_path(self) -> pathlib.Path:
+        return self._config_folder.joinpath("dhcp-options.conf")
+
+    @property
+    def leases_path(self) -> pathlib.Path:
+        return self._config_folder.joinpath("dnsmasq.leases")
+
+    @property
+    def interfaces(self) -> Dict[str, DHCPInterfaceConfig]:
+        return dict(self._interfaces)
+
+    def config(self) -> List[str]:
+        """Lines of the config file, the same as the command line arguments without the leading dashes.
+        Refer to https://thekelleys.org.uk/dnsmasq/docs/dnsmasq-man.html for details about each option."""
+
+        config = [
+            "bind-interfaces",
+            "dhcp-authoritative",
+            "dhcp-rapid-commit",
+            "dhcp-option=option6:information-refresh-time,6h",
+            f"dhcp-optsfile={self.dhcp_options_path}",
+            f"dhcp-leasefile={self.leases_path}",
+            "cache-size=1500",
+            "no-negcache",
+            "no-resolv",
+            "no-poll",
+            "port=0",
+            "user=root",
+        ]
+        for name, interface_config in sorted(self._interfaces.items()):
+            # Interface names are used as tags, to send the options of each interface to its clients
+            config += [f"interface={name}", f"dhcp-range=set:{name},{interface_config.dhcp_range()}"]
+        return config
+
+    def dhcp_options(self) -> List[str]:
+        return [
+            f"tag:{name},option:router,{interface_config.ipv4_gateway}"
+            for name, interface_config in sorted(self._interfaces.items())
+        ]
+
+    def command_list(self) -> List[Union[str, pathlib.Path]]:
+        return [self.binary(), "--no-daemon", f"--conf-file={self.config_path}"]
+
+    async def validate_config(self) -> None:
+        for interface_config in self._interfaces.values():
+            interface_config.validate()
+        # The config file may not be written yet, so its content is checked as command line arguments
+        arguments = tuple(f"--{line}" for line in self.config())
+        await _check(self.binary(), self.binary().stat().st_mtime_ns, arguments)
+
+    def write_config(self) -> None:
+        self._config_folder.mkdir(parents=True, exist_ok=True)
+        config, dhcp_options = self.config(), self.dhcp_options()
+        self.config_path.write_text(
+            "# Generated by BlueOS, changes are overwritten\n" + "\n".join(config) + "\n", encoding="utf-8"
+        )
+        self.dhcp_options_path.write_text("\n".join(dhcp_options) + "\n", encoding="utf-8")
+        self._applied_config, self._applied_dhcp_options = config, dhcp_options
+
+    def reload(self) -> None:
+        """Make dnsmasq reload the DHCP options file"""
+        if self.is_running():
+            assert self._subprocess is not None
+            self._subprocess.send_signal(signal.SIGHUP)
+
+    async def _apply(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Concurrent changes are applied together by the first call to get the lock
+        async with self._lock:
+            if not self._interfaces:
+                await self.stop()
+                return
+            if self.is_running() and self._applied_config == self.config():
+                if self._applied_dhcp_options != self.dhcp_options():
+                    self.write_config()
+                    self.reload()
+                    logger.info(f"DHCP Server reloaded for {self.name}.")
+                return
+            await self.restart()
+
+    async def set_interface(self, interface_config: DHCPInterfaceConfig) -> None:
+        """Serve DHCP on the interface, replacing its previous configuration"""
+        interface_config.validate()
+        previous_config = self._interfaces.get(interface_config.interface)
+        self._interfaces[interface_config.interface] = interface_config
+        try:
+            await self._apply()
+        except Exception:
+            # Keep serving the other interfaces
+            if previous_config is None:
+                self._interfaces.pop(interface_config.interface, None)
+            else:
+                self._interfaces[interface_config.interface] = previous_config
+            try:
+                await self._apply()
+            except Exception as error:
+                logger.error(f"Failed to restore DHCP Server for {self.name}: {error}")
+            raise
+
+    async def remove_interface(self, interface: str) -> None:
+        if self._interfaces.pop(interface, None) is None:
+            return
+        await self._apply()
+
+    def leases(self, interface: Optional[str] = None) -> List[DHCPLease]:
+        """Leases given to the clients of all interfaces, or only of the given one"""
+        networks = [
+            interface_config.ipv4_network
+            for name, interface_config in self._interfaces.items()
+            if interface is None or name == interface
+        ]
+        return [
+            lease
+            for lease in read_leases(self.leases_path)
+            if any(IPv4Address(lease.ip) in network for network in networks)
+        ]
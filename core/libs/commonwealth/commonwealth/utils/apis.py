@@ -1,46 +1,304 @@
+import bisect
+import gzip
 import json
-from typing import Any, Callable, Coroutine, Dict, Optional
+import time
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
-from fastapi import HTTPException, Request, Response, status
+from fastapi import FastAPI, HTTPException, Request, Response, status
 from fastapi.routing import APIRoute
-from loguru import logger
+from starlette.background import BackgroundTask
+from starlette.responses import PlainTextResponse
 from starlette.responses import Response as StarletteResponse
 
-from commonwealth.utils.logs import stack_trace_message
+from commonwealth.utils.logs import ErrorStats, error_aggregator, stack_trace_message
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def pretty_json(content: Any) -> str:
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=2,
+        separators=(", ", ": "),
+    )
 
 
 class PrettyJSONResponse(StarletteResponse):
     media_type = "application/json"
 
     def render(self, content: Any) -> bytes:
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=2,
-            separators=(", ", ": "),
-        ).encode(self.charset)
+        return pretty_json(content).encode(self.charset)
+
+
+class JSONPreferences:
+    """How the client of the current request would like to receive JSON responses"""
+
+    def __init__(self, pretty: bool = False, gzip_accepted: bool = False) -> None:
+        self.pretty = pretty
+        self.gzip_accepted = gzip_accepted
+
+    @staticmethod
+    def from_request(query_params: Mapping[str, str], headers: Mapping[str, str]) -> "JSONPreferences":
+        pretty = query_params.get("pretty", "").lower() in ["1", "true", "yes"]
+        gzip_accepted = "gzip" in headers.get("accept-encoding", "").lower()
+        return JSONPreferences(pretty, gzip_accepted)
+
+
+# Set by GenericErrorHandlingRoute for each request
+json_preferences: ContextVar[JSONPreferences] = ContextVar("json_preferences", default=JSONPreferences())
+
+
+class CompactJSONResponse(StarletteResponse):
+    """JSON without whitespace, using orjson when available
+
+    Pretty output is only produced when requested with `?pretty=1`, and large payloads are compressed with gzip when
+    the client accepts it. Both are negotiated by GenericErrorHandlingRoute.
+    """
+
+    media_type = "application/json"
+    # Smaller payloads are not worth the compression cost
+    GZIP_MINIMUM_SIZE = 1024
+    GZIP_LEVEL = 5
+
+    def __init__(
+        self,
+        content: Any = None,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+        media_type: Optional[str] = None,
+        background: Optional[BackgroundTask] = None,
+    ) -> None:
+        self.preferences = json_preferences.get()
+        self.compressed = False
+        super().__init__(content, status_code, headers, media_type, background)
+        if self.compressed:
+            self.headers["content-encoding"] = "gzip"
+            self.headers["vary"] = "Accept-Encoding"
+
+    def render(self, content: Any) -> bytes:
+        if self.preferences.pretty:
+            body = pretty_json(content).encode(self.charset)
+        elif ORJSON_AVAILABLE:
+            body = orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode(self.charset)
+
+        if self.preferences.gzip_accepted and len(body) >= self.GZIP_MINIMUM_SIZE:
+            self.compressed = True
+            return gzip.compress(body, compresslevel=self.GZIP_LEVEL)
+        return body
+
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class LatencyHistogram:
+    """Histogram of request latencies, with cumulative buckets as used by Prometheus"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        # Last position counts the values above the largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative_counts(self) -> List[Tuple[float, int]]:
+        """Number of values lower or equal to each bucket bound, ending with the infinite bucket"""
+        result = []
+        total = 0
+        for bound, count in zip([*self.buckets, float("inf")], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, quantile: float) -> float:
+        """Estimate quantile by linear interpolation inside its bucket, like Prometheus' histogram_quantile"""
+        if not self.count:
+            return float("nan")
+        rank = quantile * self.count
+        lower_bound, lower_count = 0.0, 0
+        for bound, count in self.cumulative_counts():
+            if count >= rank:
+                if bound == float("inf"):
+                    return lower_bound
+                return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+            lower_bound, lower_count = bound, count
+        return lower_bound
+
+
+class RouteStatistics:
+    def __init__(self) -> None:
+        self.requests = 0
+        # Requests that raised an exception or returned a server error
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+    def record(self, seconds: float, failed: bool) -> None:
+        self.requests += 1
+        self.errors += failed
+        self.latency.observe(seconds)
+
+
+def _prometheus_labels(**labels: Any) -> str:
+    def escape(value: Any) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _prometheus_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class RouteMetrics:
+    """Request count, error count and latency of each route of a service"""
+
+    def __init__(self) -> None:
+        self.routes: Dict[Tuple[str, str], RouteStatistics] = {}
+
+    def record(self, method: str, path: str, seconds: float, failed: bool) -> None:
+        key = (method, path)
+        if key not in self.routes:
+            self.routes[key] = RouteStatistics()
+        self.routes[key].record(seconds, failed)
+
+    def reset(self) -> None:
+        self.routes.clear()
+
+    def render_prometheus(self) -> str:
+        """Metrics in Prometheus text exposition format"""
+        lines = [
+            "# HELP blueos_http_requests_total Number of requests handled by each route.",
+            "# TYPE blueos_http_requests_total counter",
+        ]
+        routes = sorted(self.routes.items())
+        for (method, path), statistics in routes:
+            lines.append(
+                f"blueos_http_requests_total{_prometheus_labels(method=method, route=path)} {statistics.requests}"
+            )
+
+        lines += [
+            "# HELP blueos_http_request_errors_total Number of requests of each route that failed.",
+            "# TYPE blueos_http_request_errors_total counter",
+        ]
+        for (method, path), statistics in routes:
+            labels = _prometheus_labels(method=method, route=path)
+            lines.append(f"blueos_http_request_errors_total{labels} {statistics.errors}")
+
+        lines += [
+            "# HELP blueos_http_request_duration_seconds Time taken to handle requests of each route.",
+            "# TYPE blueos_http_request_duration_seconds histogram",
+        ]
+        for (method, path), statistics in routes:
+            histogram = statistics.latency
+            for bound, count in histogram.cumulative_counts():
+                labels = _prometheus_labels(method=method, route=path, le=_prometheus_number(bound))
+                lines.append(f"blueos_http_request_duration_seconds_bucket{labels} {count}")
+            labels = _prometheus_labels(method=method, route=path)
+            lines.append(f"blueos_http_request_duration_seconds_sum{labels} {_prometheus_number(histogram.sum)}")
+            lines.append(f"blueos_http_request_duration_seconds_count{labels} {histogram.count}")
+
+        lines += [
+            "# HELP blueos_http_request_duration_quantile_seconds Latency quantiles estimated from the histogram.",
+            "# TYPE blueos_http_request_duration_quantile_seconds gauge",
+        ]
+        for (method, path), statistics in routes:
+            for quantile in LATENCY_QUANTILES:
+                labels = _prometheus_labels(method=method, route=path, quantile=quantile)
+                value = _prometheus_number(statistics.latency.quantile(quantile))
+                lines.append(f"blueos_http_request_duration_quantile_seconds{labels} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Shared by all routes of the service
+route_metrics = RouteMetrics()
 
 
 class GenericErrorHandlingRoute(APIRoute):
+    # Record request count, errors and latency of each route in route_metrics
+    RECORD_METRICS = True
+
     def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
         original_route_handler = super().get_route_handler()
+        route_path = self.path
 
         async def custom_route_handler(request: Request) -> Response:
+            start = time.perf_counter()
+            failed = True
+            preferences_token = json_preferences.set(
+                JSONPreferences.from_request(request.query_params, request.headers)
+            )
             try:
-                return await original_route_handler(request)
+                response = await original_route_handler(request)
+                failed = response.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR
+                return response
             except HTTPException as error:
-                logger.exception(error)
+                # Same as for returned responses, client errors don't count as failures of the route
+                failed = error.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR
+                error_aggregator.report(error, f"{request.method} {route_path} failed:")
                 raise error
             except Exception as error:
-                logger.error("Unhandled service exception.")
-                logger.exception(error)
+                error_aggregator.report(error, "Unhandled service exception.")
                 error_msg = stack_trace_message(error)
                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_msg) from error
+            finally:
+                json_preferences.reset(preferences_token)
+                if self.RECORD_METRICS:
+                    route_metrics.record(request.method, route_path, time.perf_counter() - start, failed)
 
         return custom_route_handler
 
 
+def add_metrics_endpoint(app: FastAPI, path: str = "/metrics") -> None:
+    """Serve the metrics of the routes of the service in Prometheus text format
+
+    Should be added before mounting static files on the root of the app, as routes are matched in order.
+    """
+
+    def metrics() -> PlainTextResponse:
+        return PlainTextResponse(route_metrics.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+    app.add_api_route(path, metrics, methods=["GET"], include_in_schema=False)
+
+
 class StackedHTTPException(HTTPException):
     def __init__(self, status_code: int, error: BaseException, headers: Optional[Dict[str, Any]] = None) -> None:
         super().__init__(status_code=status_code, detail=stack_trace_message(error), headers=headers)
+
+
+def add_error_stats_endpoint(app: FastAPI, path: str = "/errors") -> None:
+    """Serve the statistics of the errors aggregated by the service, most frequent first"""
+
+    def errors() -> List[ErrorStats]:
+        return error_aggregator.stats()
+
+    app.add_api_route(path, errors, methods=["GET"], response_model=List[ErrorStats], include_in_schema=False)
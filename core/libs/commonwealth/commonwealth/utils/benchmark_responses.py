@@ -0,0 +1,129 @@
+"""Compare render cost and size of the JSON responses with the real response models of the services
+
+Usage: python -m commonwealth.utils.benchmark_responses [--items N] [--runs N] [--services-path PATH]
+"""
+
+import argparse
+import importlib.util
+import pathlib
+import timeit
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple, Type
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from commonwealth.utils.apis import (
+    CompactJSONResponse,
+    JSONPreferences,
+    PrettyJSONResponse,
+    json_preferences,
+)
+
+
+class ResponseModel(NamedTuple):
+    # Model file, relative to the services folder
+    path: str
+    class_name: str
+    # Creates the data of an item of the list returned
+    create_item: Callable[[int], Dict[str, Any]]
+
+
+RESPONSE_MODELS = {
+    "available_firmwares": ResponseModel(
+        "ardupilot_manager/typedefs.py",
+        "Firmware",
+        lambda index: {
+            "name": f"4.1.{index}",
+            "url": f"https://firmware.ardupilot.org/Sub/stable-4.1.{index}/Pixhawk1/ardusub.apj",
+        },
+    ),
+    "available_boards": ResponseModel(
+        "ardupilot_manager/typedefs.py",
+        "FlightController",
+        lambda index: {"name": f"Board {index}", "manufacturer": "3DR", "platform": "Pixhawk1", "path": "/dev/ttyACM0"},
+    ),
+    "wifi_scan": ResponseModel(
+        "wifi/typedefs.py",
+        "ScannedWifiNetwork",
+        lambda index: {
+            "ssid": f"network-{index}",
+            "bssid": f"00:11:22:33:44:{index % 256:02x}",
+            "flags": "[WPA2-PSK-CCMP][WPS][ESS]",
+            "frequency": 2412,
+            "signallevel": -40 - index % 50,
+        },
+    ),
+    "wifi_saved": ResponseModel(
+        "wifi/typedefs.py",
+        "SavedWifiNetwork",
+        lambda index: {"networkid": index, "ssid": f"network-{index}", "bssid": "any", "flags": "[CURRENT]"},
+    ),
+    "mdns_entries": ResponseModel(
+        "beacon/typedefs.py",
+        "MdnsEntry",
+        lambda index: {
+            "ip": f"192.168.2.{index % 256}",
+            "hostname": f"blueos-{index}.local",
+            "fullname": f"BlueOS {index}._http._tcp.local.",
+            "interface": "eth0",
+            "interface_type": "WIRED",
+            "service_type": "_http._tcp.local.",
+        },
+    ),
+}
+
+DEFAULT_SERVICES_PATH = pathlib.Path(__file__).resolve().parents[4].joinpath("services")
+
+
+def load_model(services_path: pathlib.Path, relative_path: str, class_name: str) -> Type[BaseModel]:
+    module_name = f"benchmark_{relative_path.replace('/', '_').replace('.py', '')}"
+    spec = importlib.util.spec_from_file_location(module_name, services_path / relative_path)
+    assert spec is not None and spec.loader is not None, f"Could not find {relative_path}"
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    model: Type[BaseModel] = getattr(module, class_name)
+    return model
+
+
+def measure(response_class: Type[Any], preferences: JSONPreferences, content: Any, runs: int) -> Tuple[float, int]:
+    """Mean render time in microseconds and body size in bytes"""
+    token = json_preferences.set(preferences)
+    try:
+        size = len(response_class(content).body)
+        render_us = timeit.timeit(lambda: response_class(content), number=runs) / runs * 1e6
+    finally:
+        json_preferences.reset(token)
+    return render_us, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=50, help="Number of items on each response.")
+    parser.add_argument("--runs", type=int, default=200, help="Number of renders measured.")
+    parser.add_argument("--services-path", type=pathlib.Path, default=DEFAULT_SERVICES_PATH)
+    args = parser.parse_args()
+
+    variants: List[Tuple[str, Type[Any], JSONPreferences]] = [
+        ("pretty", PrettyJSONResponse, JSONPreferences()),
+        ("compact", CompactJSONResponse, JSONPreferences()),
+        ("compact+gzip", CompactJSONResponse, JSONPreferences(gzip_accepted=True)),
+        ("?pretty=1", CompactJSONResponse, JSONPreferences(pretty=True)),
+    ]
+
+    print(f"{'response':<22}{'variant':<15}{'render (us)':>13}{'size (B)':>10}")
+    for name, response_model in RESPONSE_MODELS.items():
+        try:
+            model = load_model(args.services_path, response_model.path, response_model.class_name)
+        except Exception as error:
+            print(f"{name:<22}skipped, could not import model: {error}")
+            continue
+
+        # Same content FastAPI gives to the response class after validating the response model
+        content = jsonable_encoder([model.parse_obj(response_model.create_item(index)) for index in range(args.items)])
+        for variant, response_class, preferences in variants:
+            render_us, size = measure(response_class, preferences, content, args.runs)
+            print(f"{name:<22}{variant:<15}{render_us:>13.1f}{size:>10}")
+
+
+if __name__ == "__main__":
+    main()
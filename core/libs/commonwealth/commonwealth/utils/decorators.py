@@ -1,37 +1,219 @@
+import asyncio
+import concurrent.futures
+import threading
 import time
+from collections import OrderedDict
 from functools import wraps
-from typing import Any, Callable, Dict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
 
+from loguru import logger
+from pydantic import BaseModel
 
-def temporary_cache(timeout_seconds: float = 10) -> Callable[[Callable[[Any], Any]], Any]:
-    """Decorator that creates a cache for specific inputs with a configured timeout in seconds.
+Flight = Union["asyncio.Future[Any]", "concurrent.futures.Future[Any]"]
+
+
+class CacheStats(BaseModel):
+    entries: int = 0
+    # Calls answered with a fresh value
+    hits: int = 0
+    # Calls answered with an expired value while it's refreshed in background
+    stale_hits: int = 0
+    # Calls that had to compute the value
+    misses: int = 0
+    # Calls that waited for the computation started by another call with the same arguments
+    shared: int = 0
+    # Entries removed to keep the cache under its maximum size
+    evictions: int = 0
+
+
+class FunctionCache:  # pylint: disable=too-many-instance-attributes
+    """Cache of the results of a function, shared between threads and coroutines
+
+    Only one computation runs at a time for the same arguments: concurrent calls wait for the running computation
+    instead of starting a new one. Exceptions are not cached, and are raised to every call waiting for them.
 
     Args:
-        timeout_seconds (float, optional): Timeout to be used for cache invalidation. Defaults to 10.
+        function (Callable): Function, or coroutine function, being cached
+        ttl (float): Time in seconds that a value is considered fresh
+        max_size (int): Maximum number of entries, the least recently used ones are evicted first
+        stale_ttl (float): Time in seconds after expiring that a value is still returned, while a new one is computed
+            in background
+    """
+
+    def __init__(self, function: Callable[..., Any], ttl: float, max_size: int, stale_ttl: float) -> None:
+        if max_size <= 0:
+            raise ValueError(f"Cache size should be positive, got {max_size}.")
+        self.function = function
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    @staticmethod
+    def _key(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Hashable:
+        if not kwargs:
+            return args
+        return (args, tuple(sorted(kwargs.items())))
+
+    def _lookup(self, key: Hashable) -> Tuple[Optional[bool], Any]:
+        """Check if there is a fresh (True) or stale (False) value for key, or None if there is no value at all"""
+        if key not in self._entries:
+            return None, None
+        timestamp, value = self._entries[key]
+        age = time.monotonic() - timestamp
+        if age < self.ttl:
+            self._entries.move_to_end(key)
+            return True, value
+        if age < self.ttl + self.stale_ttl:
+            return False, value
+        del self._entries[key]
+        return None, None
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+    def _finish(self, key: Hashable, flight: Flight) -> None:
+        with self._lock:
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+
+    def call(self, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        key = self._key(args, kwargs)
+        with self._lock:
+            fresh, value = self._lookup(key)
+            if fresh:
+                self._stats.hits += 1
+                return value
+            flight = self._in_flight.get(key)
+            if fresh is False:
+                self._stats.stale_hits += 1
+                if flight is None:
+                    flight = self._in_flight[key] = concurrent.futures.Future()
+                    threading.Thread(target=self._compute, args=(key, flight, args, kwargs), daemon=True).start()
+                return value
+            owner = flight is None
+            if owner:
+                self._stats.misses += 1
+                flight = self._in_flight[key] = concurrent.futures.Future()
+            else:
+                self._stats.shared += 1
+        assert isinstance(flight, concurrent.futures.Future)
+        if owner:
+            self._compute(key, flight, args, kwargs)
+        return flight.result()
+
+    def _compute(
+        self, key: Hashable, flight: "concurrent.futures.Future[Any]", args: Tuple[Any, ...], kwargs: Dict[str, Any]
+    ) -> None:
+        try:
+            value = self.function(*args, **kwargs)
+            self._store(key, value)
+            flight.set_result(value)
+        except Exception as error:
+            logger.debug(f"Failed to compute {self.function.__name__} for cache: {error}")
+            flight.set_exception(error)
+        finally:
+            self._finish(key, flight)
+
+    async def call_async(self, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        key = self._key(args, kwargs)
+        with self._lock:
+            fresh, value = self._lookup(key)
+            if fresh:
+                self._stats.hits += 1
+                return value
+            flight = self._in_flight.get(key)
+            if flight is None:
+                flight = self._in_flight[key] = asyncio.ensure_future(self._compute_async(key, args, kwargs))
+                # Avoids "exception was never retrieved" warnings for background refreshes no one is waiting for
+                flight.add_done_callback(lambda task: task.cancelled() or task.exception())
+                if fresh is None:
+                    self._stats.misses += 1
+            elif fresh is None:
+                self._stats.shared += 1
+            if fresh is False:
+                self._stats.stale_hits += 1
+                return value
+        assert isinstance(flight, asyncio.Future)
+        # Shielded, so a cancelled caller does not cancel the computation for the others waiting for it
+        return await asyncio.shield(flight)
+
+    async def _compute_async(self, key: Hashable, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        flight = self._in_flight[key]
+        try:
+            value = await self.function(*args, **kwargs)
+            self._store(key, value)
+            return value
+        except Exception as error:
+            logger.debug(f"Failed to compute {self.function.__name__} for cache: {error}")
+            raise
+        finally:
+            self._finish(key, flight)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def info(self) -> CacheStats:
+        with self._lock:
+            return self._stats.copy(update={"entries": len(self._entries)})
+
+
+def cached(
+    ttl: float = 10, max_size: int = 128, stale_ttl: float = 0
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator that caches the results of a function, or coroutine function, for each of its arguments.
+
+    The cache is available as the `cache` attribute of the decorated function, to check its statistics or clear it.
+    See FunctionCache for the behavior of the cache.
+
+    Args:
+        ttl (float, optional): Time in seconds that a value is considered fresh. Defaults to 10.
+        max_size (int, optional): Maximum number of cached arguments. Defaults to 128.
+        stale_ttl (float, optional): Time in seconds after expiring that a value is still returned while being
+            refreshed in background. Defaults to 0.
 
     Returns:
         Any: Return of the decorated function
     """
-    cache: Dict[Any, Any] = {}
-    last_sample_time: Dict[Any, float] = {}
 
-    def inner_function(function: Callable[[Any], Any]) -> Any:
-        @wraps(function)
-        def wrapper(*args: Any) -> Any:
-            nonlocal last_sample_time
-            current_time = time.time()
-            cache_is_valid = args in last_sample_time and current_time - last_sample_time[args] < timeout_seconds
+    def inner_function(function: Callable[..., Any]) -> Callable[..., Any]:
+        cache = FunctionCache(function, ttl, max_size, stale_ttl)
+
+        if asyncio.iscoroutinefunction(function):
 
-            # The cache is still valid and we can return the value if exists
-            if cache_is_valid and args in cache:
-                return cache[args]
+            @wraps(function)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                return await cache.call_async(args, kwargs)
 
-            # The cache is invalid or argument does not exist in cache, update it!
-            last_sample_time[args] = current_time
-            function_return = function(*args)
-            cache[args] = function_return
-            return function_return
+            setattr(async_wrapper, "cache", cache)
+            return async_wrapper
 
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return cache.call(args, kwargs)
+
+        setattr(wrapper, "cache", cache)
         return wrapper
 
     return inner_function
+
+
+def temporary_cache(timeout_seconds: float = 10) -> Callable[[Callable[..., Any]], Any]:
+    """Decorator that creates a cache for specific inputs with a configured timeout in seconds.
+
+    Args:
+        timeout_seconds (float, optional): Timeout to be used for cache invalidation. Defaults to 10.
+
+    Returns:
+        Any: Return of the decorated function
+    """
+    return cached(ttl=timeout_seconds)
@@ -1,11 +1,25 @@
+import hashlib
+import json
 import logging
-from datetime import datetime
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from functools import partial
 from logging import LogRecord
 from pathlib import Path
 from types import FrameType
-from typing import Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, TextIO, Union
 
 from loguru import logger
+from pydantic import BaseModel
+
+LOG_FOLDER = Path("/var/logs/blueos/services")
+# Rotate to a new file once the current one reaches this size or age
+DEFAULT_ROTATION_BYTES = 10 * 1024 * 1024
+DEFAULT_ROTATION_AGE = timedelta(days=1)
+# Maximum size of all log files kept by a service
+DEFAULT_RETENTION_BYTES = 50 * 1024 * 1024
 
 
 class InterceptHandler(logging.Handler):
@@ -27,8 +41,8 @@ class InterceptHandler(logging.Handler):
         logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
 
 
-def get_new_log_path(service_name: str) -> Path:
-    """Get default Path to a new log for a given service."""
+def get_service_log_folder(service_name: str) -> Path:
+    """Get folder of the logs of a given service, creating it if needed."""
     # Prevent problematic service names
     if service_name == "":
         raise ValueError("Service name cannot be empty")
@@ -38,20 +52,218 @@ def get_new_log_path(service_name: str) -> Path:
         raise ValueError("Service name cannot contain extension-separation character ('.').")
 
     # Create folder for service logs if it doesn't exist yet
-    default_log_folder = Path("/var/logs/blueos/services")
-    service_log_folder = default_log_folder.joinpath(service_name)
+    service_log_folder = LOG_FOLDER.joinpath(service_name)
     service_log_folder.mkdir(parents=True, exist_ok=True)
+    return service_log_folder
 
+
+def get_new_log_path(service_name: str) -> Path:
+    """Get default Path to a new log for a given service."""
     # Returned log path are service-specific and store datetime information
     datetime_now = datetime.now().strftime("%m-%d-%Y_%H:%M:%S")
-    return service_log_folder.joinpath(f"logfile_{datetime_now}.log")
+    return get_service_log_folder(service_name).joinpath(f"logfile_{datetime_now}.log")
+
+
+class LogRotation:
+    """Loguru rotation condition, starting a new file when the current one is too big or too old"""
+
+    def __init__(self, max_bytes: int = DEFAULT_ROTATION_BYTES, max_age: timedelta = DEFAULT_ROTATION_AGE) -> None:
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._file_start: Optional[datetime] = None
+
+    def __call__(self, message: Any, file: TextIO) -> bool:
+        message_time = message.record["time"]
+        if self._file_start is None:
+            self._file_start = message_time
+        if file.tell() + len(message) > self.max_bytes or message_time - self._file_start >= self.max_age:
+            self._file_start = message_time
+            return True
+        return False
+
+
+def enforce_retention_budget(log_files: Iterable[Union[str, Path]], max_bytes: int) -> None:
+    """Remove the oldest log files until the total size of the remaining ones fits in max_bytes."""
+    files = sorted((Path(log_file) for log_file in log_files), key=lambda path: path.stat().st_mtime, reverse=True)
+    total_bytes = 0
+    for log_file in files:
+        total_bytes += log_file.stat().st_size
+        if total_bytes > max_bytes:
+            log_file.unlink()
+
+
+def structured_log_format(service_name: str, record: Dict[str, Any]) -> str:
+    """Loguru format function writing each message as a JSON line, as read by commonwealth.utils.structured_logs"""
+    entry = {
+        "time": record["time"].timestamp(),
+        "level": record["level"].name,
+        "levelno": record["level"].no,
+        "service": service_name,
+        "name": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    if record["exception"] is not None:
+        entry["exception"] = "".join(traceback.format_exception(*record["exception"]))
+    record["extra"]["structured"] = json.dumps(entry, ensure_ascii=False, default=str)
+    return "{extra[structured]}\n"
+
+
+def init_service_logs(
+    service_name: str,
+    rotation: Optional[LogRotation] = None,
+    retention_bytes: int = DEFAULT_RETENTION_BYTES,
+    compression: Optional[str] = "gz",
+    level: str = "DEBUG",
+) -> int:
+    """Add a log file sink for a given service.
+
+    Messages are written as JSON lines by a background thread, so logging never blocks the caller. Files are rotated
+    by size and age, rotated files are compressed, and the oldest files of the service are removed to keep it under
+    its budget.
+
+    Args:
+        service_name (str): Name of the service, used as the name of the folder of its logs
+        rotation (LogRotation, optional): When to start a new file. Defaults to LogRotation().
+        retention_bytes (int, optional): Maximum size of all log files of the service. Defaults to 50 MiB.
+        compression (str, optional): Loguru compression format of rotated files. Defaults to "gz".
+        level (str, optional): Minimum level of the messages written. Defaults to "DEBUG".
+
+    Returns:
+        int: Loguru sink identifier, that can be used to remove it
+    """
+    service_log_folder = get_service_log_folder(service_name)
+    retention = partial(enforce_retention_budget, max_bytes=retention_bytes)
+    # Loguru only applies retention when rotating, files from previous runs are handled here
+    retention(service_log_folder.glob("logfile_*"))
+    return logger.add(
+        service_log_folder.joinpath("logfile_{time:MM-DD-YYYY_HH:mm:ss}.jsonl"),
+        format=partial(structured_log_format, service_name),
+        level=level,
+        enqueue=True,
+        rotation=rotation or LogRotation(),
+        retention=retention,
+        compression=compression,
+    )
+
+
+def _error_chain(error: BaseException) -> Iterable[BaseException]:
+    """Error followed by the errors that caused it"""
+    seen = set()
+    current: Optional[BaseException] = error
+    # Chains may contain cycles, when an error is raised again from its own cause
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        yield current
+        current = current.__cause__
 
 
 def stack_trace_message(error: BaseException) -> str:
     """Get string containing joined messages from all exceptions in stack trace, beggining with the most recent one."""
-    message = str(error)
-    sub_error = error.__cause__
-    while sub_error is not None:
-        message = f"{message} {sub_error}"
-        sub_error = sub_error.__cause__
-    return message
+    return " ".join(str(sub_error) for sub_error in _error_chain(error))
+
+
+def error_fingerprint(error: BaseException) -> str:
+    """Identify an error by the types and code locations of its chain, ignoring the messages, which usually contain
+    values that change between occurrences of the same failure."""
+    parts = []
+    for sub_error in _error_chain(error):
+        parts.append(type(sub_error).__qualname__)
+        # Walking the traceback directly avoids loading the source lines, as traceback.extract_tb does
+        trace = sub_error.__traceback__
+        while trace is not None:
+            code = trace.tb_frame.f_code
+            parts.append(f"{code.co_filename}:{code.co_name}:{trace.tb_lineno}")
+            trace = trace.tb_next
+    return hashlib.blake2b("|".join(parts).encode(), digest_size=8).hexdigest()
+
+
+class ErrorStats(BaseModel):
+    fingerprint: str
+    type: str
+    # Message of the last occurrence
+    message: str
+    count: int = 1
+    # Occurrences not logged since the last report
+    suppressed: int = 0
+    first_seen: float
+    last_seen: float
+    last_reported: float
+
+
+class ErrorAggregator:
+    """Log errors with their traceback, rate-limiting repeated ones
+
+    Errors are grouped by fingerprint. The first occurrence is logged, and following ones are only counted until
+    report_interval has passed, when the next occurrence is logged with the number of suppressed ones.
+    """
+
+    def __init__(self, report_interval: float = 60.0, max_errors: int = 256) -> None:
+        self.report_interval = report_interval
+        self.max_errors = max_errors
+        self._errors: Dict[str, ErrorStats] = {}
+        self._lock = threading.Lock()
+
+    def report(self, error: BaseException, message: str = "", level: str = "ERROR", depth: int = 0) -> bool:
+        """Log error, unless an error with the same fingerprint was recently logged
+
+        Args:
+            error (BaseException): Error to be reported
+            message (str, optional): Context of the error, logged before the error message
+            level (str, optional): Loguru level of the log. Defaults to "ERROR".
+            depth (int, optional): Number of callers to skip when identifying where the log comes from.
+
+        Returns:
+            bool: True if the error was logged, False if it was only counted
+        """
+        fingerprint = error_fingerprint(error)
+        now = time.time()
+        with self._lock:
+            stats = self._errors.get(fingerprint)
+            if stats is None:
+                if len(self._errors) >= self.max_errors:
+                    oldest = min(self._errors.values(), key=lambda stats: stats.last_seen)
+                    del self._errors[oldest.fingerprint]
+                stats = ErrorStats(
+                    fingerprint=fingerprint,
+                    type=type(error).__qualname__,
+                    message=str(error),
+                    first_seen=now,
+                    last_seen=now,
+                    last_reported=now,
+                )
+                self._errors[fingerprint] = stats
+                suppressed = 0
+            else:
+                stats.count += 1
+                stats.message = str(error)
+                stats.last_seen = now
+                if now - stats.last_reported < self.report_interval:
+                    stats.suppressed += 1
+                    return False
+                suppressed, stats.suppressed, stats.last_reported = stats.suppressed, 0, now
+
+        text = f"{message} {stack_trace_message(error)}" if message else stack_trace_message(error)
+        if suppressed:
+            text += f" (repeated {suppressed} more times since last report, id {fingerprint})"
+        logger.opt(depth=depth + 1, exception=error).log(level, text)
+        return True
+
+    def stats(self) -> List[ErrorStats]:
+        """Statistics of the errors reported, most frequent first"""
+        with self._lock:
+            return sorted((stats.copy() for stats in self._errors.values()), key=lambda stats: -stats.count)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._errors.clear()
+
+
+# Shared by all modules of the service
+error_aggregator = ErrorAggregator()
+
+
+def report_error(error: BaseException, message: str = "", level: str = "ERROR") -> bool:
+    """Log error through the error aggregator of the service, see ErrorAggregator.report"""
+    return error_aggregator.report(error, message, level, depth=1)
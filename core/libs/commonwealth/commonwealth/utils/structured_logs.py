@@ -0,0 +1,218 @@
+"""Index and query of the structured (JSON lines) service logs written by commonwealth.utils.logs
+
+Each log file is split in blocks of complete lines, and an index with the byte offset, time range and highest level
+of each block is kept on a hidden folder next to the logs. Queries only read the blocks that may contain matching
+entries, one block at a time, so files are never loaded entirely into memory.
+"""
+
+import gzip
+import heapq
+import json
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union
+
+from loguru import logger
+from pydantic import BaseModel
+
+from commonwealth.utils import logs
+
+INDEX_FOLDER_NAME = ".index"
+# Bump when the index format changes, so old indexes are rebuilt
+INDEX_VERSION = 1
+BLOCK_BYTES = 64 * 1024
+
+LEVELS = {"TRACE": 5, "DEBUG": 10, "INFO": 20, "SUCCESS": 25, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+LogEntry = Dict[str, Any]
+
+
+class LogBlock(BaseModel):
+    # Byte offset and length in the uncompressed content of the file
+    offset: int
+    length: int
+    start: float
+    end: float
+    max_level: int
+
+
+class LogFilter(BaseModel):
+    # Time range of the entries, in seconds since epoch
+    since: Optional[float] = None
+    until: Optional[float] = None
+    # Minimum level number of the entries, see LEVELS
+    min_level: Optional[int] = None
+    # Text that should be part of the message of the entries
+    contains: Optional[str] = None
+
+    def matches_block(self, block: LogBlock) -> bool:
+        return not (
+            (self.since is not None and block.end < self.since)
+            or (self.until is not None and block.start > self.until)
+            or (self.min_level is not None and block.max_level < self.min_level)
+        )
+
+    def matches(self, entry: LogEntry) -> bool:
+        return not (
+            (self.since is not None and entry["time"] < self.since)
+            or (self.until is not None and entry["time"] > self.until)
+            or (self.min_level is not None and entry["levelno"] < self.min_level)
+            or (self.contains is not None and self.contains not in entry["message"])
+        )
+
+
+class LogFileIndex(BaseModel):
+    version: int = INDEX_VERSION
+    # Size and modification time of the file when indexed, to detect changes
+    size: int = 0
+    mtime_ns: int = 0
+    indexed_bytes: int = 0
+    blocks: List[LogBlock] = []
+
+
+def _open_log(log_file: Path) -> Union[BinaryIO, gzip.GzipFile]:
+    if log_file.suffix == ".gz":
+        return gzip.open(log_file, "rb")
+    return open(log_file, "rb")
+
+
+def _index_path(log_file: Path) -> Path:
+    return log_file.parent.joinpath(INDEX_FOLDER_NAME, f"{log_file.name}.json")
+
+
+def _scan_blocks(log_file: Path, start_offset: int) -> Iterator[LogBlock]:
+    """Split the complete lines of the file, from the offset on, in blocks of about BLOCK_BYTES"""
+    with _open_log(log_file) as content:
+        content.seek(start_offset)
+        block: Optional[LogBlock] = None
+        offset = start_offset
+        for line in content:
+            # Line still being written
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entry = json.loads(line)
+                entry_time, entry_level = float(entry["time"]), int(entry["levelno"])
+            except (ValueError, KeyError, TypeError):
+                # Lines from older, non structured logs, are skipped
+                offset += len(line)
+                if block is not None:
+                    block.length += len(line)
+                continue
+
+            if block is None:
+                block = LogBlock(offset=offset, length=0, start=entry_time, end=entry_time, max_level=entry_level)
+            block.length += len(line)
+            block.start = min(block.start, entry_time)
+            block.end = max(block.end, entry_time)
+            block.max_level = max(block.max_level, entry_level)
+            offset += len(line)
+            if block.length >= BLOCK_BYTES:
+                yield block
+                block = None
+        if block is not None:
+            yield block
+
+
+def index_log_file(log_file: Path) -> LogFileIndex:
+    """Get index of a log file, updating it with the lines added since it was last indexed"""
+    index_path = _index_path(log_file)
+    status = log_file.stat()
+
+    index = LogFileIndex()
+    try:
+        index = LogFileIndex.parse_raw(index_path.read_bytes())
+    except FileNotFoundError:
+        pass
+    except Exception as error:
+        logger.debug(f"Rebuilding invalid index of {log_file}: {error}")
+
+    if index.version == INDEX_VERSION and index.size == status.st_size and index.mtime_ns == status.st_mtime_ns:
+        return index
+
+    growing = index.version == INDEX_VERSION and status.st_size > index.size and log_file.suffix != ".gz"
+    if not growing:
+        index = LogFileIndex()
+    # The last block may have been incomplete, so it's scanned again
+    if index.blocks and index.blocks[-1].length < BLOCK_BYTES:
+        index.blocks.pop()
+    start_offset = index.blocks[-1].offset + index.blocks[-1].length if index.blocks else 0
+
+    index.blocks.extend(_scan_blocks(log_file, start_offset))
+    index.indexed_bytes = index.blocks[-1].offset + index.blocks[-1].length if index.blocks else 0
+    index.size = status.st_size
+    index.mtime_ns = status.st_mtime_ns
+
+    try:
+        index_path.parent.mkdir(exist_ok=True)
+        index_path.write_text(index.json(), encoding="utf-8")
+    except OSError as error:
+        logger.debug(f"Could not store index of {log_file}: {error}")
+    return index
+
+
+def _log_files(service_folder: Path) -> List[Path]:
+    """Structured log files of a service, oldest first"""
+    files = [*service_folder.glob("logfile_*.jsonl"), *service_folder.glob("logfile_*.jsonl.gz")]
+    return sorted(files, key=lambda path: path.stat().st_mtime)
+
+
+def _remove_orphan_indexes(service_folder: Path) -> None:
+    for index_path in service_folder.joinpath(INDEX_FOLDER_NAME).glob("*.json"):
+        if not service_folder.joinpath(index_path.stem).exists():
+            index_path.unlink()
+
+
+def list_log_services(log_folder: Optional[Path] = None) -> List[str]:
+    """Names of the services with structured logs"""
+    log_folder = log_folder or logs.LOG_FOLDER
+    if not log_folder.is_dir():
+        return []
+    return sorted(folder.name for folder in log_folder.iterdir() if folder.is_dir() and _log_files(folder))
+
+
+def _read_entries(content: Union[BinaryIO, gzip.GzipFile], block: LogBlock) -> Iterator[LogEntry]:
+    content.seek(block.offset)
+    for line in content.read(block.length).splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(entry, dict) and {"time", "levelno", "message"} <= entry.keys():
+            yield entry
+
+
+def _query_service(service_folder: Path, log_filter: LogFilter) -> Iterator[LogEntry]:
+    _remove_orphan_indexes(service_folder)
+    for log_file in _log_files(service_folder):
+        try:
+            blocks = [block for block in index_log_file(log_file).blocks if log_filter.matches_block(block)]
+            if not blocks:
+                continue
+            with _open_log(log_file) as content:
+                for block in blocks:
+                    yield from filter(log_filter.matches, _read_entries(content, block))
+        except FileNotFoundError:
+            # Removed by the retention of the service while reading it
+            continue
+
+
+def query_logs(
+    services: Optional[List[str]] = None, log_filter: Optional[LogFilter] = None, log_folder: Optional[Path] = None
+) -> Iterator[LogEntry]:
+    """Stream the log entries of the services that match the filter, ordered by time
+
+    Args:
+        services (List[str], optional): Names of the services. Defaults to all services.
+        log_filter (LogFilter, optional): Filter of the entries. Defaults to all entries.
+        log_folder (Path, optional): Folder with the logs of all services. Defaults to logs.LOG_FOLDER.
+
+    Returns:
+        Iterator[LogEntry]: Entries as written by commonwealth.utils.logs.structured_log_format
+    """
+    log_folder = log_folder or logs.LOG_FOLDER
+    log_filter = log_filter or LogFilter()
+    available_services = list_log_services(log_folder)
+    # Only known names are used, so they can't point outside of the logs folder
+    service_names = [name for name in services if name in available_services] if services else available_services
+    streams = [_query_service(log_folder.joinpath(name), log_filter) for name in service_names]
+    return heapq.merge(*streams, key=lambda entry: float(entry["time"]))
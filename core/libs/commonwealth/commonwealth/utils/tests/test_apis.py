@@ -0,0 +1,120 @@
+import gzip
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+from fastapi import FastAPI, HTTPException, Response
+from starlette.types import Message, Scope
+
+from .. import apis
+
+
+async def get(
+    app: FastAPI, path: str, query: str = "", headers: Optional[Dict[str, str]] = None
+) -> Tuple[int, bytes, Dict[str, str]]:
+    """Do a GET request directly through the ASGI interface of the app"""
+    messages: List[Message] = []
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        messages.append(message)
+
+    scope: Scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(name.encode(), value.encode()) for name, value in (headers or {}).items()],
+        "client": ("127.0.0.1", 1234),
+        "server": ("127.0.0.1", 80),
+    }
+    await app(scope, receive, send)
+    start = next(message for message in messages if message["type"] == "http.response.start")
+    response_headers = {name.decode(): value.decode() for name, value in start["headers"]}
+    body = b"".join(message.get("body", b"") for message in messages if message["type"] == "http.response.body")
+    return start["status"], body, response_headers
+
+
+def test_latency_histogram() -> None:
+    histogram = apis.LatencyHistogram(buckets=[1.0, 2.0])
+    for value in [0.5, 0.5, 1.5, 3.0]:
+        histogram.observe(value)
+
+    assert histogram.cumulative_counts() == [(1.0, 2), (2.0, 3), (float("inf"), 4)]
+    assert histogram.quantile(0.5) == 1.0
+    assert histogram.quantile(0.25) == 0.5
+    assert histogram.quantile(0.99) == 2.0
+
+
+@pytest.mark.asyncio
+async def test_route_metrics() -> None:
+    apis.route_metrics.reset()
+    app = FastAPI()
+    app.router.route_class = apis.GenericErrorHandlingRoute
+
+    @app.get("/items/{item}")
+    def get_item(item: int) -> Any:
+        if item < 0:
+            raise HTTPException(status_code=404, detail="Negative items do not exist")
+        return {"item": item}
+
+    # Errors count the same whether they are raised or returned, and only server errors are failures of the route
+    @app.get("/results/{code}")
+    def get_result(code: int, raised: bool = False) -> Any:
+        if raised:
+            raise HTTPException(status_code=code)
+        return Response(status_code=code)
+
+    apis.add_metrics_endpoint(app)
+
+    assert (await get(app, "/items/1"))[0] == 200
+    assert (await get(app, "/items/2"))[0] == 200
+    assert (await get(app, "/items/-1"))[0] == 404
+    for code in [404, 503]:
+        assert (await get(app, f"/results/{code}"))[0] == code
+        assert (await get(app, f"/results/{code}", query="raised=true"))[0] == code
+
+    status, body, _ = await get(app, "/metrics")
+    metrics = body.decode()
+    assert status == 200
+    assert 'blueos_http_requests_total{method="GET",route="/items/{item}"} 3' in metrics
+    assert 'blueos_http_request_errors_total{method="GET",route="/items/{item}"} 0' in metrics
+    assert 'blueos_http_requests_total{method="GET",route="/results/{code}"} 4' in metrics
+    assert 'blueos_http_request_errors_total{method="GET",route="/results/{code}"} 2' in metrics
+    assert 'blueos_http_request_duration_seconds_bucket{method="GET",route="/items/{item}",le="+Inf"} 3' in metrics
+    assert (
+        'blueos_http_request_duration_quantile_seconds{method="GET",route="/items/{item}",quantile="0.99"}' in metrics
+    )
+    # The metrics endpoint itself is not measured
+    assert 'route="/metrics"' not in metrics
+
+
+@pytest.mark.asyncio
+async def test_compact_json_response() -> None:
+    app = FastAPI(default_response_class=apis.CompactJSONResponse)
+    app.router.route_class = apis.GenericErrorHandlingRoute
+    content = [{"name": f"network-{index}", "signal": -index} for index in range(100)]
+
+    @app.get("/networks")
+    def get_networks() -> Any:
+        return content
+
+    _, compact, headers = await get(app, "/networks")
+    assert b" " not in compact
+    assert json.loads(compact) == content
+    assert "content-encoding" not in headers
+
+    _, pretty, _ = await get(app, "/networks", query="pretty=1")
+    assert pretty.decode() == apis.pretty_json(content)
+
+    _, compressed, headers = await get(app, "/networks", headers={"accept-encoding": "gzip, deflate"})
+    assert headers["content-encoding"] == "gzip"
+    assert int(headers["content-length"]) == len(compressed)
+    assert gzip.decompress(compressed) == compact
@@ -1,5 +1,11 @@
+import asyncio
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import List
+
+import pytest
 
 from .. import decorators
 
@@ -24,3 +30,77 @@ def test_nested_settings_save_load() -> None:
 
     # Check if all cache values are invalid after waiting for a long time
     assert all(original_output[key] != cached_function(key) for key in inputs)
+
+
+def test_cache_eviction() -> None:
+    calls: List[int] = []
+
+    @decorators.cached(max_size=2)
+    def square(value: int) -> int:
+        calls.append(value)
+        return value * value
+
+    assert [square(1), square(2), square(1), square(3), square(2)] == [1, 4, 1, 9, 4]
+    # 2 was the least recently used when 3 was added
+    assert calls == [1, 2, 3, 2]
+
+    stats = square.cache.info()  # type: ignore
+    assert (stats.entries, stats.hits, stats.misses, stats.evictions) == (2, 1, 4, 2)
+
+
+def test_cache_single_flight() -> None:
+    calls: List[int] = []
+    started = threading.Event()
+
+    @decorators.cached()
+    def slow(value: int) -> int:
+        calls.append(value)
+        started.set()
+        time.sleep(0.1)
+        return value
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(slow, 1)
+        started.wait()
+        others = [executor.submit(slow, 1) for _ in range(3)]
+        assert [future.result() for future in [first, *others]] == [1] * 4
+
+    assert calls == [1]
+    assert slow.cache.info().shared == 3  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_async_cache() -> None:
+    calls: List[int] = []
+
+    @decorators.cached(ttl=0.1, stale_ttl=1.0)
+    async def probe(value: int) -> int:
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        if len(calls) > 2:
+            raise RuntimeError("Probe failed")
+        return len(calls)
+
+    # Frameworks like FastAPI check this to await the function instead of running it in a thread
+    assert asyncio.iscoroutinefunction(probe)
+
+    # Concurrent calls share the same computation
+    assert await asyncio.gather(*[probe(1) for _ in range(5)]) == [1] * 5
+    assert len(calls) == 1
+
+    # Expired values are returned while refreshed in background
+    await asyncio.sleep(0.1)
+    assert await probe(1) == 1
+    await asyncio.sleep(0.1)
+    assert await probe(1) == 2
+    assert len(calls) == 2
+
+    # Failures are not cached
+    probe.cache.clear()  # type: ignore
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await probe(1)
+    assert len(calls) == 4
+
+    stats = probe.cache.info()  # type: ignore
+    assert (stats.misses, stats.shared, stats.stale_hits) == (3, 4, 1)
@@ -0,0 +1,215 @@
+import asyncio
+import pathlib
+import socket
+import sys
+import time
+from ipaddress import IPv4Address
+from typing import List
+
+import pytest
+
+from ..DHCPServerManager import (
+    DHCPInterfaceConfig,
+    Dnsmasq,
+    DnsmasqProcess,
+    MultiInterfaceDnsmasq,
+    read_leases,
+)
+
+# Stands for dnsmasq: syntax checks and reloads are logged to a file, and the server binds the DHCP socket after a delay
+FAKE_DNSMASQ = f"""#!{sys.executable}
+import os, signal, socket, sys, time
+
+def log_reload(*_):
+    with open(os.environ["FAKE_DNSMASQ_CHECKS"], "a", encoding="utf-8") as checks:
+        checks.write("reload\\n")
+
+signal.signal(signal.SIGHUP, log_reload)
+
+if "--test" in sys.argv:
+    with open(os.environ["FAKE_DNSMASQ_CHECKS"], "a", encoding="utf-8") as checks:
+        checks.write(" ".join(sys.argv[1:]) + "\\n")
+    sys.exit(int(os.environ.get("FAKE_DNSMASQ_CHECK_EXIT", "0")))
+if os.environ.get("FAKE_DNSMASQ_CRASH"):
+    sys.exit(3)
+time.sleep(float(os.environ.get("FAKE_DNSMASQ_DELAY", "0")))
+server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+server.bind(("127.0.0.1", int(os.environ["FAKE_DNSMASQ_PORT"])))
+while True:
+    time.sleep(60)
+"""
+
+
+def free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        port: int = probe.getsockname()[1]
+        return port
+
+
+@pytest.fixture(name="checks_file")
+def fixture_checks_file(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    binary = tmp_path.joinpath("dnsmasq")
+    binary.write_text(FAKE_DNSMASQ, encoding="utf-8")
+    binary.chmod(0o755)
+    checks_file = tmp_path.joinpath("checks")
+    checks_file.touch()
+
+    port = free_udp_port()
+    monkeypatch.setenv("PATH", f"{tmp_path}:/usr/bin:/bin")
+    monkeypatch.setenv("FAKE_DNSMASQ_CHECKS", str(checks_file))
+    monkeypatch.setenv("FAKE_DNSMASQ_PORT", str(port))
+    monkeypatch.setattr(DnsmasqProcess, "DHCP_PORT", port)
+    return checks_file
+
+
+def checks(checks_file: pathlib.Path) -> List[str]:
+    return checks_file.read_text(encoding="utf-8").splitlines()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("checks_file")
+async def test_start_waits_for_dhcp_socket(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("FAKE_DNSMASQ_DELAY", "0.3")
+    server = Dnsmasq("lo", IPv4Address("192.168.2.1"))
+    assert not server.is_running()
+
+    await server.start()
+    assert server.is_running()
+    assert server.is_dhcp_socket_bound()
+
+    await server.stop()
+    assert not server.is_running()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_starts_validate_binary_once(checks_file: pathlib.Path) -> None:
+    servers = [Dnsmasq("lo", IPv4Address(f"192.168.{subnet}.1")) for subnet in range(2, 6)]
+
+    start = time.monotonic()
+    await asyncio.gather(*[server.start() for server in servers])
+    assert time.monotonic() - start < 2
+    assert all(server.is_running() for server in servers)
+
+    # One binary check, shared by all servers, and one configuration check for each server
+    assert checks(checks_file).count("--test") == 1
+    assert len(checks(checks_file)) == 1 + len(servers)
+
+    # Restarting with the same configuration does not check it again
+    await servers[0].restart()
+    assert len(checks(checks_file)) == 1 + len(servers)
+
+    await asyncio.gather(*[server.stop() for server in servers])
+
+
+@pytest.mark.asyncio
+async def test_failed_start(checks_file: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("FAKE_DNSMASQ_CRASH", "1")
+    server = Dnsmasq("lo", IPv4Address("192.168.7.1"))
+    with pytest.raises(RuntimeError):
+        await server.start()
+    assert not server.is_running()
+
+    monkeypatch.delenv("FAKE_DNSMASQ_CRASH")
+    monkeypatch.setenv("FAKE_DNSMASQ_CHECK_EXIT", "1")
+    server = Dnsmasq("lo", IPv4Address("192.168.8.1"))
+    with pytest.raises(RuntimeError):
+        await server.start()
+    assert not server.is_running()
+    # Failed checks are not cached
+    assert len(checks(checks_file)) == 3
+
+
+def test_invalid_configuration() -> None:
+    with pytest.raises(ValueError):
+        Dnsmasq("not-an-interface", IPv4Address("192.168.2.1"))
+
+
+LEASES = """1700000000 00:11:22:33:44:55 192.168.2.10 topside-computer 01:00:11:22:33:44:55
+0 00:11:22:33:44:66 192.168.3.20 * *
+duid 00:01:00:01:2c:4b:1a:2b:00:11:22:33:44:55
+1700000000 1234 fd00::10 * 00:01:00:01
+"""
+
+
+def test_read_leases(tmp_path: pathlib.Path) -> None:
+    leases_path = tmp_path.joinpath("dnsmasq.leases")
+    assert not read_leases(leases_path)
+
+    leases_path.write_text(LEASES, encoding="utf-8")
+    leases = read_leases(leases_path)
+    assert [lease.ip for lease in leases] == ["192.168.2.10", "192.168.3.20"]
+    assert leases[0].hostname == "topside-computer"
+    assert leases[0].expiry == 1700000000
+    assert leases[1].hostname is None and leases[1].client_id is None
+
+
+@pytest.mark.asyncio
+async def test_multi_interface_server(
+    tmp_path: pathlib.Path, checks_file: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    interfaces = {name: None for name in ["lo", "eth1", "usb0"]}
+    monkeypatch.setattr("psutil.net_if_stats", lambda: interfaces)
+    server = MultiInterfaceDnsmasq(tmp_path.joinpath("config"))
+
+    await asyncio.gather(
+        server.set_interface(DHCPInterfaceConfig("eth1", IPv4Address("192.168.2.1"))),
+        server.set_interface(DHCPInterfaceConfig("usb0", IPv4Address("192.168.3.1"))),
+    )
+    assert server.is_running()
+    pid = server.pid
+    config = server.config_path.read_text(encoding="utf-8")
+    assert "interface=eth1" in config and "interface=usb0" in config
+    assert "dhcp-range=set:usb0,192.168.3.1,192.168.3.254,255.255.255.0,24h" in config
+    assert "tag:eth1,option:router,192.168.2.1" in server.dhcp_options_path.read_text(encoding="utf-8")
+
+    # Changing only the gateway reloads the options on the running process
+    await server.set_interface(DHCPInterfaceConfig("eth1", IPv4Address("192.168.2.2")))
+    await asyncio.sleep(0.2)
+    assert "reload" in checks(checks_file)
+    assert server.pid == pid
+    assert "tag:eth1,option:router,192.168.2.2" in server.dhcp_options_path.read_text(encoding="utf-8")
+
+    server.leases_path.write_text(LEASES, encoding="utf-8")
+    assert [lease.ip for lease in server.leases()] == ["192.168.2.10", "192.168.3.20"]
+    assert [lease.ip for lease in server.leases("usb0")] == ["192.168.3.20"]
+    assert not server.leases("lo")
+
+    # Removing an interface restarts the process, and removing the last one stops it
+    await server.remove_interface("eth1")
+    assert server.is_running()
+    assert server.pid != pid
+    assert "interface=eth1" not in server.config_path.read_text(encoding="utf-8")
+    await server.remove_interface("usb0")
+    assert not server.is_running()
+
+
+@pytest.mark.asyncio
+async def test_gateway_change_reloads_shared_server(
+    tmp_path: pathlib.Path, checks_file: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    interfaces = {name: None for name in ["eth0", "usb0"]}
+    monkeypatch.setattr("psutil.net_if_stats", lambda: interfaces)
+    server = MultiInterfaceDnsmasq(tmp_path.joinpath("config"))
+    await server.set_interface(DHCPInterfaceConfig("eth0", IPv4Address("192.168.2.2")))
+    await server.set_interface(DHCPInterfaceConfig("usb0", IPv4Address("192.168.3.1")))
+    pid = server.pid
+
+    # Replacing the configuration of an interface, as cable_guy does, only signals the running process
+    await server.set_interface(DHCPInterfaceConfig("eth0", IPv4Address("192.168.2.1")))
+    await server.set_interface(DHCPInterfaceConfig("eth0", IPv4Address("192.168.2.1")))
+    await asyncio.sleep(0.2)
+    assert checks(checks_file).count("reload") == 1
+    assert server.pid == pid
+    assert list(server.interfaces) == ["eth0", "usb0"]
+
+    # A different lease range needs a restart
+    await server.set_interface(
+        DHCPInterfaceConfig(
+            "eth0", IPv4Address("192.168.2.1"), None, (IPv4Address("192.168.2.100"), IPv4Address("192.168.2.200"))
+        )
+    )
+    assert server.is_running()
+    assert server.pid != pid
+    await server.stop()
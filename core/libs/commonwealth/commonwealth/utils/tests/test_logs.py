@@ -0,0 +1,94 @@
+import os
+import pathlib
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from loguru import logger
+
+from .. import logs
+
+
+def test_retention_budget() -> None:
+    folder = pathlib.Path(tempfile.mkdtemp())
+    for index in range(5):
+        log_file = folder.joinpath(f"logfile_{index}.log")
+        log_file.write_bytes(b"x" * 100)
+        os.utime(log_file, (index, index))
+
+    logs.enforce_retention_budget(folder.glob("logfile_*"), max_bytes=250)
+    assert sorted(path.name for path in folder.iterdir()) == ["logfile_3.log", "logfile_4.log"]
+
+
+def test_service_logs(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(logs, "LOG_FOLDER", pathlib.Path(tempfile.mkdtemp()))
+    with pytest.raises(ValueError):
+        logs.init_service_logs("bad/name")
+
+    sink = logs.init_service_logs("service", rotation=logs.LogRotation(max_bytes=1000), retention_bytes=3000)
+    try:
+        for index in range(200):
+            logger.info(f"Message number {index} from the service, repeated to fill the log files quickly.")
+    finally:
+        logger.remove(sink)
+
+    files = list(logs.LOG_FOLDER.joinpath("service").iterdir())
+    assert any(path.suffix == ".gz" for path in files)
+    # Budget may be exceeded by the file being written when the last rotation happened
+    assert sum(path.stat().st_size for path in files) <= 3000 + 1000
+
+
+def test_log_rotation_by_age() -> None:
+    rotation = logs.LogRotation(max_bytes=10**6, max_age=timedelta(seconds=1))
+
+    class Message(str):
+        def __init__(self, seconds: int) -> None:
+            super().__init__()
+            self.record = {"time": datetime(2022, 1, 1) + timedelta(seconds=seconds)}
+
+    with tempfile.TemporaryFile("w") as file:
+        assert [rotation(Message(seconds), file) for seconds in [0, 0, 1, 1, 2]] == [False, False, True, False, True]
+
+
+def fail(value: int) -> None:
+    try:
+        raise ValueError(f"Invalid value {value}")
+    except ValueError as error:
+        raise RuntimeError("Failed to use value") from error
+
+
+def report_failure(aggregator: logs.ErrorAggregator, value: int) -> bool:
+    try:
+        fail(value)
+    except RuntimeError as error:
+        assert logs.stack_trace_message(error) == f"Failed to use value Invalid value {value}"
+        return aggregator.report(error, "Watchdog:")
+    return False
+
+
+def test_error_aggregation() -> None:
+    aggregator = logs.ErrorAggregator(report_interval=0.2)
+    reported = [report_failure(aggregator, value) for value in range(10)]
+    try:
+        raise RuntimeError("Other failure")
+    except RuntimeError as error:
+        reported.append(aggregator.report(error))
+
+    # Same failure with different values is only logged once, while other failures are logged
+    assert reported == [True] + [False] * 9 + [True]
+    stats = aggregator.stats()
+    assert [(stats.count, stats.suppressed) for stats in stats] == [(10, 9), (1, 0)]
+    assert stats[0].message == "Failed to use value"
+
+    time.sleep(0.2)
+    assert report_failure(aggregator, 0)
+    assert not aggregator.stats()[0].suppressed
+
+
+def test_stack_trace_message_cycle() -> None:
+    error = RuntimeError("first")
+    cause = ValueError("second")
+    error.__cause__ = cause
+    cause.__cause__ = error
+    assert logs.stack_trace_message(error) == "first second"
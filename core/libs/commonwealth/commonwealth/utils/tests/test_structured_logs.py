@@ -0,0 +1,82 @@
+import gzip
+import json
+import pathlib
+import tempfile
+from typing import List
+
+import pytest
+from loguru import logger
+
+from .. import logs, structured_logs
+
+
+def write_entries(log_file: pathlib.Path, service: str, times: List[float], level: str = "INFO") -> None:
+    with open(log_file, "a", encoding="utf-8") as content:
+        for entry_time in times:
+            entry = {
+                "time": entry_time,
+                "level": level,
+                "levelno": structured_logs.LEVELS[level],
+                "service": service,
+                "message": f"{service} at {entry_time}",
+            }
+            content.write(json.dumps(entry) + "\n")
+
+
+def test_query_logs(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(structured_logs, "BLOCK_BYTES", 500)
+    log_folder = pathlib.Path(tempfile.mkdtemp())
+    for service in ["first", "second"]:
+        log_folder.joinpath(service).mkdir()
+
+    first_log = log_folder.joinpath("first", "logfile_1.jsonl")
+    write_entries(first_log, "first", [float(entry_time) for entry_time in range(0, 100, 2)])
+    second_log = log_folder.joinpath("second", "logfile_1.jsonl")
+    write_entries(second_log, "second", [float(entry_time) for entry_time in range(1, 100, 2)])
+    write_entries(second_log, "second", [100.0], level="ERROR")
+    # Rotated files are compressed
+    with gzip.open(log_folder.joinpath("second", "logfile_0.jsonl.gz"), "wb") as compressed:
+        compressed.write(json.dumps({"time": -1.0, "levelno": 20, "message": "old"}).encode() + b"\n")
+
+    assert structured_logs.list_log_services(log_folder) == ["first", "second"]
+
+    time_range = structured_logs.LogFilter(since=10, until=20)
+    entries = list(structured_logs.query_logs(log_filter=time_range, log_folder=log_folder))
+    assert [entry["time"] for entry in entries] == [float(entry_time) for entry_time in range(10, 21)]
+
+    index = structured_logs.index_log_file(first_log)
+    assert len(index.blocks) > 3
+    assert len([block for block in index.blocks if time_range.matches_block(block)]) < len(index.blocks)
+
+    only_errors = structured_logs.LogFilter(min_level=structured_logs.LEVELS["ERROR"])
+    errors = list(structured_logs.query_logs(log_filter=only_errors, log_folder=log_folder))
+    assert [entry["message"] for entry in errors] == ["second at 100.0"]
+
+    old_filter = structured_logs.LogFilter(until=0)
+    old = list(structured_logs.query_logs(["second", "../first"], old_filter, log_folder))
+    assert [entry["message"] for entry in old] == ["old"]
+
+    # New entries are indexed incrementally
+    write_entries(first_log, "first", [200.0, 201.0])
+    entries = list(structured_logs.query_logs(["first"], structured_logs.LogFilter(since=150), log_folder))
+    assert [entry["time"] for entry in entries] == [200.0, 201.0]
+    assert structured_logs.index_log_file(first_log).indexed_bytes == first_log.stat().st_size
+
+
+def test_service_logs_are_structured(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(logs, "LOG_FOLDER", pathlib.Path(tempfile.mkdtemp()))
+    sink = logs.init_service_logs("service")
+    try:
+        logger.info("Structured message")
+        try:
+            raise RuntimeError("Failure")
+        except RuntimeError:
+            logger.exception("Something failed")
+    finally:
+        logger.remove(sink)
+
+    entries = list(structured_logs.query_logs(services=["service"]))
+    assert [entry["message"] for entry in entries] == ["Structured message", "Something failed"]
+    assert entries[0]["service"] == "service"
+    assert entries[1]["level"] == "ERROR"
+    assert "RuntimeError: Failure" in entries[1]["exception"]
@@ -26,6 +26,10 @@ setuptools.setup(
         "starlette == 0.13.6",
         "pykson == 1.0.1",
     ],
+    extras_require={
+        # Faster settings serialization, the standard library is used when not available
+        "fast-settings": ["orjson == 3.6.7"],
+    },
     dependency_links=[
         # Waiting for PRs to get merged in pykson
         "https://github.com/patrickelectric/pykson/tarball/1.0.1#egg=pykson-1.0.1"
@@ -5,6 +5,7 @@ from copy import deepcopy
 from typing import Any, List, Optional, Set
 
 import psutil
+from bridges.serialtuning import tune_port
 from commonwealth.mavlink_comm.VehicleManager import VehicleManager
 from commonwealth.utils.Singleton import Singleton
 from loguru import logger
@@ -151,6 +152,8 @@ class ArduPilotManager(metaclass=Singleton):
         if not board.path:
             raise ValueError(f"Could not find device path for board {board.name}.")
         self._current_board = board
+        tuning = tune_port(board.path)
+        logger.info(f"Serial port of {board.name} tuned: {tuning}.")
         self.start_mavlink_manager(
             Endpoint("Master", self.settings.app_name, EndpointType.Serial, board.path, 115200, protected=True)
         )
@@ -7,15 +7,21 @@ import shutil
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Set
 
-from commonwealth.mavlink_comm.typedefs import FirmwareInfo, MavlinkVehicleType
+from commonwealth.mavlink_comm.typedefs import (
+    FirmwareInfo,
+    MavlinkVehicleType,
+    VehicleSnapshot,
+)
 from commonwealth.utils.apis import (
+    CompactJSONResponse,
     GenericErrorHandlingRoute,
-    PrettyJSONResponse,
     StackedHTTPException,
+    add_error_stats_endpoint,
+    add_metrics_endpoint,
 )
 from commonwealth.utils.general import is_running_as_root
-from commonwealth.utils.logs import InterceptHandler, get_new_log_path
-from fastapi import Body, FastAPI, File, UploadFile, status
+from commonwealth.utils.logs import InterceptHandler, init_service_logs
+from fastapi import Body, FastAPI, File, Query, UploadFile, status
 from fastapi.staticfiles import StaticFiles
 from fastapi_versioning import VersionedFastAPI, version
 from loguru import logger
@@ -36,13 +42,13 @@ parser.add_argument("-s", "--sitl", help="run SITL instead of connecting any boa
 args = parser.parse_args()
 
 logging.basicConfig(handlers=[InterceptHandler()], level=0)
-logger.add(get_new_log_path(SERVICE_NAME))
+init_service_logs(SERVICE_NAME)
 
 
 app = FastAPI(
     title="ArduPilot Manager API",
     description="ArduPilot Manager is responsible for managing ArduPilot devices connected to BlueOS.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=CompactJSONResponse,
     debug=True,
 )
 app.router.route_class = GenericErrorHandlingRoute
@@ -112,6 +118,18 @@ async def get_vehicle_type() -> Any:
     return await autopilot.vehicle_manager.get_vehicle_type()
 
 
+@app.get(
+    "/vehicle_snapshot",
+    response_model=VehicleSnapshot,
+    summary="Get latest state of many Mavlink messages of the vehicle at once.",
+)
+@version(1, 0)
+async def get_vehicle_snapshot(messages: Optional[List[str]] = Query(None), max_age: Optional[float] = None) -> Any:
+    if not autopilot.current_board:
+        raise RuntimeError("Cannot fetch vehicle state as there's no board running.")
+    return await autopilot.vehicle_manager.snapshot(messages, max_age)
+
+
 @app.get(
     "/available_firmwares",
     response_model=List[Firmware],
@@ -203,6 +221,8 @@ def available_boards() -> Any:
 
 
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+add_metrics_endpoint(app)
+add_error_stats_endpoint(app)
 app.mount("/", StaticFiles(directory=str(FRONTEND_FOLDER), html=True))
 
 
@@ -2,6 +2,7 @@ import asyncio
 import pathlib
 from typing import List, Optional, Set, Type
 
+from commonwealth.utils.logs import report_error
 from loguru import logger
 
 # Plugins
@@ -152,6 +153,6 @@ class Manager:
                 self.restart()
                 logger.debug("Mavlink router successfully restarted.")
             except Exception as error:
-                logger.error(f"Failed to restart Mavlink router. {error}")
+                report_error(error, "Failed to restart Mavlink router.")
 
             self.should_be_running = True
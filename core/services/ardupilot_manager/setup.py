@@ -82,6 +82,7 @@ setuptools.setup(
         "validators == 0.18.2",
         "fastapi-versioning == 0.9.1",
         "aiofiles == 0.6.0",
+        "bridges == 0.1.0",
         "loguru == 0.5.3",
         "commonwealth == 0.1.0",
         "pyelftools == 0.27",
@@ -10,7 +10,7 @@ from typing import Any, Dict, List, Optional
 import psutil
 from commonwealth.settings.manager import Manager
 from commonwealth.utils.apis import PrettyJSONResponse
-from commonwealth.utils.logs import get_new_log_path
+from commonwealth.utils.logs import init_service_logs
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
 from fastapi_versioning import VersionedFastAPI, version
@@ -23,6 +23,8 @@ from settings import ServiceTypes, SettingsV3
 from typedefs import InterfaceType, IpInfo, MdnsEntry
 
 SERVICE_NAME = "beacon"
+# Seconds to wait for other settings changes before writing them to disk
+SETTINGS_SAVE_DEBOUNCE = 1.0
 
 
 class AsyncRunner:
@@ -77,7 +79,7 @@ class AsyncRunner:
 class Beacon:
     def __init__(self) -> None:
         self.runners: Dict[str, AsyncRunner] = {}
-        self.manager = Manager(SERVICE_NAME, SettingsV3)
+        self.manager = Manager(SERVICE_NAME, SettingsV3, save_debounce=SETTINGS_SAVE_DEBOUNCE)
         # manager still returns "valid" settings even if file is absent, so we check for the "default" field
         # TODO: fix after https://github.com/bluerobotics/BlueOS-docker/issues/880 is solved
         if self.manager.settings.default is None:
@@ -192,9 +194,13 @@ class Beacon:
         """
         This is the "main loop" from Beacon.
         """
+        running_loop = asyncio.get_running_loop()
+        settings_changed = asyncio.Event()
+        # Manager reloads the settings file only when it's changed, waking us up to apply the changes right away
+        self.manager.subscribe(lambda: running_loop.call_soon_threadsafe(settings_changed.set))
+
         while True:
-            # re-load settings in case something changed
-            self.manager.load()
+            self.settings = self.manager.settings
             self.service_types = self.load_service_types()
 
             default_runners = self.create_default_runners()
@@ -219,7 +225,12 @@ class Beacon:
                     await runner.register_services()
 
             self.manager.save()
-            await asyncio.sleep(10)
+            try:
+                # Network interfaces are still polled periodically
+                await asyncio.wait_for(settings_changed.wait(), 10)
+            except asyncio.TimeoutError:
+                pass
+            settings_changed.clear()
 
     async def stop(self) -> None:
         await asyncio.gather(*[runner.unregister_services() for runner in self.runners.values()])
@@ -269,7 +280,7 @@ async def root() -> Any:
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
-    logger.add(get_new_log_path(SERVICE_NAME))
+    init_service_logs(SERVICE_NAME)
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--debug", action="store_true")
@@ -1,14 +1,26 @@
+import asyncio
+import dataclasses
 import logging
-from typing import Dict, List
+import pathlib
+import time
+from enum import Enum
+from typing import Dict, List, Optional, Tuple, Union
 
 from bridges.bridges import Bridge
+from bridges.engine import BridgeEngine, LinkStatistics, SerialUDPLink
 from bridges.serialhelper import Baudrate
+from bridges.serialtuning import AdapterType, SerialTuningReport, port_users, tune_port
 from commonwealth.settings.manager import Manager
 from pydantic import BaseModel, conint
 from serial.tools.list_ports_linux import SysFS, comports
 
 from settings import BridgeSettingsSpecV1, SettingsV1
 
+# Restoring or editing many bridges results in a single settings write
+SETTINGS_SAVE_DEBOUNCE = 1.0
+# Time in seconds between samples of the link statistics, used to calculate the traffic rates
+STATISTICS_SAMPLE_INTERVAL = 1.0
+
 
 class BridgeSpec(BaseModel):
     """Basic interface for 'bridges' links."""
@@ -34,22 +46,153 @@ class BridgeSpec(BaseModel):
         )
 
 
-class Bridget:
+class BridgeState(str, Enum):
+    STARTING = "starting"
+    RUNNING = "running"
+    FAILED = "failed"
+
+
+class BridgeStatistics(BaseModel):
+    """Traffic of a bridge since it started, rates being in bytes per second over the last sampling interval."""
+
+    serial_to_udp_bytes: int
+    serial_to_udp_packets: int
+    serial_to_udp_rate: float
+    udp_to_serial_bytes: int
+    udp_to_serial_packets: int
+    udp_to_serial_rate: float
+    # Fraction of the serial line capacity used by the busiest direction
+    serial_usage: float
+    dropped_bytes: int
+    serial_errors: int
+    udp_errors: int
+    last_serial_activity: Optional[float]
+    last_udp_activity: Optional[float]
+    udp_clients: List[str]
+
+
+class BridgeActivity(BaseModel):
+    """I/O of an external bridge process since it started, rates being in bytes per second over the last interval.
+
+    Reads and writes add both the serial port and the UDP socket, since /proc doesn't tell them apart.
+    """
+
+    read_bytes: int
+    read_rate: float
+    written_bytes: int
+    written_rate: float
+    last_activity: Optional[float]
+
+
+class SerialTuning(BaseModel):
+    """Low-latency settings of a serial port, loopback latency being in seconds."""
+
+    device: str
+    adapter: AdapterType
+    latency_timer: Optional[int]
+    low_latency: bool
+    transmit_fifo_size: Optional[int]
+    loopback_latency: Optional[float]
+
+    @staticmethod
+    def from_report(report: SerialTuningReport) -> "SerialTuning":
+        return SerialTuning(**dataclasses.asdict(report))
+
+
+class LoopbackTestSpec(BaseModel):
+    serial_path: str
+    baud: Baudrate
+    # Probes are written to the port, so the caller has to confirm that nothing but a loopback is connected to it
+    confirm: bool = False
+
+
+class BridgeStatus(BaseModel):
+    spec: BridgeSpec
+    state: BridgeState
+    error: Optional[str]
+    # Only available for bridges running on the in-process engine, enabled with '--engine in-process'
+    statistics: Optional[BridgeStatistics]
+    # Only available for bridges running as external processes, the default engine
+    activity: Optional[BridgeActivity]
+    tuning: Optional[SerialTuning]
+
+
+class Bridget:  # pylint: disable=too-many-instance-attributes
     """Manager for 'bridges' links."""
 
-    def __init__(self) -> None:
-        self._bridges: Dict[BridgeSpec, Bridge] = {}
-        self._settings_manager = Manager("bridget", SettingsV1)
+    def __init__(self, in_process_engine: bool = False, config_folder: Optional[pathlib.Path] = None) -> None:
+        """Bridges run as external 'bridges' processes, or as links of the in-process engine, with detailed statistics"""
+        # Every known bridge, including the ones still starting or that failed to start
+        self._states: Dict[BridgeSpec, BridgeState] = {}
+        self._errors: Dict[BridgeSpec, str] = {}
+        self._bridges: Dict[BridgeSpec, Union[Bridge, SerialUDPLink]] = {}
+        self._tunings: Dict[BridgeSpec, SerialTuning] = {}
+        self._engine: Optional[BridgeEngine] = BridgeEngine() if in_process_engine else None
+        # Statistics of each bridge at the last sample, with its time, and the rates since the sample before it
+        self._samples: Dict[BridgeSpec, Tuple[float, LinkStatistics]] = {}
+        self._rates: Dict[BridgeSpec, Tuple[float, float]] = {}
+        # Same for the I/O counters of external bridges, with the last time they changed
+        self._io_samples: Dict[BridgeSpec, Tuple[float, Tuple[int, int]]] = {}
+        self._last_activity: Dict[BridgeSpec, float] = {}
+        self._settings_manager = Manager(
+            "bridget", SettingsV1, config_folder=config_folder, save_debounce=SETTINGS_SAVE_DEBOUNCE
+        )
         self._settings_manager.load()
-        for bridge_settings_spec in self._settings_manager.settings.specs:
-            try:
-                logging.debug(f"Adding following bridge from persistency '{bridge_settings_spec}'.")
-                self.add_bridge(BridgeSpec.from_settings_spec(bridge_settings_spec))
-            except Exception as error:
-                logging.exception(f"Could not add bridge '{bridge_settings_spec}'. {error}")
+
+    async def load_bridges_from_settings(self) -> None:
+        """Start all persisted bridges concurrently, failed ones being kept with their error"""
+        specs = [
+            BridgeSpec.from_settings_spec(settings_spec) for settings_spec in self._settings_manager.settings.specs
+        ]
+        for spec in specs:
+            self._states[spec] = BridgeState.STARTING
+        results = await asyncio.gather(*[self._start_bridge(spec) for spec in specs], return_exceptions=True)
+        for spec, result in zip(specs, results):
+            if isinstance(result, Exception):
+                logging.error(f"Could not add bridge '{spec}'. {result}")
+
+    async def _start_bridge(self, bridge_spec: BridgeSpec) -> None:
+        self._states[bridge_spec] = BridgeState.STARTING
+        self._errors.pop(bridge_spec, None)
+        try:
+            report = await asyncio.get_running_loop().run_in_executor(None, tune_port, bridge_spec.serial_path)
+            self._tunings[bridge_spec] = SerialTuning.from_report(report)
+            self._bridges[bridge_spec] = await self._create_bridge(bridge_spec)
+        except Exception as error:
+            self._states[bridge_spec] = BridgeState.FAILED
+            self._errors[bridge_spec] = str(error)
+            raise
+        self._states[bridge_spec] = BridgeState.RUNNING
+
+    async def _create_bridge(self, bridge_spec: BridgeSpec) -> Union[Bridge, SerialUDPLink]:
+        if self._engine is not None:
+            return await self._engine.add_link(
+                bridge_spec.serial_path,
+                bridge_spec.baud,
+                bridge_spec.ip,
+                bridge_spec.udp_port,
+                automatic_disconnect=False,
+            )
+        # Bridge blocks while checking that the process started, so it runs in a thread to start many at once
+        return await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: Bridge(
+                SysFS(bridge_spec.serial_path),
+                bridge_spec.baud,
+                bridge_spec.ip,
+                bridge_spec.udp_port,
+                automatic_disconnect=False,
+            ),
+        )
+
+    async def _stop_bridge(self, bridge: Union[Bridge, SerialUDPLink]) -> None:
+        if isinstance(bridge, Bridge):
+            await asyncio.get_running_loop().run_in_executor(None, bridge.stop)
+        elif self._engine is not None:
+            await self._engine.remove_link(bridge)
 
     def is_port_available(self, port: str) -> bool:
-        if port in [bridge.serial_path for bridge in self._bridges]:
+        if port in [bridge.serial_path for bridge in self._states]:
             return False
         try:
             with open(port, mode="r", encoding="utf-8"):
@@ -68,37 +211,169 @@ class Bridget:
             logging.debug(f"Port {port.device} found and available.")
         return available_ports
 
+    async def measure_loopback_latency(self, spec: LoopbackTestSpec) -> SerialTuning:
+        """Tune a free port and measure its latency, with probes that need a loopback to come back"""
+        if not spec.confirm:
+            raise ValueError(f"Loopback test writes to {spec.serial_path}, confirm it only has a loopback connected.")
+        if not self.is_port_available(spec.serial_path):
+            raise RuntimeError(f"Serial port {spec.serial_path} is not available.")
+        users = port_users(spec.serial_path)
+        if users:
+            raise RuntimeError(f"Serial port {spec.serial_path} is in use by processes {users}.")
+        report = await asyncio.get_running_loop().run_in_executor(None, tune_port, spec.serial_path, spec.baud)
+        return SerialTuning.from_report(report)
+
     def get_bridges(self) -> List[BridgeSpec]:
-        return [spec for spec, bridge in self._bridges.items()]
+        """Bridges that started, the ones still starting or that failed to start are only listed with their status"""
+        # In the order they were added, rather than the order they finished starting in
+        return [spec for spec in self._states if spec in self._bridges]
 
-    def add_bridge(self, bridge_spec: BridgeSpec) -> None:
-        if bridge_spec in self._bridges:
-            raise RuntimeError("Bridge already exist.")
-        new_bridge = Bridge(
-            SysFS(bridge_spec.serial_path),
-            bridge_spec.baud,
-            bridge_spec.ip,
-            bridge_spec.udp_port,
-            automatic_disconnect=False,
+    def get_bridges_status(self) -> List[BridgeStatus]:
+        return [self._status(spec) for spec in self._states]
+
+    def _status(self, spec: BridgeSpec) -> BridgeStatus:
+        link = self._bridges.get(spec)
+        if not isinstance(link, SerialUDPLink):
+            state, error = self._states[spec], self._errors.get(spec)
+            activity = None
+            if isinstance(link, Bridge):
+                if link.process.poll() is not None:
+                    state, error = BridgeState.FAILED, f"Bridges process exited with code {link.process.returncode}."
+                activity = self._activity(spec)
+            return BridgeStatus(
+                spec=spec, state=state, error=error, statistics=None, activity=activity, tuning=self._tunings.get(spec)
+            )
+        if link.closed.done():
+            # The link closes by itself on serial errors, like the device being unplugged
+            state, error = BridgeState.FAILED, link.error or "Bridge link closed."
+        else:
+            state, error = self._states[spec], None
+        statistics = link.statistics
+        serial_to_udp_rate, udp_to_serial_rate = self._rates.get(spec, (0.0, 0.0))
+        return BridgeStatus(
+            spec=spec,
+            state=state,
+            error=error,
+            statistics=BridgeStatistics(
+                serial_to_udp_bytes=statistics.serial_to_udp_bytes,
+                serial_to_udp_packets=statistics.serial_to_udp_packets,
+                serial_to_udp_rate=serial_to_udp_rate,
+                udp_to_serial_bytes=statistics.udp_to_serial_bytes,
+                udp_to_serial_packets=statistics.udp_to_serial_packets,
+                udp_to_serial_rate=udp_to_serial_rate,
+                # 10 bits on the line for each byte, with 8N1
+                serial_usage=max(serial_to_udp_rate, udp_to_serial_rate) / (int(spec.baud) / 10),
+                dropped_bytes=statistics.dropped_bytes,
+                serial_errors=statistics.serial_errors,
+                udp_errors=statistics.udp_errors,
+                last_serial_activity=statistics.last_serial_activity or None,
+                last_udp_activity=statistics.last_udp_activity or None,
+                udp_clients=[f"{ip}:{port}" for ip, port in link.clients],
+            ),
+            activity=None,
+            tuning=self._tunings.get(spec),
+        )
+
+    def _activity(self, spec: BridgeSpec) -> Optional[BridgeActivity]:
+        sample = self._io_samples.get(spec)
+        if sample is None:
+            return None
+        _sample_time, (read_bytes, written_bytes) = sample
+        read_rate, written_rate = self._rates.get(spec, (0.0, 0.0))
+        return BridgeActivity(
+            read_bytes=read_bytes,
+            read_rate=read_rate,
+            written_bytes=written_bytes,
+            written_rate=written_rate,
+            last_activity=self._last_activity.get(spec),
         )
-        self._bridges[bridge_spec] = new_bridge
+
+    def sample_statistics(self) -> None:
+        """Update the traffic rates of each bridge, from the counters difference since the last sample"""
+        now = time.monotonic()
+        for spec, link in self._bridges.items():
+            if isinstance(link, Bridge):
+                self._sample_io_counters(spec, link, now)
+                continue
+            statistics = link.statistics.copy()
+            previous = self._samples.get(spec)
+            self._samples[spec] = (now, statistics)
+            if previous is None:
+                continue
+            previous_time, previous_statistics = previous
+            elapsed = now - previous_time
+            self._rates[spec] = (
+                (statistics.serial_to_udp_bytes - previous_statistics.serial_to_udp_bytes) / elapsed,
+                (statistics.udp_to_serial_bytes - previous_statistics.udp_to_serial_bytes) / elapsed,
+            )
+
+    def _sample_io_counters(self, spec: BridgeSpec, bridge: Bridge, now: float) -> None:
+        counters = bridge.io_counters()
+        if counters is None:
+            return
+        previous = self._io_samples.get(spec)
+        self._io_samples[spec] = (now, counters)
+        if previous is None:
+            return
+        previous_time, previous_counters = previous
+        if counters != previous_counters:
+            self._last_activity[spec] = time.time()
+        elapsed = now - previous_time
+        self._rates[spec] = (
+            (counters[0] - previous_counters[0]) / elapsed,
+            (counters[1] - previous_counters[1]) / elapsed,
+        )
+
+    async def run_statistics_sampler(self) -> None:
+        while True:
+            self.sample_statistics()
+            await asyncio.sleep(STATISTICS_SAMPLE_INTERVAL)
+
+    async def add_bridge(self, bridge_spec: BridgeSpec) -> None:
+        if bridge_spec in self._states:
+            raise RuntimeError("Bridge already exist.")
+        try:
+            await self._start_bridge(bridge_spec)
+        except Exception:
+            # Bridges added through the API are only kept when they start
+            self._states.pop(bridge_spec, None)
+            self._errors.pop(bridge_spec, None)
+            raise
         settings_spec = BridgeSettingsSpecV1.from_spec(bridge_spec)
         if settings_spec not in self._settings_manager.settings.specs:
             self._settings_manager.settings.specs.append(settings_spec)
             self._settings_manager.save()
 
-    def remove_bridge(self, bridge_spec: BridgeSpec) -> None:
+    async def remove_bridge(self, bridge_spec: BridgeSpec) -> None:
+        state = self._states.get(bridge_spec)
+        if state is None:
+            raise RuntimeError("Bridge doesn't exist.")
+        if state == BridgeState.STARTING:
+            raise RuntimeError("Bridge is still starting.")
+        del self._states[bridge_spec]
+        self._errors.pop(bridge_spec, None)
         bridge = self._bridges.pop(bridge_spec, None)
+        self._tunings.pop(bridge_spec, None)
+        self._samples.pop(bridge_spec, None)
+        self._rates.pop(bridge_spec, None)
+        self._io_samples.pop(bridge_spec, None)
+        self._last_activity.pop(bridge_spec, None)
         self._settings_manager.settings.specs.remove(BridgeSettingsSpecV1.from_spec(bridge_spec))
         self._settings_manager.save()
-        if bridge is None:
-            raise RuntimeError("Bridge doesn't exist.")
-        bridge.stop()
-
-    def stop(self) -> None:
-        logging.debug("Stopping Bridget and removing all bridges.")
-        for bridge_spec in self._bridges:
-            self.remove_bridge(bridge_spec)
+        if bridge is not None:
+            await self._stop_bridge(bridge)
 
-    def __del__(self) -> None:
-        self.stop()
+    async def stop(self) -> None:
+        logging.debug("Stopping Bridget and closing all bridges.")
+        # Bridges are kept in the settings, to be restored on the next start
+        self._settings_manager.flush()
+        bridges = list(self._bridges.values())
+        self._states.clear()
+        self._errors.clear()
+        self._bridges.clear()
+        self._tunings.clear()
+        self._samples.clear()
+        self._rates.clear()
+        self._io_samples.clear()
+        self._last_activity.clear()
+        await asyncio.gather(*[self._stop_bridge(bridge) for bridge in bridges])
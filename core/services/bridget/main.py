@@ -1,31 +1,48 @@
 #! /usr/bin/env python3
+import argparse
+import asyncio
 import logging
 from typing import Any, List
 
-import uvicorn
-from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
-from commonwealth.utils.logs import InterceptHandler, get_new_log_path
+from commonwealth.utils.apis import (
+    CompactJSONResponse,
+    GenericErrorHandlingRoute,
+    add_error_stats_endpoint,
+    add_metrics_endpoint,
+)
+from commonwealth.utils.logs import InterceptHandler, init_service_logs
 from fastapi import FastAPI, status
 from fastapi.responses import HTMLResponse
 from fastapi_versioning import VersionedFastAPI, version
 from loguru import logger
+from uvicorn import Config, Server
 
-from bridget import BridgeSpec, Bridget
+from bridget import BridgeSpec, BridgeStatus, Bridget, LoopbackTestSpec, SerialTuning
 
 SERVICE_NAME = "bridget"
 
+parser = argparse.ArgumentParser(description="Bridget service for Blue Robotics BlueOS")
+parser.add_argument(
+    "--engine",
+    choices=["external", "in-process"],
+    default="external",
+    help="Run bridges as external 'bridges' processes, reporting their I/O activity, or in this process, reporting "
+    "traffic statistics for each direction, packets, drops and UDP clients.",
+)
+args = parser.parse_args()
+
 logging.basicConfig(handlers=[InterceptHandler()], level=0)
-logger.add(get_new_log_path(SERVICE_NAME))
+init_service_logs(SERVICE_NAME)
 
 app = FastAPI(
     title="Bridget API",
     description="Bridget is a Companion service responsible for managing 'bridges' links.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=CompactJSONResponse,
 )
 app.router.route_class = GenericErrorHandlingRoute
 logger.info("Starting Bridget!.")
 
-controller = Bridget()
+controller = Bridget(in_process_engine=args.engine == "in-process")
 
 
 @app.get("/serial_ports", response_model=List[str])
@@ -36,6 +53,13 @@ def get_serial_ports() -> Any:
     return ports
 
 
+@app.post("/serial_ports/loopback_test", response_model=SerialTuning)
+@version(1, 0)
+async def measure_loopback_latency(spec: LoopbackTestSpec) -> Any:
+    """Measure the latency of a serial port, with its TX wired to its RX, that no service uses. Needs confirmation."""
+    return await controller.measure_loopback_latency(spec)
+
+
 @app.get("/bridges", response_model=List[BridgeSpec])
 @version(1, 0)
 def get_bridges() -> Any:
@@ -44,23 +68,36 @@ def get_bridges() -> Any:
     return bridges
 
 
+@app.get("/bridges/status", response_model=List[BridgeStatus])
+@version(1, 0)
+def get_bridges_status() -> Any:
+    """State of all bridges, including the ones still starting or that failed to start, with their traffic.
+
+    External bridges, the default engine, report their I/O activity. Detailed traffic statistics are only reported
+    when Bridget runs with '--engine in-process'.
+    """
+    return controller.get_bridges_status()
+
+
 @app.post("/bridges", status_code=status.HTTP_201_CREATED)
 @version(1, 0)
-def add_bridge(bridge: BridgeSpec) -> Any:
+async def add_bridge(bridge: BridgeSpec) -> Any:
     logger.debug(f"Adding bridge '{bridge}'.")
-    controller.add_bridge(bridge)
+    await controller.add_bridge(bridge)
     logger.debug(f"Bridge '{bridge}' added.")
 
 
 @app.delete("/bridges", status_code=status.HTTP_200_OK)
 @version(1, 0)
-def remove_bridge(bridge: BridgeSpec) -> Any:
+async def remove_bridge(bridge: BridgeSpec) -> Any:
     logger.debug(f"Removing bridge '{bridge}'.")
-    controller.remove_bridge(bridge)
+    await controller.remove_bridge(bridge)
     logger.debug(f"Bridge '{bridge}' removed.")
 
 
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+add_metrics_endpoint(app)
+add_error_stats_endpoint(app)
 
 
 @app.get("/")
@@ -76,5 +113,15 @@ async def read_items() -> Any:
 
 
 if __name__ == "__main__":
+    loop = asyncio.new_event_loop()
+
     # Running uvicorn with log disabled so loguru can handle it
-    uvicorn.run(app, host="0.0.0.0", port=27353, log_config=None)
+    config = Config(app=app, loop=loop, host="0.0.0.0", port=27353, log_config=None)
+    server = Server(config)
+
+    # Bridges start in the background, their states being available through the API meanwhile
+    loop.create_task(controller.load_bridges_from_settings())
+    sampler = loop.create_task(controller.run_statistics_sampler())
+    loop.run_until_complete(server.serve())
+    sampler.cancel()
+    loop.run_until_complete(controller.stop())
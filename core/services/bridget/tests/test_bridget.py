@@ -0,0 +1,169 @@
+import asyncio
+import os
+import pathlib
+import pty
+import sys
+import tty
+from typing import Iterator, List, Tuple
+
+import pytest
+from bridges.serialhelper import Baudrate
+
+from bridget import BridgeSpec, BridgeState, Bridget, LoopbackTestSpec
+from settings import BridgeSettingsSpecV1
+
+# Stand-in for the bridges tool, only reading its serial port
+FAKE_BRIDGES = f"""#!{sys.executable}
+import os, socket, sys
+arguments = sys.argv[1:]
+port = os.open(arguments[arguments.index("-p") + 1].rsplit(":", 1)[0], os.O_RDONLY)
+udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+while os.read(port, 1024):
+    pass
+"""
+
+
+@pytest.fixture(name="fake_bridges")
+def fixture_fake_bridges(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    executable = tmp_path.joinpath("bin", "bridges")
+    executable.parent.mkdir()
+    executable.write_text(FAKE_BRIDGES, encoding="utf-8")
+    executable.chmod(0o755)
+    monkeypatch.setenv("PATH", str(executable.parent), prepend=os.pathsep)
+
+
+@pytest.fixture(name="serial_pairs")
+def fixture_serial_pairs() -> Iterator[List[Tuple[int, str]]]:
+    """Pseudo-terminals standing for serial devices, as master file descriptors and paths of the ports"""
+    pairs = [pty.openpty() for _ in range(3)]
+    for _master, slave in pairs:
+        tty.setraw(slave)
+    ports = [(master, os.ttyname(slave)) for master, slave in pairs]
+    yield ports
+    # Tests can close masters to unplug a device, so only the file descriptors still open are closed here
+    for fd in [master for master, _path in ports if master >= 0] + [slave for _master, slave in pairs]:
+        os.close(fd)
+
+
+def bridget_with_bridges(
+    config_folder: pathlib.Path, specs: List[BridgeSpec], in_process_engine: bool = True
+) -> Bridget:
+    controller = Bridget(in_process_engine=in_process_engine, config_folder=config_folder)
+    controller._settings_manager.settings.specs = [BridgeSettingsSpecV1.from_spec(spec) for spec in specs]
+    return controller
+
+
+def states(controller: Bridget) -> List[BridgeState]:
+    return [status.state for status in controller.get_bridges_status()]
+
+
+@pytest.mark.asyncio
+async def test_restore_states(tmp_path: pathlib.Path, serial_pairs: List[Tuple[int, str]]) -> None:
+    specs = [
+        BridgeSpec(serial_path=path, baud=Baudrate.b115200, ip="127.0.0.1", udp_port=17000 + index)
+        for index, (_master, path) in enumerate(serial_pairs)
+    ]
+    missing = BridgeSpec(serial_path="/dev/does-not-exist", baud=Baudrate.b115200, ip="127.0.0.1", udp_port=17100)
+    controller = bridget_with_bridges(tmp_path, [*specs, missing])
+    try:
+        restore = asyncio.create_task(controller.load_bridges_from_settings())
+        await asyncio.sleep(0)
+        assert states(controller) == [BridgeState.STARTING] * 4
+        assert not controller.get_bridges()
+
+        await asyncio.wait_for(restore, 5.0)
+        assert states(controller) == [BridgeState.RUNNING] * 3 + [BridgeState.FAILED]
+        assert controller.get_bridges_status()[-1].error
+        # Only bridges that started are listed as bridges
+        assert controller.get_bridges() == specs
+
+        # A running bridge fails when its device goes away
+        os.close(serial_pairs[0][0])
+        serial_pairs[0] = (-1, serial_pairs[0][1])
+        await asyncio.sleep(0.1)
+        status = controller.get_bridges_status()[0]
+        assert status.state == BridgeState.FAILED
+        assert status.error
+
+        # Failed bridges can be removed, and are forgotten
+        await controller.remove_bridge(missing)
+        assert len(controller.get_bridges_status()) == 3
+    finally:
+        await controller.stop()
+    assert not controller.get_bridges_status()
+
+
+@pytest.mark.asyncio
+async def test_added_bridge_is_only_kept_if_it_starts(
+    tmp_path: pathlib.Path, serial_pairs: List[Tuple[int, str]]
+) -> None:
+    controller = bridget_with_bridges(tmp_path, [])
+    try:
+        missing = BridgeSpec(serial_path="/dev/does-not-exist", baud=Baudrate.b115200, ip="127.0.0.1", udp_port=17100)
+        with pytest.raises(Exception):
+            await controller.add_bridge(missing)
+        assert not controller.get_bridges_status()
+
+        spec = BridgeSpec(serial_path=serial_pairs[0][1], baud=Baudrate.b115200, ip="127.0.0.1", udp_port=17101)
+        await controller.add_bridge(spec)
+        assert states(controller) == [BridgeState.RUNNING]
+        with pytest.raises(RuntimeError):
+            await controller.add_bridge(spec)
+
+        controller.sample_statistics()
+        status = controller.get_bridges_status()[0]
+        assert status.statistics is not None
+        assert not status.statistics.serial_to_udp_rate
+    finally:
+        await controller.stop()
+
+
+@pytest.mark.asyncio
+async def test_loopback_test_is_refused_on_ports_in_use(
+    tmp_path: pathlib.Path, serial_pairs: List[Tuple[int, str]]
+) -> None:
+    controller = bridget_with_bridges(tmp_path, [])
+    bridged = BridgeSpec(serial_path=serial_pairs[0][1], baud=Baudrate.b115200, ip="127.0.0.1", udp_port=17200)
+    try:
+        # Probes are only written once the caller confirms that the port has a loopback
+        with pytest.raises(ValueError):
+            await controller.measure_loopback_latency(
+                LoopbackTestSpec(serial_path=serial_pairs[1][1], baud=Baudrate.b115200)
+            )
+
+        # Neither to ports with bridges, nor to ports that another service has open, as the fixture here
+        await controller.add_bridge(bridged)
+        for path in [bridged.serial_path, serial_pairs[1][1]]:
+            with pytest.raises(RuntimeError):
+                await controller.measure_loopback_latency(
+                    LoopbackTestSpec(serial_path=path, baud=Baudrate.b115200, confirm=True)
+                )
+    finally:
+        await controller.stop()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("fake_bridges")
+async def test_external_bridge_activity(tmp_path: pathlib.Path, serial_pairs: List[Tuple[int, str]]) -> None:
+    master, path = serial_pairs[0]
+    spec = BridgeSpec(serial_path=path, baud=Baudrate.b115200, ip="127.0.0.1", udp_port=17300)
+    controller = bridget_with_bridges(tmp_path, [spec], in_process_engine=False)
+    try:
+        await controller.load_bridges_from_settings()
+        status = controller.get_bridges_status()[0]
+        assert status.state == BridgeState.RUNNING
+        # External bridges report their activity, but not the statistics of the in-process engine
+        assert status.statistics is None
+        assert status.activity is None
+
+        controller.sample_statistics()
+        os.write(master, bytes(1000))
+        await asyncio.sleep(0.1)
+        controller.sample_statistics()
+        activity = controller.get_bridges_status()[0].activity
+        assert activity is not None
+        assert activity.read_bytes >= 1000
+        assert activity.read_rate > 0
+        assert activity.last_activity is not None
+    finally:
+        await controller.stop()
@@ -1,11 +1,17 @@
+import asyncio
 import re
 import time
 from enum import Enum
+from ipaddress import IPv4Address
 from socket import AddressFamily
-from typing import Any, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import psutil
-from commonwealth.utils.DHCPServerManager import Dnsmasq as DHCPServerManager
+from commonwealth.utils.DHCPServerManager import (
+    DHCPInterfaceConfig,
+    DHCPLease,
+    MultiInterfaceDnsmasq,
+)
 from loguru import logger
 from pydantic import BaseModel
 from pyroute2 import IW, NDB, IPRoute
@@ -48,26 +54,32 @@ class EthernetManager:
 
     def __init__(self, default_config: EthernetInterface) -> None:
         self.settings = settings.Settings()
+        self._default_config = default_config
 
-        self._dhcp_servers: List[DHCPServerManager] = []
+        # Single DHCP server for all interfaces in server mode, created when first needed
+        self._dhcp_server: Optional[MultiInterfaceDnsmasq] = None
 
-        # Load settings and do the initial configuration
+    async def initialize(self) -> None:
+        """Load settings and do the initial configuration, configuring all interfaces concurrently"""
         if not self.settings.load():
-            logger.error(f"Failed to load previous settings. Using default configuration: {default_config}")
+            logger.error(f"Failed to load previous settings. Using default configuration: {self._default_config}")
             try:
-                self.set_configuration(default_config)
+                await self.set_configuration(self._default_config)
             except Exception as error:
                 logger.error(f"Failed loading default configuration. {error}")
             return
 
         logger.info("Loading previous settings.")
-        for item in self.settings.root["content"]:
+
+        async def load_configuration(item: Dict[str, Any]) -> None:
             logger.info(f"Loading following configuration: {item}.")
             try:
-                self.set_configuration(EthernetInterface(**item))
+                await self.set_configuration(EthernetInterface(**item))
             except Exception as error:
                 logger.error(f"Failed loading saved configuration. {error}")
 
+        await asyncio.gather(*[load_configuration(item) for item in self.settings.root["content"]])
+
     def save(self) -> None:
         """Save actual configuration"""
         try:
@@ -82,7 +94,7 @@ class EthernetManager:
         result = [interface.dict(exclude={"info"}) for interface in self.result]
         self.settings.save(result)
 
-    def set_configuration(self, interface: EthernetInterface) -> None:
+    async def set_configuration(self, interface: EthernetInterface) -> None:
         """Modify hardware based in the configuration
 
         Args:
@@ -95,9 +107,11 @@ class EthernetManager:
         if interface.name not in valid_names:
             raise ValueError(f"Invalid interface name ('{interface.name}'). Valid names are: {valid_names}")
 
-        # Reset the interface by removing all IPs and DHCP servers associated with it
+        # Reset the interface by removing all IPs associated with it. The DHCP server is only removed if the interface
+        # leaves server mode, otherwise its configuration is replaced, without restarting the server when possible
         self.flush_interface(interface.name)
-        self.remove_dhcp_server_from_interface(interface.name)
+        if not any(address.mode == AddressMode.Server for address in interface.addresses):
+            await self.remove_dhcp_server_from_interface(interface.name)
 
         # Even if it happened to receive more than one dynamic IP, only one trigger is necessary
         if any(address.mode == AddressMode.Client for address in interface.addresses):
@@ -107,7 +121,7 @@ class EthernetManager:
             if address.mode == AddressMode.Unmanaged:
                 self.add_static_ip(interface.name, address.ip)
             elif address.mode == AddressMode.Server:
-                self.add_dhcp_server_to_interface(interface.name, address.ip)
+                await self.add_dhcp_server_to_interface(interface.name, address.ip)
 
     def _get_wifi_interfaces(self) -> List[str]:
         """Get wifi interface list
@@ -254,7 +268,7 @@ class EthernetManager:
         interface_index = self._get_interface_index(interface_name)
         self.ipr.addr("add", index=interface_index, address=ip, prefixlen=24)
 
-    def remove_ip(self, interface_name: str, ip_address: str) -> None:
+    async def remove_ip(self, interface_name: str, ip_address: str) -> None:
         """Delete IP address appended on the interface
 
         Args:
@@ -265,9 +279,9 @@ class EthernetManager:
         try:
             if (
                 self._is_dhcp_server_running_on_interface(interface_name)
-                and self._dhcp_server_on_interface(interface_name).ipv4_gateway == ip_address
+                and str(self._dhcp_server_on_interface(interface_name).ipv4_gateway) == ip_address
             ):
-                self.remove_dhcp_server_from_interface(interface_name)
+                await self.remove_dhcp_server_from_interface(interface_name)
             interface_index = self._get_interface_index(interface_name)
             self.ipr.addr("del", index=interface_index, address=ip_address, prefixlen=24)
         except Exception as error:
@@ -307,7 +321,7 @@ class EthernetManager:
                 # Populate our output item
                 if (
                     self._is_dhcp_server_running_on_interface(interface)
-                    and self._dhcp_server_on_interface(interface).ipv4_gateway == ip
+                    and str(self._dhcp_server_on_interface(interface).ipv4_gateway) == ip
                 ):
                     mode = AddressMode.Server
                 else:
@@ -350,11 +364,10 @@ class EthernetManager:
         interface = self.get_interface_by_name(interface_name)
         return any(True for address in interface.addresses if address.ip == ip_address)
 
-    def _dhcp_server_on_interface(self, interface_name: str) -> DHCPServerManager:
-        try:
-            return next(dhcp_server for dhcp_server in self._dhcp_servers if dhcp_server.interface == interface_name)
-        except StopIteration as error:
-            raise ValueError(f"No DHCP server running on interface {interface_name}.") from error
+    def _dhcp_server_on_interface(self, interface_name: str) -> DHCPInterfaceConfig:
+        if self._dhcp_server is None or interface_name not in self._dhcp_server.interfaces:
+            raise ValueError(f"No DHCP server running on interface {interface_name}.")
+        return self._dhcp_server.interfaces[interface_name]
 
     def _is_dhcp_server_running_on_interface(self, interface_name: str) -> bool:
         try:
@@ -362,29 +375,34 @@ class EthernetManager:
         except Exception:
             return False
 
-    def remove_dhcp_server_from_interface(self, interface_name: str) -> DHCPServerManager:
+    async def remove_dhcp_server_from_interface(self, interface_name: str) -> None:
         logger.info(f"Removing DHCP server from interface '{interface_name}'.")
-        try:
-            self._dhcp_servers.remove(self._dhcp_server_on_interface(interface_name))
-        except ValueError:
+        if not self._is_dhcp_server_running_on_interface(interface_name):
             # If the interface does not have a DHCP server running on, no need to raise
-            pass
+            return
+        assert self._dhcp_server is not None
+        try:
+            await self._dhcp_server.remove_interface(interface_name)
         except Exception as error:
             raise RuntimeError("Cannot remove DHCP server from interface.") from error
 
-    def add_dhcp_server_to_interface(self, interface_name: str, ipv4_gateway: str) -> None:
-        if self._is_dhcp_server_running_on_interface(interface_name):
-            self.remove_dhcp_server_from_interface(interface_name)
-        if self._is_ip_on_interface(interface_name, ipv4_gateway):
-            self.remove_ip(interface_name, ipv4_gateway)
-        self.add_static_ip(interface_name, ipv4_gateway)
+    async def add_dhcp_server_to_interface(self, interface_name: str, ipv4_gateway: str) -> None:
+        if not self._is_ip_on_interface(interface_name, ipv4_gateway):
+            self.add_static_ip(interface_name, ipv4_gateway)
         logger.info(f"Adding DHCP server with gateway '{ipv4_gateway}' to interface '{interface_name}'.")
-        self._dhcp_servers.append(DHCPServerManager(interface_name, ipv4_gateway))
-
-    def stop(self) -> None:
+        if self._dhcp_server is None:
+            self._dhcp_server = MultiInterfaceDnsmasq()
+        # Replaces the previous configuration of the interface, the other interfaces keep being served
+        await self._dhcp_server.set_interface(DHCPInterfaceConfig(interface_name, IPv4Address(ipv4_gateway)))
+
+    def get_dhcp_leases(self, interface_name: Optional[str] = None) -> List[DHCPLease]:
+        """Leases given by the local DHCP server, to the clients of all interfaces or of the given one"""
+        if self._dhcp_server is None:
+            return []
+        leases: List[DHCPLease] = self._dhcp_server.leases(interface_name)
+        return leases
+
+    async def stop(self) -> None:
         """Perform steps necessary to properly stop the manager."""
-        for dhcp_server in self._dhcp_servers:
-            dhcp_server.stop()
-
-    def __del__(self) -> None:
-        self.stop()
+        if self._dhcp_server is not None:
+            await self._dhcp_server.stop()
@@ -5,11 +5,17 @@ import logging
 import os
 import sys
 from pathlib import Path
-from typing import Any, List
+from typing import Any, List, Optional
 
-from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
+from commonwealth.utils.apis import (
+    CompactJSONResponse,
+    GenericErrorHandlingRoute,
+    add_error_stats_endpoint,
+    add_metrics_endpoint,
+)
 from commonwealth.utils.decorators import temporary_cache
-from commonwealth.utils.logs import InterceptHandler, get_new_log_path
+from commonwealth.utils.DHCPServerManager import DHCPLease
+from commonwealth.utils.logs import InterceptHandler, init_service_logs
 from fastapi import Body, FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi_versioning import VersionedFastAPI, version
@@ -45,14 +51,14 @@ if args.default_config == "bluerov2":
 manager = EthernetManager(default_config)
 
 logging.basicConfig(handlers=[InterceptHandler()], level=0)
-logger.add(get_new_log_path(SERVICE_NAME))
+init_service_logs(SERVICE_NAME)
 
 HTML_FOLDER = Path.joinpath(Path(__file__).parent.absolute(), "html")
 
 app = FastAPI(
     title="Cable Guy API",
     description="Cable Guy is responsible for managing internet interfaces on BlueOS.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=CompactJSONResponse,
     debug=True,
 )
 app.router.route_class = GenericErrorHandlingRoute
@@ -68,9 +74,9 @@ def retrieve_interfaces() -> Any:
 
 @app.post("/ethernet", response_model=EthernetInterface, summary="Configure a ethernet interface.")
 @version(1, 0)
-def configure_interface(interface: EthernetInterface = Body(...)) -> Any:
+async def configure_interface(interface: EthernetInterface = Body(...)) -> Any:
     """REST API endpoint to configure a new ethernet interface or modify an existing one."""
-    manager.set_configuration(interface)
+    await manager.set_configuration(interface)
     manager.save()
     return interface
 
@@ -85,28 +91,35 @@ def add_address(interface_name: str, ip_address: str) -> Any:
 
 @app.delete("/address", summary="Delete IP address from interface.")
 @version(1, 0)
-def delete_address(interface_name: str, ip_address: str) -> Any:
+async def delete_address(interface_name: str, ip_address: str) -> Any:
     """REST API endpoint to delete an IP address from an ethernet interface."""
-    manager.remove_ip(interface_name, ip_address)
+    await manager.remove_ip(interface_name, ip_address)
     manager.save()
 
 
 @app.post("/dhcp", summary="Add local DHCP server to interface.")
 @version(1, 0)
-def add_dhcp_server(interface_name: str, ipv4_gateway: str) -> Any:
+async def add_dhcp_server(interface_name: str, ipv4_gateway: str) -> Any:
     """REST API endpoint to enable/disable local DHCP server."""
-    manager.add_dhcp_server_to_interface(interface_name, ipv4_gateway)
+    await manager.add_dhcp_server_to_interface(interface_name, ipv4_gateway)
     manager.save()
 
 
 @app.delete("/dhcp", summary="Remove local DHCP server from interface.")
 @version(1, 0)
-def remove_dhcp_server(interface_name: str) -> Any:
+async def remove_dhcp_server(interface_name: str) -> Any:
     """REST API endpoint to enable/disable local DHCP server."""
-    manager.remove_dhcp_server_from_interface(interface_name)
+    await manager.remove_dhcp_server_from_interface(interface_name)
     manager.save()
 
 
+@app.get("/dhcp/leases", response_model=List[DHCPLease], summary="Retrieve leases of the local DHCP server.")
+@version(1, 0)
+def retrieve_dhcp_leases(interface_name: Optional[str] = None) -> Any:
+    """REST API endpoint to retrieve the clients of the local DHCP server, of all interfaces or of the given one."""
+    return manager.get_dhcp_leases(interface_name)
+
+
 @app.post("/dynamic_ip", summary="Trigger reception of dynamic IP.")
 @version(1, 0)
 def trigger_dynamic_ip_acquisition(interface_name: str) -> Any:
@@ -121,6 +134,8 @@ app = VersionedFastAPI(
     prefix_format="/v{major}.{minor}",
     enable_latest=True,
 )
+add_metrics_endpoint(app)
+add_error_stats_endpoint(app)
 app.mount("/", StaticFiles(directory=str(HTML_FOLDER), html=True))
 
 if __name__ == "__main__":
@@ -136,4 +151,6 @@ if __name__ == "__main__":
     config = Config(app=app, loop=loop, host="0.0.0.0", port=9090, log_config=None)
     server = Server(config)
 
+    loop.run_until_complete(manager.initialize())
     loop.run_until_complete(server.serve())
+    loop.run_until_complete(manager.stop())
@@ -1,25 +1,40 @@
 #! /usr/bin/env python3
+import itertools
+import json
 import logging
 import shutil
 import subprocess
 import time
+from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Any
+from typing import Any, List, Optional
 
 import appdirs
 import uvicorn
-from commonwealth.utils.apis import GenericErrorHandlingRoute
-from commonwealth.utils.logs import InterceptHandler, get_new_log_path
-from fastapi import FastAPI, HTTPException, status
-from fastapi.responses import HTMLResponse
+from commonwealth.utils.apis import (
+    GenericErrorHandlingRoute,
+    add_error_stats_endpoint,
+    add_metrics_endpoint,
+)
+from commonwealth.utils.logs import InterceptHandler, init_service_logs
+from commonwealth.utils.structured_logs import (
+    LEVELS,
+    LogFilter,
+    list_log_services,
+    query_logs,
+)
+from fastapi import FastAPI, HTTPException, Query, status
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi_versioning import VersionedFastAPI, version
 from loguru import logger
 
 SERVICE_NAME = "commander"
+# Largest number of log entries returned by a single request
+MAX_LOG_ENTRIES = 10000
 
 logging.basicConfig(handlers=[InterceptHandler()], level=0)
-logger.add(get_new_log_path(SERVICE_NAME))
+init_service_logs(SERVICE_NAME)
 
 app = FastAPI(
     title="Commander API",
@@ -160,7 +175,42 @@ async def reset_settings(i_know_what_i_am_doing: bool = False) -> Any:
             logger.warning(f"Failed to delete: {item}, {exception}")
 
 
+@app.get("/logs/services", response_model=List[str], summary="Services with structured logs.")
+@version(1, 0)
+def log_services() -> Any:
+    return list_log_services()
+
+
+@app.get("/logs", summary="Stream log entries of the services, as JSON lines, ordered by time.")
+@version(1, 0)
+# pylint: disable=too-many-arguments
+def logs(
+    service: Optional[List[str]] = Query(None),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    level: Optional[str] = None,
+    contains: Optional[str] = None,
+    limit: int = Query(1000, gt=0, le=MAX_LOG_ENTRIES),
+) -> Any:
+    if level is not None and level.upper() not in LEVELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid level {level}, should be one of: {list(LEVELS)}",
+        )
+
+    log_filter = LogFilter(
+        since=since.timestamp() if since else None,
+        until=until.timestamp() if until else None,
+        min_level=LEVELS[level.upper()] if level else None,
+        contains=contains,
+    )
+    entries = itertools.islice(query_logs(service, log_filter), limit)
+    return StreamingResponse((json.dumps(entry) + "\n" for entry in entries), media_type="application/x-ndjson")
+
+
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+add_metrics_endpoint(app)
+add_error_stats_endpoint(app)
 
 
 @app.get("/")
@@ -9,8 +9,13 @@ import psutil
 import requests
 import uvicorn
 from bs4 import BeautifulSoup
-from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
-from commonwealth.utils.decorators import temporary_cache
+from commonwealth.utils.apis import (
+    CompactJSONResponse,
+    GenericErrorHandlingRoute,
+    add_error_stats_endpoint,
+    add_metrics_endpoint,
+)
+from commonwealth.utils.decorators import cached
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi_versioning import VersionedFastAPI, version
@@ -100,7 +105,8 @@ class Helper:
         return info
 
     @staticmethod
-    @temporary_cache(timeout_seconds=10)
+    # Scanning takes a while, so the last result is served while a new scan runs, and concurrent requests share it
+    @cached(ttl=10, stale_ttl=60)
     def scan_ports() -> List[ServiceInfo]:
         # Filter for TCP ports that are listen and can be accessed by external users (server in 0.0.0.0)
         connections = (
@@ -119,7 +125,7 @@ class Helper:
 fast_api_app = FastAPI(
     title="Helper API",
     description="Everybody's helper to find web services that are running in BlueOS.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=CompactJSONResponse,
 )
 fast_api_app.router.route_class = GenericErrorHandlingRoute
 
@@ -141,6 +147,8 @@ app = VersionedFastAPI(
     prefix_format="/v{major}.{minor}",
     enable_latest=True,
 )
+add_metrics_endpoint(app)
+add_error_stats_endpoint(app)
 
 app.mount("/", StaticFiles(directory=str(HTML_FOLDER), html=True))
 
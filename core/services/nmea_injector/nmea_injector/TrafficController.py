@@ -2,7 +2,7 @@
 
 import asyncio
 from enum import Enum
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import pynmea2
 from commonwealth.mavlink_comm.MavlinkComm import MavlinkMessenger
@@ -14,6 +14,12 @@ from nmea_injector.exceptions import UnsupportedSocketKind
 from nmea_injector.MavlinkNMEA import MavlinkGpsInput, parse_mavlink_from_sentence
 from nmea_injector.settings import NmeaInjectorSettingsSpecV1, SettingsV1
 
+# GPS_INPUT rate accepted from each NMEA source, so a chatty one cannot flood the autopilot link
+GPS_INPUT_MAX_RATE_HZ = 20.0
+GPS_INPUT_MAX_BURST = 5
+# Sockets are usually created in bursts, their settings are written once the burst is over
+SETTINGS_SAVE_DEBOUNCE = 1.0
+
 
 class SocketKind(str, Enum):
     """Available server sockets"""
@@ -58,6 +64,7 @@ class TcpNmeaProtocol(asyncio.Protocol):
     def __init__(self, component_id: int) -> None:
         self.mavlink2rest = MavlinkMessenger()
         self.mavlink2rest.set_component_id(component_id)
+        self.mavlink2rest.set_rate_limit("GPS_INPUT", GPS_INPUT_MAX_RATE_HZ, GPS_INPUT_MAX_BURST)
 
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         """Behavior when a new connection is stablished."""
@@ -67,16 +74,21 @@ class TcpNmeaProtocol(asyncio.Protocol):
     def data_received(self, data: bytes) -> None:
         """What happens when data is received from a client socket."""
         message = data.decode()
-        logger.info(f"Message received for component {self.mavlink2rest.component_id}: {message}")
+        logger.debug(f"Message received for component {self.mavlink2rest.component_id}: {message}")
         mavlink_package = TrafficController.parse_mavlink_package(message)
         asyncio.create_task(TrafficController.forward_message(mavlink_package, self.mavlink2rest))
-        logger.info("Successfully forwarded mavlink coordinates package.")
+        logger.debug("Successfully forwarded mavlink coordinates package.")
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        """Release pooled Mavlink2Rest connections when the client goes away."""
+        asyncio.create_task(self.mavlink2rest.close())
 
 
 class UdpNmeaProtocol(asyncio.DatagramProtocol):
     def __init__(self, component_id: int) -> None:
         self.mavlink2rest = MavlinkMessenger()
         self.mavlink2rest.set_component_id(component_id)
+        self.mavlink2rest.set_rate_limit("GPS_INPUT", GPS_INPUT_MAX_RATE_HZ, GPS_INPUT_MAX_BURST)
 
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         """Behavior when a new connection is stablished."""
@@ -86,10 +98,10 @@ class UdpNmeaProtocol(asyncio.DatagramProtocol):
     def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
         """What happens when data is received from a client socket."""
         message = data.decode()
-        logger.info(f"Message received for component {self.mavlink2rest.component_id}: {message}")
+        logger.debug(f"Message received for component {self.mavlink2rest.component_id}: {message}")
         mavlink_package = TrafficController.parse_mavlink_package(message)
         asyncio.create_task(TrafficController.forward_message(mavlink_package, self.mavlink2rest))
-        logger.info("Successfully forwarded mavlink coordinates package.")
+        logger.debug("Successfully forwarded mavlink coordinates package.")
 
 
 class TrafficController:
@@ -97,7 +109,7 @@ class TrafficController:
 
     def __init__(self) -> None:
         self._socks: Dict[NMEASocket, Union[asyncio.AbstractServer, asyncio.BaseTransport]] = {}
-        self._settings_manager = Manager("nmea-injector", SettingsV1)
+        self._settings_manager = Manager("nmea-injector", SettingsV1, save_debounce=SETTINGS_SAVE_DEBOUNCE)
 
     async def load_socks_from_settings(self) -> None:
         self._settings_manager.load()
@@ -4,8 +4,13 @@ import asyncio
 import logging
 from typing import Any, List
 
-from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
-from commonwealth.utils.logs import InterceptHandler, get_new_log_path
+from commonwealth.utils.apis import (
+    CompactJSONResponse,
+    GenericErrorHandlingRoute,
+    add_error_stats_endpoint,
+    add_metrics_endpoint,
+)
+from commonwealth.utils.logs import InterceptHandler, init_service_logs
 from fastapi import FastAPI, status
 from fastapi.responses import HTMLResponse
 from fastapi_versioning import VersionedFastAPI, version
@@ -23,13 +28,14 @@ parser.add_argument("-t", "--tcp", type=int, help="change the default TCP input
 args = parser.parse_args()
 
 logging.basicConfig(handlers=[InterceptHandler()], level=0)
-logger.add(get_new_log_path(SERVICE_NAME))
+# Received sentences are logged as debug, and are too frequent to be written on the SD card
+init_service_logs(SERVICE_NAME, level="INFO")
 
 
 app = FastAPI(
     title="NMEA Injector API",
     description="NMEA Injector is a service responsible for injecting external NMEA data on the Mavlink stream.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=CompactJSONResponse,
     debug=True,
 )
 app.router.route_class = GenericErrorHandlingRoute
@@ -67,6 +73,8 @@ def remove_sock(sock: NMEASocket) -> Any:
 
 
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+add_metrics_endpoint(app)
+add_error_stats_endpoint(app)
 
 
 @app.get("/")
@@ -3,8 +3,13 @@ import argparse
 import asyncio
 from typing import Any, List
 
-from commonwealth.utils.apis import GenericErrorHandlingRoute, PrettyJSONResponse
-from commonwealth.utils.logs import get_new_log_path
+from commonwealth.utils.apis import (
+    CompactJSONResponse,
+    GenericErrorHandlingRoute,
+    add_error_stats_endpoint,
+    add_metrics_endpoint,
+)
+from commonwealth.utils.logs import init_service_logs
 from fastapi import FastAPI, status
 from fastapi.responses import HTMLResponse
 from fastapi_versioning import VersionedFastAPI, version
@@ -21,7 +26,7 @@ SERVICE_NAME = "ping"
 app = FastAPI(
     title="Ping Manager API",
     description="Ping Manager is responsible for managing Ping devices connected to BlueOS.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=CompactJSONResponse,
     debug=True,
 )
 app.router.route_class = GenericErrorHandlingRoute
@@ -48,6 +53,8 @@ def set_sensor(sensor_settings: dict[str, Any]) -> Any:
 
 
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+add_metrics_endpoint(app)
+add_error_stats_endpoint(app)
 
 
 @app.get("/")
@@ -76,7 +83,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Ping Service for Bluerobotics BlueOS")
     args = parser.parse_args()
 
-    logger.add(get_new_log_path(SERVICE_NAME))
+    init_service_logs(SERVICE_NAME)
 
     loop = asyncio.new_event_loop()
 
@@ -1,7 +1,8 @@
 from typing import Any, Dict, Optional
 
 from bridges.bridges import Bridge
-from bridges.serialhelper import Baudrate, set_low_latency
+from bridges.serialhelper import Baudrate
+from bridges.serialtuning import SerialTuningReport, tune_port
 from brping import PingDevice
 from brping.definitions import COMMON_DEVICE_INFORMATION
 from loguru import logger
@@ -19,6 +20,7 @@ class PingDriver:
         self.ping.driver = self
         self.baud: Optional[Baudrate] = None
         self.driver_status = DriverStatus(udp_port=port, mavlink_driver_enabled=False)
+        self.serial_tuning: Optional[SerialTuningReport] = None
 
     def detect_highest_baud(self) -> Baudrate:
         """Tries to communicate in increasingly high baudrates up to 4M
@@ -63,7 +65,7 @@ class PingDriver:
         self.baud = self.detect_highest_baud()
         # Do a ping connection to set the baudrate
         PingDevice().connect_serial(self.ping.port.device, self.baud)
-        set_low_latency(self.ping.port)
+        self.serial_tuning = tune_port(self.ping.port.device)
         self.bridge = Bridge(self.ping.port, self.baud, "0.0.0.0", self.port, automatic_disconnect=False)
 
     def stop(self) -> None:
@@ -3,6 +3,7 @@ from typing import Any, Callable, Coroutine, Dict, Optional, Set
 from warnings import warn
 
 import serial.tools.list_ports
+from commonwealth.utils.logs import report_error
 from loguru import logger
 from serial.tools.list_ports_linux import SysFS
 
@@ -86,24 +87,31 @@ class PortWatcher:
                 )
             )
 
+    async def update_ports(self) -> None:
+        """Probe plugged serial devices and forget the unplugged ones."""
+        ports = serial.tools.list_ports.comports()
+        ports_description = [f"{port.subsystem}:{port.name}" for port in ports]
+        logger.debug(f"Currently detected ports: {ports_description}")
+        found_ports = set()
+        for port in ports:
+            if self.port_should_be_probed(port):
+                await self.probe_port(port)
+            found_ports.add(port)
+
+        missing = self.known_ports - found_ports
+        for port in missing:
+            logger.info(f"Port lost: {port.hwid}")
+            self.known_ports.remove(port)
+            if self.port_lost_callback is not None:
+                self.port_lost_callback(port)
+        await self.add_ping360()
+
     async def start_watching(self) -> None:
         """Start watching for plugged/unplugged serial devices in the system."""
         # TODO: try https://pypi.org/project/inotify/
         while True:
-            ports = serial.tools.list_ports.comports()
-            ports_description = [f"{port.subsystem}:{port.name}" for port in ports]
-            logger.debug(f"Currently detected ports: {ports_description}")
-            found_ports = set()
-            for port in ports:
-                if self.port_should_be_probed(port):
-                    await self.probe_port(port)
-                found_ports.add(port)
-
-            missing = self.known_ports - found_ports
-            for port in missing:
-                logger.info(f"Port lost: {port.hwid}")
-                self.known_ports.remove(port)
-                if self.port_lost_callback is not None:
-                    self.port_lost_callback(port)
-            await self.add_ping360()
+            try:
+                await self.update_ports()
+            except Exception as error:
+                report_error(error, "Failed to update serial ports.")
             await asyncio.sleep(1)
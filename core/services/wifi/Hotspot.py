@@ -1,3 +1,4 @@
+import asyncio
 import hashlib
 import pathlib
 import shlex
@@ -159,7 +160,7 @@ class HotspotManager:
     def command_list(self) -> List[str]:
         return shlex.split(f"{self.binary()} {self.config_path()}")
 
-    def start(self) -> None:
+    async def start(self) -> None:
         logger.info("Starting hotspot.")
         try:
             self._create_temp_config_file()
@@ -167,18 +168,17 @@ class HotspotManager:
             # pylint: disable=consider-using-with
             if not self.is_running():
                 self._subprocess = subprocess.Popen(self.command_list(), shell=False, encoding="utf-8", errors="ignore")
-                time.sleep(3)
+                await asyncio.sleep(3)
                 if not self.is_running():
                     exit_code = self._subprocess.returncode
                     raise RuntimeError(f"Failed to initialize Hostapd ({exit_code}).")
             if not self._dhcp_server:
                 self._dhcp_server = DHCPServerManager(self._ap_interface_name, self._ipv4_gateway)
-                return
-            self._dhcp_server.restart()
+            await self._dhcp_server.restart()
         except Exception as error:
             raise RuntimeError(f"Unable to start hotspot. {error}") from error
 
-    def stop(self) -> None:
+    async def stop(self) -> None:
         logger.info("Stopping hotspot.")
         if self.is_running():
             assert self._subprocess is not None
@@ -186,13 +186,13 @@ class HotspotManager:
             if not self._dhcp_server:
                 logger.warning("Cannot stop DHCP server for hotspot, as was already not running.")
                 return
-            self._dhcp_server.stop()
+            await self._dhcp_server.stop()
         else:
             logger.info("Tried to stop hostpot, but it was already not running.")
 
-    def restart(self) -> None:
-        self.stop()
-        self.start()
+    async def restart(self) -> None:
+        await self.stop()
+        await self.start()
 
     def is_running(self) -> bool:
         return self._subprocess is not None and self._subprocess.poll() is None
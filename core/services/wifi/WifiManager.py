@@ -4,6 +4,7 @@ from ipaddress import IPv4Address
 from typing import Any, Dict, List, Optional
 
 from commonwealth.settings.manager import Manager
+from commonwealth.utils.logs import report_error
 from loguru import logger
 
 from exceptions import FetchError, ParseError
@@ -46,10 +47,10 @@ class WifiManager:
                 self._settings_manager.settings.hotspot_password,
             )
             if ssid is not None and password is not None:
-                self.set_hotspot_credentials(WifiCredentials(ssid=ssid, password=password))
+                asyncio.run(self.set_hotspot_credentials(WifiCredentials(ssid=ssid, password=password)))
             if self._settings_manager.settings.hotspot_enabled in [True, None]:
                 time.sleep(5)
-                self.enable_hotspot()
+                asyncio.run(self.enable_hotspot())
         except Exception:
             logger.exception("Could not load previous hotspot settings.")
 
@@ -221,7 +222,7 @@ class WifiManager:
         was_hotspot_enabled = self.hotspot.is_running()
         try:
             if was_hotspot_enabled:
-                self.disable_hotspot(save_settings=False)
+                await self.disable_hotspot(save_settings=False)
             await self.wpa.send_command_select_network(network_id)
             await self.wpa.send_command_save_config()
             await self.wpa.send_command_reconfigure()
@@ -251,7 +252,7 @@ class WifiManager:
             raise ConnectionError(f"Failed to connect to network. {error}") from error
         finally:
             if was_hotspot_enabled:
-                self.enable_hotspot(save_settings=False)
+                await self.enable_hotspot(save_settings=False)
 
     async def status(self) -> Dict[str, Any]:
         """Check wpa_supplicant status"""
@@ -365,9 +366,9 @@ class WifiManager:
                 try:
                     if self._settings_manager.settings.smart_hotspot_enabled in [None, True]:
                         logger.debug("Starting smart-hotspot.")
-                        self.enable_hotspot()
-                except Exception:
-                    logger.exception("Could not start smart-hotspot.")
+                        await self.enable_hotspot()
+                except Exception as error:
+                    report_error(error, "Could not start smart-hotspot.")
                 networks_reenabled = True
 
     async def start_hotspot_watchdog(self) -> None:
@@ -377,11 +378,11 @@ class WifiManager:
             try:
                 if self._settings_manager.settings.hotspot_enabled and not self.hotspot.is_running():
                     logger.warning("Hotspot should be working but is not. Restarting it.")
-                    self.enable_hotspot()
-            except Exception:
-                logger.exception("Could not start hotspot from the watchdog routine.")
+                    await self.enable_hotspot()
+            except Exception as error:
+                report_error(error, "Could not start hotspot from the watchdog routine.")
 
-    def set_hotspot_credentials(self, credentials: WifiCredentials) -> None:
+    async def set_hotspot_credentials(self, credentials: WifiCredentials) -> None:
         self._settings_manager.settings.hotspot_ssid = credentials.ssid
         self._settings_manager.settings.hotspot_password = credentials.password
         self._settings_manager.save()
@@ -389,14 +390,14 @@ class WifiManager:
         self.hotspot.set_credentials(credentials)
 
         if self.hotspot.is_running():
-            self.disable_hotspot(save_settings=False)
-            time.sleep(5)
-            self.enable_hotspot(save_settings=False)
+            await self.disable_hotspot(save_settings=False)
+            await asyncio.sleep(5)
+            await self.enable_hotspot(save_settings=False)
 
     def hotspot_credentials(self) -> WifiCredentials:
         return self.hotspot.credentials
 
-    def enable_hotspot(self, save_settings: bool = True) -> None:
+    async def enable_hotspot(self, save_settings: bool = True) -> None:
         if save_settings:
             self._settings_manager.settings.hotspot_enabled = True
             self._settings_manager.save()
@@ -404,14 +405,14 @@ class WifiManager:
         if self.hotspot.is_running():
             logger.warning("Hotspot already running. No need to enable it again.")
             return
-        self.hotspot.start()
+        await self.hotspot.start()
 
-    def disable_hotspot(self, save_settings: bool = True) -> None:
+    async def disable_hotspot(self, save_settings: bool = True) -> None:
         if save_settings:
             self._settings_manager.settings.hotspot_enabled = False
             self._settings_manager.save()
 
-        self.hotspot.stop()
+        await self.hotspot.stop()
 
     def enable_smart_hotspot(self) -> None:
         self._settings_manager.settings.smart_hotspot_enabled = True
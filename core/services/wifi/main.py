@@ -9,11 +9,13 @@ from pathlib import Path
 from typing import Any, List, Optional
 
 from commonwealth.utils.apis import (
+    CompactJSONResponse,
     GenericErrorHandlingRoute,
-    PrettyJSONResponse,
     StackedHTTPException,
+    add_error_stats_endpoint,
+    add_metrics_endpoint,
 )
-from commonwealth.utils.logs import InterceptHandler, get_new_log_path
+from commonwealth.utils.logs import InterceptHandler, init_service_logs
 from fastapi import FastAPI, HTTPException, status
 from fastapi.staticfiles import StaticFiles
 from fastapi_versioning import VersionedFastAPI, version
@@ -29,7 +31,7 @@ FRONTEND_FOLDER = Path.joinpath(Path(__file__).parent.absolute(), "frontend")
 SERVICE_NAME = "wifi-manager"
 
 logging.basicConfig(handlers=[InterceptHandler()], level=0)
-logger.add(get_new_log_path(SERVICE_NAME))
+init_service_logs(SERVICE_NAME)
 
 logger.info("Starting Wifi Manager.")
 wifi_manager = WifiManager()
@@ -38,7 +40,7 @@ wifi_manager = WifiManager()
 app = FastAPI(
     title="WiFi Manager API",
     description="WiFi Manager is responsible for managing WiFi connections on BlueOS.",
-    default_response_class=PrettyJSONResponse,
+    default_response_class=CompactJSONResponse,
 )
 app.router.route_class = GenericErrorHandlingRoute
 
@@ -151,11 +153,11 @@ def hotspot_state() -> Any:
 
 @app.post("/hotspot", summary="Enable/disable hotspot.")
 @version(1, 0)
-def toggle_hotspot(enable: bool) -> Any:
+async def toggle_hotspot(enable: bool) -> Any:
     if enable:
-        wifi_manager.enable_hotspot()
+        await wifi_manager.enable_hotspot()
         return
-    wifi_manager.disable_hotspot()
+    await wifi_manager.disable_hotspot()
 
 
 @app.post("/smart_hotspot", summary="Enable/disable smart-hotspot.")
@@ -169,8 +171,8 @@ def toggle_smart_hotspot(enable: bool) -> Any:
 
 @app.post("/hotspot_credentials", summary="Update hotspot credentials.")
 @version(1, 0)
-def set_hotspot_credentials(credentials: WifiCredentials) -> Any:
-    wifi_manager.set_hotspot_credentials(credentials)
+async def set_hotspot_credentials(credentials: WifiCredentials) -> Any:
+    await wifi_manager.set_hotspot_credentials(credentials)
 
 
 @app.get("/hotspot_credentials", summary="Get hotspot credentials.")
@@ -180,6 +182,8 @@ def get_hotspot_credentials() -> Any:
 
 
 app = VersionedFastAPI(app, version="1.0.0", prefix_format="/v{major}.{minor}", enable_latest=True)
+add_metrics_endpoint(app)
+add_error_stats_endpoint(app)
 app.mount("/", StaticFiles(directory=str(FRONTEND_FOLDER), html=True))
 
 